@@ -1,38 +1,118 @@
+import multiprocessing
+import multiprocessing.connection
+
 from utils import get_logger
 from crawler.frontier import Frontier
 from crawler.worker import Worker
 from deliverables import GlobalDeliverableData
+from utils import url_cache
+import scraper
 
 
 class Crawler(object):
-    def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
+    def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker, global_deliverables=None):
         self.config = config
+        self.restart = restart
         self.logger = get_logger("CRAWLER")
-        self.frontier = frontier_factory(config, restart)
+        config.apply()
+        self.frontier_factory = frontier_factory
         self.workers = list()
         self.worker_factory = worker_factory
 
-        self.global_deliverables = GlobalDeliverableData()
+        self.global_deliverables = GlobalDeliverableData(
+            checkpoint_interval=config.deliverables_interval, checkpoint_batch=config.deliverables_batch
+        ) if global_deliverables is None else global_deliverables
+        # with more than one process, every process creates the frontier of its own partition instead
+        self.frontier = frontier_factory(config, restart) if config.processes == 1 else None
+        if self.frontier is not None:
+            # so the deliverables always hold every page the frontier saved as downloaded
+            self.global_deliverables.after_checkpoint(self.frontier.save_downloads)
 
     def start_async(self):
-        self.logger.info(f"Creating {self.config.threads_count} workers")
-        self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier, self.global_deliverables)
-            for worker_id in range(self.config.threads_count)]
+        if self.config.engine == "async":
+            from crawler.async_engine import AsyncEngine
+
+            # a single event loop does every download; THREADCOUNT threads parse what it downloads
+            self.logger.info(f"Creating async engine with up to {self.config.async_requests} downloads in flight")
+            self.workers = [AsyncEngine(0, self.config, self.frontier, self.global_deliverables)]
+        elif self.config.engine == "pipeline":
+            from crawler.pipeline import Pipeline
+
+            self.logger.info(
+                f"Creating pipeline with {self.config.threads_count} fetchers and {self.config.parse_processes} parse processes")
+            self.workers = [Pipeline(0, self.config, self.frontier, self.global_deliverables)]
+        else:
+            self.logger.info(f"Creating {self.config.threads_count} workers")
+            self.workers = [
+                self.worker_factory(worker_id, self.config, self.frontier, self.global_deliverables)
+                for worker_id in range(self.config.threads_count)]
+        if self.config.engine != "pipeline" and self.config.parse_processes > 0:
+            # the pipeline has a parse stage of its own; every other engine hands its pages to a shared pool
+            self.logger.info(f"Creating {self.config.parse_processes} parse processes")
+            scraper.start_parse_pool(self.config.parse_processes, initializer=self.config.apply)
         for worker in self.workers:
             worker.start()
 
     def start(self):
         self.logger.info(f"Starting crawler")
-        self.start_async()
-        self.join()
+        if self.config.processes > 1:
+            self.start_processes()
+        else:
+            self.start_async()
+            self.join()
         self.logger.info(f"Finished crawl, outputting deliverables.")
         self.finish()
         self.logger.info(f"Finished program.")
 
+    def start_processes(self):
+        """
+        Crawl with PROCESSES processes, each running THREADCOUNT workers over its own partition of the domains,
+        then merge the deliverables of every process. Returns once every process has finished.
+        """
+        from crawler.processes import crawl_partition
+
+        num_processes = self.config.processes
+        self.logger.info(f"Creating {num_processes} processes")
+        inboxes = [multiprocessing.Queue() for _ in range(num_processes)]
+        # every process starts out with work to do; see FrontierPartition
+        pending = multiprocessing.Value("q", num_processes)
+        processes = [
+            multiprocessing.Process(
+                target=crawl_partition, name=f"Crawler-{partition}",
+                args=(self.config, self.restart, partition, inboxes, pending,
+                      self.frontier_factory, self.worker_factory, self.global_deliverables))
+            for partition in range(num_processes)]
+        for process in processes:
+            process.start()
+
+        running = list(processes)
+        while running:
+            multiprocessing.connection.wait([process.sentinel for process in running])
+            for process in [process for process in running if not process.is_alive()]:
+                running.remove(process)
+                if process.exitcode != 0:
+                    # a crashed process never stops counting itself as busy, so the others would wait for it forever.
+                    # Terminated, they save their frontier and deliverables before exiting (see crawl_partition)
+                    for other in running:
+                        other.terminate()
+                        other.join()
+                    raise RuntimeError(
+                        f"{process.name} exited with code {process.exitcode}. Restart without --restart to resume.")
+
+        for partition in range(num_processes):
+            self.global_deliverables.merge(self.global_deliverables.partition(partition, num_processes))
+
     def join(self):
-        for worker in self.workers:
-            worker.join()
+        try:
+            for worker in self.workers:
+                worker.join()
+        finally:
+            # saved even when the crawler is stopped, by Ctrl-C or by terminating its process. Checkpointing the
+            # deliverables saves the pages the frontier completed as downloaded, so they hold every one of them
+            self.global_deliverables.checkpoint()
+            self.frontier.sync()
+        scraper.stop_parse_pool()
+        self.logger.info(f"URL cache: {url_cache.stats()}")
 
     def finish(self):
         self.global_deliverables.mark_finished()
@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import aiohttp
+
+from utils import get_logger
+from utils.async_download import download_async
+import scraper
+
+
+# longest the engine waits without checking the frontier again, as URLs can also be added from outside the engine,
+# such as when they are forwarded from another crawler process
+IDLE_POLL_INTERVAL = 0.5
+
+
+class AsyncEngine(Thread):
+    """
+    Crawls with one asyncio event loop instead of THREADCOUNT worker threads.
+    Up to ASYNCREQUESTS downloads are in flight at once, across every ready domain, while parsing and frontier
+    updates run on THREADCOUNT executor threads so they never block the loop. URLs are taken from the frontier
+    without blocking, so the same per-domain politeness applies as with thread workers.
+    Runs as a single thread, so Crawler can start and join it like any worker.
+    """
+
+    def __init__(self, worker_id, config, frontier, global_deliverable):
+        self.logger = get_logger(f"AsyncEngine-{worker_id}", "Worker")
+        self.worker_id = worker_id
+        self.config = config
+        self.frontier = frontier
+        self.global_deliverable = global_deliverable
+        super().__init__(daemon=True)
+
+    def run(self):
+        try:
+            asyncio.run(self._crawl())
+            self.logger.info(f"Async engine {self.worker_id} shutting down.")
+        except Exception as e:
+            self.logger.exception(
+                f"Async engine {self.worker_id} encountered a critical error: {e}")
+            raise e
+
+    async def _crawl(self):
+        # set whenever a URL is completed, as that can queue new URLs or end the crawl
+        self._progress = asyncio.Event()
+        slots = asyncio.Semaphore(self.config.async_requests)
+        tasks = set()
+
+        connector = aiohttp.TCPConnector(limit=self.config.async_requests)
+        timeout = aiohttp.ClientTimeout(total=self.config.download_timeout, connect=self.config.connect_timeout)
+        with ThreadPoolExecutor(self.config.threads_count, thread_name_prefix="Parser") as executor:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                while True:
+                    await slots.acquire()
+                    self._progress.clear()
+                    tbd_url = self.frontier.get_tbd_url()
+                    if tbd_url is None:
+                        slots.release()
+                        if self.frontier.empty():
+                            self.logger.info("Frontier is empty. Stopping Crawler.")
+                            break
+                        # no domain is ready; wait for its delay to pass, or for a page to queue new URLs
+                        wait = self.frontier.time_until_ready()
+                        wait = IDLE_POLL_INTERVAL if wait is None else min(wait, IDLE_POLL_INTERVAL)
+                        try:
+                            await asyncio.wait_for(self._progress.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                    task = asyncio.create_task(self._process(tbd_url, session, executor))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    task.add_done_callback(lambda _: slots.release())
+
+                await asyncio.gather(*tasks)
+
+    async def _process(self, tbd_url, session, executor):
+        loop = asyncio.get_running_loop()
+        try:
+            self.logger.info(f"Fetching {tbd_url}")
+            resp = await download_async(tbd_url, self.config, session, self.logger)
+            await loop.run_in_executor(executor, self._scrape, tbd_url, resp)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Failed to download {tbd_url}: {e!r}")
+        except Exception as e:
+            self.logger.exception(f"Failed to process {tbd_url}: {e}")
+        finally:
+            # the frontier counts this URL as in flight until it is completed, so it must be completed even on failure
+            await loop.run_in_executor(executor, self.frontier.mark_url_complete, tbd_url)
+            self._progress.set()
+
+    def _scrape(self, tbd_url, resp):
+        """Parse a downloaded page and queue its links. Runs on an executor thread."""
+        scraped_urls = scraper.scraper(tbd_url, resp, self.global_deliverable)
+        self.frontier.add_urls(scraped_urls)
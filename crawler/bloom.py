@@ -0,0 +1,69 @@
+import math
+
+
+class BloomSlice(object):
+    """A fixed size Bloom filter, sized to hold capacity keys at the given false positive rate."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key):
+        # keys are hex digests already, so two independent hashes can be cut straight out of them (double hashing)
+        h1 = int(key[:16], 16)
+        h2 = int(key[16:32], 16) | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for index in self._indexes(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
+
+    def false_positive_rate(self):
+        """Expected false positive rate at the current fill."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class ScalableBloomFilter(object):
+    """
+    Bloom filter over hex digests (such as those from utils.get_urlhash) that grows as keys are added.
+    Once a slice is full a new one twice its size is added, with a tighter error rate, so the overall
+    false positive rate stays below error_rate no matter how many keys are added.
+    A key that is not in the filter was definitely never added; a key that is in it most likely was.
+    """
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, initial_capacity=1000000, error_rate=0.001):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.slices = []
+
+    def __len__(self):
+        return sum(s.count for s in self.slices)
+
+    def __contains__(self, key):
+        return any(key in s for s in self.slices)
+
+    def add(self, key):
+        if not self.slices or self.slices[-1].count >= self.slices[-1].capacity:
+            n = len(self.slices)
+            self.slices.append(BloomSlice(
+                self.initial_capacity * ScalableBloomFilter.GROWTH ** n,
+                self.error_rate * (1 - ScalableBloomFilter.TIGHTENING) * ScalableBloomFilter.TIGHTENING ** n))
+        self.slices[-1].add(key)
+
+    def memory(self):
+        """Size of the filter's bit arrays, in bytes."""
+        return sum(len(s.bits) for s in self.slices)
+
+    def false_positive_rate(self):
+        """Expected chance that a key that was never added is reported as possibly added."""
+        return 1 - math.prod(1 - s.false_positive_rate() for s in self.slices)
@@ -1,31 +1,58 @@
+import contextlib
 import time
-from urllib.parse import urlparse
-from utils import get_logger, get_urlhash, normalize, get_domain_name
+from collections import ChainMap
+from utils import canonical, get_logger, get_urlhash, get_domain_name
+from utils.url import URL
+from crawler.scheduler import ShardedScheduler
+from crawler.frontier_log import FrontierLog
+from crawler.locks import TimedLock, lock_stats
 import os
+import dbm
 import shelve
 import threading
 import glob
 
 
-THREAD_LOCK = threading.RLock()
-
-
 class Frontier(object):
+    """
+    URLs to be downloaded and every URL seen so far, striped over lock-guarded shards by domain.
+    Every domain belongs to one shard, holding both its queue of URLs and its part of the seen index, so workers
+    adding or getting URLs of different domains only wait on each other for the short moments they update the
+    number of URLs in flight.
+    """
+    # shards to stripe the frontier over; more shards than threads keeps two threads from often sharing one
+    NUM_SHARDS = None
+
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self._config = config
 
-        self._frontier = list()
-        self._domains_last_accessed = {}
+        # URLs to be downloaded, queued per domain and handed out in politeness order
+        self._frontier = ShardedScheduler.create(
+            self._config.time_delay, self.NUM_SHARDS or self._config.frontier_shards)
+        # guards _in_flight and _holds; notified whenever URLs are added or completed, waking workers in get_tbd_url()
+        self._state_lock = TimedLock()
+        self._work_available = threading.Condition(self._state_lock)
+        # number of URLs handed out by get_tbd_url() that have not been passed to mark_url_complete() yet
+        self._in_flight = 0
+        # number of hold() calls not yet released; the frontier is not empty while held
+        self._holds = 0
+
+        # in-memory seen index, one dict per shard guarded by the shard's lock;
+        # maps a url hash to (url, downloaded, domain) and serves every membership check.
+        # URLs are kept as plain strings, since only queued and in flight URLs need their parsed parts; the domain is
+        # kept so compacting the log never has to parse them
+        self._seen_urls = [{} for _ in self._frontier.shards]
+        self._compact_lock = threading.Lock()
+        # append-only log of every change to the frontier, written in batches (write-behind)
+        self._log = FrontierLog(self._config.save_file)
+        self._last_saved = time.time()
 
         if restart or os.getenv("TESTING") == "true" or not glob.glob(f"{self._config.save_file}*"):
             self._restart_save()
         else:
             self._load_save()
 
-        # used in empty(), set in restart_save() or load_save()
-        self._last_updated = time.time()
-
     def _restart_save(self):
         assert len(
             self._frontier) == 0, "_restart_save() only to be called during initialization"
@@ -33,12 +60,14 @@ class Frontier(object):
         for file_path in glob.glob(f"{self._config.save_file}*"):
             if os.path.isfile(file_path):
                 os.remove(file_path)
+        self._open_save()
 
         self.logger.info(f"Starting from seed: {self._config.seed_urls}")
-        for url in self._config.seed_urls:
-            self.add_url(url)
-            domain = get_domain_name(url)
-            self._domains_last_accessed[domain] = 0
+        self.add_urls(self._config.seed_urls)
+
+    def _open_save(self):
+        """Prepare a new, empty save file. The log needs no preparation; it is created by its first write."""
+        pass
 
     def _load_save(self):
         if os.getenv("TESTING") == "true":
@@ -47,142 +76,321 @@ class Frontier(object):
         assert len(
             self._frontier) == 0, "_load_save() only to be called during initialization"
 
-        with shelve.open(self._config.save_file) as seen_urls:
-            for url_hash, (url, downloaded) in seen_urls.items():
-                if not downloaded:
-                    self._frontier.append(url)
-                domain = get_domain_name(url)
-                self._domains_last_accessed[domain] = 0
-            self.logger.info(
-                f"Starting from save in {self._config.save_file}. Added {len(self._frontier)} to frontier.")
+        start = time.time()
+        if dbm.whichdb(self._config.save_file):
+            self._migrate_shelve()
+
+        seen_urls, waiting_urls = self._log.replay()
+        if self._log.fingerprint != canonical.fingerprint():
+            seen_urls, waiting_urls = self._rehash(seen_urls, waiting_urls)
+        for urlhash, entry in seen_urls.items():
+            self._seen_urls[self._frontier.shard_of(entry[2])][urlhash] = entry
+        # queued as plain strings, and only made into URL records as they are handed out
+        self._frontier.push_many(waiting_urls)
+        self.logger.info(
+            f"Starting from save in {self._config.save_file}. Replayed {self._log.records} records in "
+            f"{time.time() - start:.2f}s. Added {len(self._frontier)} to frontier.")
+
+    def _rehash(self, seen_urls, waiting_urls):
+        """
+        Key a replayed seen index by the hashes of the URLs' current canonical forms. Only called for saves whose
+        canonical fingerprint differs from the current one: saves made before URLs were canonicalized, or with other
+        IGNOREDPARAMS or FOLDWWW. If that changed their keys, they are rewritten, and URLs that turn out to be
+        duplicates of each other are only queued once, if none of them were downloaded yet.
+        """
+        rehashed = {}
+        for entry in seen_urls.values():
+            urlhash = get_urlhash(entry[0])
+            previous = rehashed.get(urlhash)
+            if previous is None or (entry[1] and not previous[1]):
+                rehashed[urlhash] = entry
+        if rehashed.keys() == seen_urls.keys():
+            self._log.stamp()
+            return seen_urls, waiting_urls
+
+        queued = set()
+        waiting = []
+        for url, domain in waiting_urls:
+            urlhash = get_urlhash(url)
+            if not rehashed[urlhash][1] and urlhash not in queued:
+                queued.add(urlhash)
+                waiting.append((url, domain))
+        self._log.compact(rehashed)
+        self.logger.info(
+            f"Rehashed {len(seen_urls)} saved URLs into {len(rehashed)} canonical URLs, "
+            f"dropping {len(waiting_urls) - len(waiting)} duplicates from the frontier.")
+        return rehashed, waiting
+
+    def _migrate_shelve(self):
+        """Convert a save file from before the frontier log (a shelf of url hash -> (url, downloaded)) into a log."""
+        self.logger.info(
+            f"Converting shelf {self._config.save_file} into a frontier log.")
+        with shelve.open(self._config.save_file, "r") as shelf:
+            seen_urls = {
+                urlhash: (url, downloaded, get_domain_name(url)) for urlhash, (url, downloaded) in shelf.items()}
+        for suffix in ["", ".db", ".dat", ".dir", ".bak"]:
+            if os.path.isfile(self._config.save_file + suffix):
+                os.remove(self._config.save_file + suffix)
+        # keyed by the hashes the shelf was written with, so they are rehashed once it is replayed
+        self._log.compact(seen_urls, canonicalized=False)
 
     def _test_clear_seen_urls(self):
-        with shelve.open(self._config.save_file) as seen_urls:
+        for seen_urls in self._seen_urls:
             seen_urls.clear()
+        self._log.clear()
 
-    # def _sync_shelf(self):
-    #     """Call this every once every period of time to sync shelf."""
-    #     if os.getenv("TESTING") == "true":
-    #         return
-
-    #     with shelve.open(self._config.save_file) as seen_urls:
-    #         seen_urls.update(self._seen_urls)
-    #         seen_urls.sync()
+    def _save(self):
+        """
+        Append every buffered record to the log in one write.
+        Records are written in the order they happened. Downloads are left for save_downloads(), so URLs scraped from
+        a page are always saved before that page is marked as downloaded. A crash can at worst cause a page to be
+        downloaded again on restart.
+        """
+        self._log.flush()
+        if self._log.should_compact(sum(len(seen_urls) for seen_urls in self._seen_urls)):
+            self._compact()
+        self._last_saved = time.time()
+
+    @contextlib.contextmanager
+    def _all_shards_locked(self):
+        # every shard is locked, in order, so the seen index holds still
+        for lock in self._frontier.locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._frontier.locks):
+                lock.release()
+
+    def _compact(self):
+        # one thread compacts at a time; the others carry on rather than compact again after it
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            if self._log.should_compact(sum(len(seen_urls) for seen_urls in self._seen_urls)):
+                # the shards are only locked while the seen index is copied, not while the copy is written
+                records_before, duration = self._log.compact(ChainMap(*self._seen_urls), self._all_shards_locked)
+                self.logger.info(
+                    f"Compacted {self._config.save_file} from {records_before} to {self._log.records} records in {duration:.2f}s.")
+        finally:
+            self._compact_lock.release()
+
+    def _unsaved_changes(self):
+        return len(self._log)
+
+    def _maybe_save(self):
+        """
+        Save once enough changes have piled up, or enough time has passed since the last save.
+        Must be called without holding a shard's lock.
+        """
+        if self._unsaved_changes() >= self._config.save_batch_size \
+                or time.time() - self._last_saved >= self._config.save_interval:
+            self._save()
+
+    # The _record_* methods are called while holding the lock of the shard the URL's domain belongs to.
+    def _record_seen(self, shard, urlhash, domain, url):
+        """Add a URL to the seen index. Returns False if it had already been seen."""
+        seen_urls = self._seen_urls[shard]
+        if urlhash in seen_urls:
+            return False
+        seen_urls[urlhash] = (str(url), False, domain)  # seen, but not downloaded
+        self._log.seen(urlhash, domain, url)
+        return True
+
+    def _record_dequeued(self, url):
+        self._log.dequeued(url.urlhash)
+
+    def _record_downloaded(self, shard, urlhash, domain, url):
+        self._seen_urls[shard][urlhash] = (str(url), True, domain)
+        self._log.downloaded(urlhash, url, domain)
+
+    def save_downloads(self):
+        """
+        Save the URLs completed since the last call as downloaded, which _save() leaves out, along with any other
+        unsaved progress. Called once the deliverables are checkpointed: pages are added to the deliverables before
+        they are marked downloaded, so every page the save file records as downloaded is in their checkpoint too,
+        even after a crash.
+        """
+        self._log.flush(downloads=True)
+
+    def sync(self):
+        """Write any unsaved progress to the save file. Called when the crawler shuts down, even if it was stopped."""
+        self._save()
+        stats = self.lock_stats()
+        self.logger.info(
+            "Waited on frontier locks: " + ", ".join(
+                f"{name} {s['contentions']} of {s['acquisitions']} times for {s['wait_time']:.2f}s"
+                for name, s in stats.items()) + ".")
+
+    def lock_stats(self):
+        """How often, and for how long in total, threads had to wait on each kind of lock in the frontier."""
+        return {
+            "shards": lock_stats(self._frontier.locks),
+            "state": lock_stats([self._state_lock]),
+            "log": lock_stats([self._log.write_lock]),
+        }
 
     def _can_access_domain(self, domain):
-        if domain not in self._domains_last_accessed:
-            return True
+        return self._frontier.is_ready(domain)
 
-        if time.time() - self._domains_last_accessed[domain] > self._config.time_delay:
-            return True
-
-        return False
+    def _unsafe_add_urls(self, shard, urls):
+        """
+        Add the URL records of one shard that have not been seen before to the frontier.
+        Must be called while holding the shard's lock. Returns the number of URLs added.
+        """
+        new_urls = [
+            (url, url.domain) for url in urls
+            if self._record_seen(shard, url.urlhash, url.domain, url)]
+        self._frontier.shards[shard].push_many(new_urls)
+        return len(new_urls)
 
-    def _set_domain_seen(self, domain):
-        self._domains_last_accessed[domain] = time.time()
+    def add_url(self, url):
+        self.add_urls([url])
 
-    def _unsafe_get_tbd_url(self):
-        """Get the next URL from the frontier in a potentially non-thread-safe manner."""
-        if self.empty():
-            return None
+    def add_urls(self, urls):
+        """
+        Add every URL in an iterable to the frontier, such as all links scraped from a page.
+        URLs are made into URL records (unless they already are) and assigned a shard before taking any lock, then
+        deduplicated and queued one shard at a time, holding only that shard's lock.
+        """
+        by_shard = {}
+        for url in urls:
+            url = URL(url)
+            by_shard.setdefault(self._frontier.shard_of(url.domain), []).append(url)
 
-        try:
-            for i in range(len(self._frontier)):
-                index = -1-i
-                current_url = self._frontier[index]
-                domain = get_domain_name(current_url)
-                if self._can_access_domain(domain):
-                    self._set_domain_seen(domain)
-                    del self._frontier[index]
-                    return current_url
-        except IndexError:
-            return None
-
-        return None
-
-    def _unsafe_add_url(self, url):
-        """
-        Add the URL to the frontier
-        """
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        with shelve.open(self._config.save_file) as seen_urls:
-            if urlhash not in seen_urls:
-                seen_urls[urlhash] = (url, False)  # seen, but not downloaded
-                self._frontier.append(url)
-                self._last_updated = time.time()
-
-        # if urlhash not in self._seen_urls:
-        #     self._seen_urls[urlhash] = (url, False)  # seen, but not downloaded
-        #     self._frontier.append(url)
-
-        # # save _seen_url to shelf every 50 URLs processed
-        # if len(self._seen_urls) % 50 == 0:
-        #     self._sync_shelf()
+        added = 0
+        for shard, shard_urls in by_shard.items():
+            with self._frontier.locks[shard]:
+                added += self._unsafe_add_urls(shard, shard_urls)
+        self._maybe_save()
 
-    def add_url(self, url):
-        with THREAD_LOCK:
-            self._unsafe_add_url(url)
+        if added:
+            with self._work_available:
+                self._work_available.notify(added)
 
     def url_seen(self, urlhash: str) -> bool:
         """Takes a URL hash and determines if it has been seen"""
-        with shelve.open(self._config.save_file) as seen_urls:
-            return urlhash in seen_urls
-        # return urlhash in self._seen_urls
+        return any(urlhash in seen_urls for seen_urls in self._seen_urls)
 
     def url_downloaded(self, urlhash: str) -> bool:
         """Takes a URL hash and determines if it has been downloaded"""
-        with shelve.open(self._config.save_file) as seen_urls:
-            return urlhash in seen_urls and seen_urls[urlhash][1]
-        # return urlhash in self._seen_urls and self._seen_urls[urlhash][1]
+        return any(seen_urls.get(urlhash, (None, False))[1] for seen_urls in self._seen_urls)
+
+    def idle(self):
+        """Whether no URLs are waiting and no URLs are being downloaded."""
+        with self._work_available:
+            return self._unsafe_idle()
 
     def empty(self):
-        if os.getenv("TESTING") == "true":
-            return len(self._frontier) == 0
-        else:
-            # there is an issue we want to avoid when the seed URLs or loaded URLs in the frontier
-            # are less than number of workers, causing the workers to shut down
-            # but the seed URLs scrape in a ton of URLs, essentially causing the workers to shut down for no reason
-            # return len(self._frontier) == 0 and self._initial_url_count > len(self._config.seed_urls)
-            return len(self._frontier) == 0 and time.time() - self._last_updated > 10
+        """
+        The crawl is over once no URLs are waiting and no URLs are being downloaded.
+        A URL that is still being downloaded can scrape in more URLs, so the frontier is not empty until it is completed.
+        """
+        with self._work_available:
+            return self._unsafe_empty()
+
+    def _unsafe_idle(self):
+        """
+        Must be called while holding _work_available. A worker adds the URLs it scraped before it completes its URL, so
+        read together under the lock, the queue and _in_flight cannot both look empty while scraped URLs are on the way.
+        """
+        return len(self._frontier) == 0 and self._in_flight == 0
 
-    def get_tbd_url(self):
-        with THREAD_LOCK:
-            return self._unsafe_get_tbd_url()
+    def _unsafe_empty(self):
+        """Must be called while holding _work_available."""
+        return self._holds == 0 and self._unsafe_idle()
 
-    def _unsafe_mark_url_complete(self, url):
+    def hold(self):
         """
-        Since the removal of the frontier save, this is no longer used.
+        Keep the frontier from becoming empty until release() is called, such as while URLs may still be added from
+        outside the crawler's workers. Workers wait in get_tbd_url() instead of shutting down while it is held.
         """
-        urlhash = get_urlhash(url)
-        with shelve.open(self._config.save_file) as seen_urls:
-            seen_urls[urlhash] = (url, True)
+        with self._work_available:
+            self._holds += 1
 
-            # if downloaded
-            if not (urlhash in seen_urls and seen_urls[urlhash][1]):
-                # This should not happen.
-                message = f"Marking url {url} as complete, but have already downloaded it before."
-                self.logger.error(message)
-                assert False, message
+    def release(self):
+        with self._work_available:
+            self._holds -= 1
+            if self._unsafe_empty():
+                # wake every blocked worker so they can all shut down
+                self._work_available.notify_all()
 
-            if urlhash not in seen_urls:
-                # this should not happen either
-                message = f"Marking url {url} as complete and downloaded, but have not seen it before."
-                self.logger.warning(message)
+    def get_tbd_url(self, timeout=0):
+        """
+        Get the next URL to download.
+        If no domain is ready, block for up to timeout seconds (forever if timeout is None), waking up exactly when
+        a domain's politeness delay expires or when add_url() makes new work available.
+        Returns None if the frontier is empty, or if no URL became available in time.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._work_available:
+                if self._unsafe_empty():
+                    return None
+                # counted as in flight before popping, so no other thread sees an empty frontier while a URL is popped
+                self._in_flight += 1
+
+            # only the shard's lock is held while popping, so threads popping from different shards run side by side
+            url = self._frontier.pop()
+            if url is not None:
+                url = URL(url)
+                self._record_dequeued(url)
+                return url
+
+            with self._work_available:
+                self._in_flight -= 1
+                if self._unsafe_empty():
+                    # wake every blocked worker so they can all shut down
+                    self._work_available.notify_all()
+                    return None
+
+                # None if nothing is queued; URLs are still in flight, so wait for them to add URLs or complete
+                wait = self._frontier.time_until_ready()
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._work_available.wait(wait)
+
+    def time_until_ready(self):
+        """Seconds until get_tbd_url() can hand out another URL, or None if the frontier has no URLs left."""
+        return self._frontier.time_until_ready()
+
+    def _unsafe_downloaded(self, shard, urlhash):
+        """
+        Whether a URL of the shard was downloaded, or None if it was never seen. Only looks in the shard's own part of
+        the seen index, so it must be called while holding the shard's lock.
+        """
+        entry = self._seen_urls[shard].get(urlhash)
+        return None if entry is None else entry[1]
 
-        # if self.url_downloaded(urlhash):
-        #     # This should not happen.
-        #     message = f"Marking url {url} as complete, but have already downloaded it before."
-        #     self.logger.error(message)
-        #     assert False, message
+    def _unsafe_mark_url_complete(self, shard, urlhash, domain, url):
+        """Must be called while holding the lock of the shard the URL's domain belongs to."""
+        downloaded = self._unsafe_downloaded(shard, urlhash)
+        if downloaded:
+            # This should not happen.
+            message = f"Marking url {url} as complete, but have already downloaded it before."
+            self.logger.error(message)
 
-        # if not self.url_seen(urlhash):
-        #     # this should not happen either
-        #     message = f"Marking url {url} as complete and downloaded, but have not seen it before."
-        #     self.logger.warning(message)
+        if downloaded is None:
+            # this should not happen either
+            message = f"Marking url {url} as complete and downloaded, but have not seen it before."
+            self.logger.warning(message)
 
-        # self._seen_urls[urlhash] = (url, True)
+        self._record_downloaded(shard, urlhash, domain, url)
 
     def mark_url_complete(self, url):
-        with THREAD_LOCK:
-            self._unsafe_mark_url_complete(url)
+        url = URL(url)
+        shard = self._frontier.shard_of(url.domain)
+        with self._frontier.locks[shard]:
+            self._unsafe_mark_url_complete(shard, url.urlhash, url.domain, url)
+        self._maybe_save()
+
+        with self._work_available:
+            # a completion without a matching get_tbd_url() would let the frontier look empty while URLs are in flight
+            assert self._in_flight > 0, f"Marking url {url} as complete, but no URL was handed out to be downloaded."
+            self._in_flight -= 1
+            if self._unsafe_empty():
+                # wake every blocked worker so they can all shut down
+                self._work_available.notify_all()
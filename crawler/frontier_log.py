@@ -0,0 +1,210 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from utils import canonical, get_domain_name
+from crawler.locks import TimedLock
+
+
+# a log is compacted once it holds this many times more records than there are seen URLs
+COMPACT_RATIO = 2
+# logs smaller than this are never worth compacting
+COMPACT_MIN_RECORDS = 10000
+
+# record kinds; every record is a line of "kind \t url hash \t domain \t url"
+SEEN = "S"
+DOWNLOADED = "D"
+DEQUEUED = "Q"
+# the canonical fingerprint (see utils.canonical) the url hashes of the records after it were made with
+CANONICAL = "C"
+
+# urllib already strips these from parsed URLs, but they would corrupt the log if one slipped through
+_ESCAPES = str.maketrans({"\t": "%09", "\n": "%0A", "\r": "%0D"})
+
+
+class FrontierLog(object):
+    """
+    Append-only, line based storage for the frontier.
+    Every state change (a URL being seen, handed out, or downloaded) is buffered as a record and appended to the
+    log in batches. On restart the log is replayed to rebuild the seen index and the frontier; replaying never
+    has to parse a URL, since each record already carries the URL's hash and domain.
+    Once most records are redundant, the log is compacted into a snapshot holding a single record per URL.
+
+    Records can be added from any thread. They are buffered under a short lock of their own, and written under a
+    separate lock, so threads adding records never wait for a write to reach the disk.
+
+    Download records are held back until flush(downloads=True), so the frontier can write them only once whatever
+    else a download produced, such as the deliverables, has been saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        # held while writing, so batches reach the file in the order they were buffered
+        self.write_lock = TimedLock()
+        # number of records in the log file, used to decide when to compact
+        self.records = 0
+        # the canonical fingerprint the log's url hashes were made with, as last recorded; None if it never was
+        self.fingerprint = None
+        # download records held back until flush(downloads=True), as (url hash, record)
+        self._downloads = []
+
+    def __len__(self):
+        """Number of records that the next flush() writes, leaving out the download records held back."""
+        return len(self._buffer)
+
+    @staticmethod
+    def _record(kind, urlhash, domain="", url=""):
+        return f"{kind}\t{urlhash}\t{domain}\t{url.translate(_ESCAPES)}\n"
+
+    def _append(self, record):
+        with self._buffer_lock:
+            self._buffer.append(record)
+
+    def seen(self, urlhash, domain, url):
+        self._append(FrontierLog._record(SEEN, urlhash, domain, url))
+
+    def dequeued(self, urlhash):
+        self._append(FrontierLog._record(DEQUEUED, urlhash))
+
+    def downloaded(self, urlhash, url, domain=""):
+        with self._buffer_lock:
+            self._downloads.append((urlhash, FrontierLog._record(DOWNLOADED, urlhash, domain, url)))
+
+    def stamp(self):
+        """Record that the url hashes logged from now on are made with the current canonical fingerprint."""
+        self.fingerprint = canonical.fingerprint()
+        self._append(FrontierLog._record(CANONICAL, self.fingerprint))
+
+    def flush(self, downloads=False):
+        """
+        Append every buffered record to the log file, in the order they were made, and the download records held back
+        too if downloads is True. Those are written after the other records, so the URLs scraped from a page are
+        always saved before the page is saved as downloaded.
+        """
+        with self.write_lock:
+            self._flush(downloads)
+
+    def _flush(self, downloads=False):
+        with self._buffer_lock:
+            buffer, self._buffer = self._buffer, []
+            if downloads:
+                buffer += [record for _, record in self._downloads]
+                self._downloads = []
+        if not buffer:
+            return
+        if self.records == 0:
+            # a new log starts with the fingerprint its url hashes are made with
+            self.fingerprint = canonical.fingerprint()
+            buffer.insert(0, FrontierLog._record(CANONICAL, self.fingerprint))
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(buffer))
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += len(buffer)
+
+    def clear(self):
+        with self.write_lock, self._buffer_lock:
+            self._buffer.clear()
+            self._downloads.clear()
+            open(self.path, "w").close()
+            self.records = 0
+            self.fingerprint = None
+
+    def replay(self, repair=True):
+        """
+        Rebuild the frontier's state from the log.
+        Returns the seen index (url hash -> (url, downloaded, domain)) and the URLs that still need to be downloaded,
+        as a list of (url, domain). URLs that were handed out but never downloaded, most likely because the crawler
+        stopped while downloading them, come first.
+        Unless repair is False, a record torn by a crash is cut off the log, so new records are not appended onto it.
+        """
+        seen_urls = {}
+        dequeued = set()
+        valid_length = 0
+        self.records = 0
+        self.fingerprint = None
+
+        if not os.path.isfile(self.path):
+            return seen_urls, []
+
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # a record torn by a crash; everything before it is intact
+                    break
+                valid_length += len(line)
+                self.records += 1
+
+                kind, urlhash, domain, url = line[:-1].decode("utf-8").split("\t", 3)
+                if kind == SEEN:
+                    if urlhash not in seen_urls:
+                        seen_urls[urlhash] = (url, False, sys.intern(domain))
+                elif kind == DOWNLOADED:
+                    if not domain and urlhash in seen_urls:
+                        # only logs written before download records carried a domain
+                        domain = seen_urls[urlhash][2]
+                    seen_urls[urlhash] = (url, True, sys.intern(domain))
+                elif kind == DEQUEUED:
+                    dequeued.add(urlhash)
+                elif kind == CANONICAL:
+                    self.fingerprint = urlhash
+
+        if repair and valid_length != os.path.getsize(self.path):
+            os.truncate(self.path, valid_length)
+
+        interrupted, waiting = [], []
+        for urlhash, (url, downloaded, domain) in seen_urls.items():
+            if not domain:
+                domain = sys.intern(get_domain_name(url))
+                seen_urls[urlhash] = (url, downloaded, domain)
+            if not downloaded:
+                (interrupted if urlhash in dequeued else waiting).append((url, domain))
+
+        return seen_urls, interrupted + waiting
+
+    def should_compact(self, num_seen_urls):
+        return self.records >= COMPACT_MIN_RECORDS and self.records > COMPACT_RATIO * num_seen_urls
+
+    def compact(self, seen_urls, freeze=contextlib.nullcontext, canonicalized=True):
+        """
+        Replace the log with a snapshot of the seen index (url hash -> (url, downloaded, domain)), holding one record
+        per URL. The snapshot is written to a temporary file first, so a crash during compaction leaves the old log
+        intact. The seen index is copied inside freeze(), a context that keeps it from changing, and written after.
+        Records made meanwhile are appended to the new log, as no batch can be written until it is in place.
+        Downloads whose records are still held back are snapshotted as seen, and only saved as downloaded by the next
+        flush(downloads=True).
+        Unless canonicalized is False, the seen index is keyed by hashes made with the current canonical fingerprint.
+        """
+        with self.write_lock:
+            start = time.time()
+            # flushed before the seen index is frozen too, so it is frozen for as few records as possible
+            self._flush()
+            with freeze():
+                self._flush()
+                seen_urls = dict(seen_urls)
+                with self._buffer_lock:
+                    held_back = {urlhash for urlhash, _ in self._downloads}
+            tmp_path = f"{self.path}.compact"
+            records = 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                fingerprint = canonical.fingerprint() if canonicalized else None
+                if fingerprint is not None:
+                    f.write(FrontierLog._record(CANONICAL, fingerprint))
+                    records += 1
+                for urlhash, (url, downloaded, domain) in seen_urls.items():
+                    downloaded = downloaded and urlhash not in held_back
+                    f.write(FrontierLog._record(DOWNLOADED if downloaded else SEEN, urlhash, domain, url))
+                    records += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            records_before = self.records
+            self.records = records
+            self.fingerprint = fingerprint
+            return records_before, time.time() - start
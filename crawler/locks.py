@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+class TimedLock(object):
+    """
+    Lock that keeps track of how often threads had to wait to acquire it, and for how long.
+    The statistics are only updated while the lock is held, so they need no lock of their own.
+    """
+
+    def __init__(self, reentrant=False):
+        self._lock = threading.RLock() if reentrant else threading.Lock()
+        self.acquisitions = 0
+        self.contentions = 0
+        self.wait_time = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(blocking=False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+
+        start = time.perf_counter()
+        if not self._lock.acquire(timeout=timeout):
+            return False
+        self.acquisitions += 1
+        self.contentions += 1
+        self.wait_time += time.perf_counter() - start
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def lock_stats(locks):
+    """Combined statistics of some TimedLocks."""
+    locks = list(locks)
+    return {
+        "acquisitions": sum(lock.acquisitions for lock in locks),
+        "contentions": sum(lock.contentions for lock in locks),
+        "wait_time": sum(lock.wait_time for lock in locks),
+    }
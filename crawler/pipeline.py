@@ -0,0 +1,155 @@
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threading import Thread, Lock
+
+from utils import get_logger
+from utils.download import download
+import scraper
+
+
+# the indexer logs the pipeline's statistics every this many pages
+STATS_INTERVAL = 100
+
+
+class Stage(object):
+    """Statistics of one stage of the pipeline: items it finished, and how long it was held up by the next stage."""
+
+    def __init__(self, name, output=None):
+        self.name = name
+        self.output = output
+        self.processed = 0
+        self.blocked_time = 0.0
+        self._lock = Lock()
+
+    def put(self, item):
+        """Hand an item to the next stage, waiting while its queue is full (backpressure)."""
+        start = time.perf_counter()
+        self.output.put(item)
+        with self._lock:
+            self.processed += 1
+            self.blocked_time += time.perf_counter() - start
+
+    def done(self):
+        """Count an item finished by the last stage, which has no queue to put it on."""
+        with self._lock:
+            self.processed += 1
+            return self.processed
+
+    def stats(self):
+        stats = {"processed": self.processed, "blocked_time": self.blocked_time}
+        if self.output is not None:
+            stats["queue_depth"] = self.output.qsize()
+        return stats
+
+
+class Pipeline(Thread):
+    """
+    Crawls in three stages that run side by side, so waiting on the network and parsing overlap:
+    - THREADCOUNT fetcher threads take URLs from the frontier and download them,
+    - PARSEPROCESSES parser threads each check a downloaded page, and have a parse process turn it into links and
+      deliverable data,
+    - one indexer thread adds the links to the frontier, updates the deliverables and completes the URL.
+    Stages are connected by queues holding at most PIPELINEQUEUE items. A stage that gets ahead of the next one waits
+    for room in its queue, which shows up in the stage's blocked_time.
+    Runs as a single thread, so Crawler can start and join it like any worker.
+    """
+    # run by the parser threads, with the pool to parse in; only the page's bytes are sent to the parse process
+    scrape_page = staticmethod(scraper.scrape)
+
+    def __init__(self, worker_id, config, frontier, global_deliverable):
+        self.logger = get_logger(f"Pipeline-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.global_deliverable = global_deliverable
+
+        self._fetched = queue.Queue(maxsize=config.pipeline_queue_size)
+        self._parsed = queue.Queue(maxsize=config.pipeline_queue_size)
+        self.fetch_stage = Stage("fetch", self._fetched)
+        self.parse_stage = Stage("parse", self._parsed)
+        self.index_stage = Stage("index")
+        super().__init__(daemon=True)
+
+    def run(self):
+        # spawned rather than forked, since forking while other threads hold locks (such as logging's) can deadlock
+        with ProcessPoolExecutor(self.config.parse_processes, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=self.config.apply) as pool:
+            fetchers = [Thread(target=self._fetch, name=f"Fetcher-{i}", daemon=True)
+                        for i in range(self.config.threads_count)]
+            parsers = [Thread(target=self._parse, args=(pool,), name=f"Parser-{i}", daemon=True)
+                       for i in range(self.config.parse_processes)]
+            indexer = Thread(target=self._index, name="Indexer", daemon=True)
+            for thread in [*fetchers, *parsers, indexer]:
+                thread.start()
+
+            # the fetchers stop once the frontier is empty, which is only once every URL went through every stage
+            for thread in fetchers:
+                thread.join()
+            for _ in parsers:
+                self._fetched.put(None)
+            for thread in parsers:
+                thread.join()
+            self._parsed.put(None)
+            indexer.join()
+
+        self.logger.info(f"Pipeline shutting down. {self._format_stats()}")
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in [self.fetch_stage, self.parse_stage, self.index_stage]}
+
+    def _format_stats(self):
+        return " ".join(
+            f"{name}: {s['processed']} processed, blocked {s['blocked_time']:.1f}s"
+            + (f", {s['queue_depth']} queued." if "queue_depth" in s else ".")
+            for name, s in self.stats().items())
+
+    def _download(self, url):
+        return download(url, self.config, self.logger)
+
+    def _fetch(self):
+        while True:
+            # blocks until a domain is ready, only returning None once the frontier is empty
+            tbd_url = self.frontier.get_tbd_url(timeout=None)
+            if tbd_url is None:
+                break
+            self.logger.info(f"Fetching {tbd_url}")
+            try:
+                resp = self._download(tbd_url)
+            except Exception as e:
+                self.logger.exception(f"Failed to download {tbd_url}: {e}")
+                resp = None
+            self.fetch_stage.put((tbd_url, resp))
+
+    def _parse(self, pool):
+        while True:
+            item = self._fetched.get()
+            if item is None:
+                break
+            tbd_url, resp = item
+            links, deliverable_data = [], None
+            if resp is not None:
+                try:
+                    links, deliverable_data = self.scrape_page(tbd_url, resp, pool)
+                except Exception as e:
+                    self.logger.exception(f"Failed to parse {tbd_url}: {e}")
+            self.parse_stage.put((tbd_url, links, deliverable_data))
+
+    def _index(self):
+        while True:
+            item = self._parsed.get()
+            if item is None:
+                break
+            tbd_url, links, deliverable_data = item
+            try:
+                if deliverable_data is not None:
+                    self.global_deliverable.update(deliverable_data)
+                self.frontier.add_urls(links)
+            except Exception as e:
+                self.logger.exception(f"Failed to index {tbd_url}: {e}")
+            finally:
+                # the frontier counts this URL as in flight until it is completed, so it must be completed even on failure
+                self.frontier.mark_url_complete(tbd_url)
+
+            if self.index_stage.done() % STATS_INTERVAL == 0:
+                self.logger.info(self._format_stats())
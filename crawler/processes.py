@@ -0,0 +1,157 @@
+import copy
+import queue
+import signal
+import sys
+import threading
+from hashlib import sha256
+
+from utils import get_logger
+from utils.url import URL
+
+
+# seconds a process waits for forwarded URLs before checking whether it, or the whole crawl, has run out of work
+POLL_INTERVAL = 0.5
+
+
+def domain_partition(domain, num_partitions):
+    """
+    Index of the crawler process that owns a domain.
+    Hashed with sha256 rather than the crc32 that stripes a frontier into shards, so the domains of one process
+    still spread over all of its frontier's shards.
+    """
+    return int.from_bytes(sha256(domain.encode("utf-8")).digest()[:8], "big") % num_partitions
+
+
+class FrontierPartition(object):
+    """
+    The frontier of one process in a multiprocess crawl, which only holds the domains of its own partition.
+    Scraped URLs of other partitions' domains are forwarded, in one batch per partition, to the inbox queue of the
+    process that owns them, and a receiver thread adds the URLs forwarded to this process to its frontier.
+
+    The crawl is over once no process has work left and no batch is on its way, which is tracked by a counter shared
+    between all processes: every process counts 1 while it has URLs waiting or being downloaded, and every forwarded
+    batch counts 1 until its receiver has added it. A process only stops counting itself from its receiver thread,
+    the only place new work can come from once its own workers are idle, so the counter cannot reach 0 early.
+    """
+
+    def __init__(self, frontier, partition, inboxes, pending):
+        self.logger = get_logger(f"PARTITION-{partition}", "FRONTIER")
+        self._frontier = frontier
+        self._partition = partition
+        self._inboxes = inboxes
+        self._pending = pending
+        self._forwarded = 0
+        self._received = 0
+
+        # the workers must keep waiting for forwarded URLs until the whole crawl is over
+        self._frontier.hold()
+        self._receiver = threading.Thread(
+            target=self._receive, name=f"Receiver-{partition}", daemon=True)
+
+    def start(self):
+        self._receiver.start()
+
+    def _add_pending(self, amount):
+        with self._pending.get_lock():
+            self._pending.value += amount
+
+    def _receive(self):
+        active = True
+        while True:
+            try:
+                urls = self._inboxes[self._partition].get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                urls = None
+
+            if urls is not None:
+                if not active:
+                    self._add_pending(1)
+                    active = True
+                self._frontier.add_urls(urls)
+                self._received += len(urls)
+                self._add_pending(-1)
+            elif active and self._frontier.idle():
+                self._add_pending(-1)
+                active = False
+            elif not active and self._pending.value == 0:
+                break
+
+        self.logger.info(
+            f"Crawl finished. Forwarded {self._forwarded} URLs to other processes, received {self._received}.")
+        self._frontier.release()
+
+    def add_url(self, url):
+        self.add_urls([url])
+
+    def add_urls(self, urls):
+        own_urls = []
+        forwarded = {}
+        for url in urls:
+            url = URL(url)
+            partition = domain_partition(url.domain, len(self._inboxes))
+            if partition == self._partition:
+                own_urls.append(url)
+            else:
+                forwarded.setdefault(partition, []).append(url)
+
+        self._frontier.add_urls(own_urls)
+        for partition, partition_urls in forwarded.items():
+            # counted before it is sent, while the URL that scraped it is still in flight
+            self._add_pending(1)
+            self._inboxes[partition].put(partition_urls)
+            self._forwarded += len(partition_urls)
+
+    def get_tbd_url(self, timeout=0):
+        return self._frontier.get_tbd_url(timeout)
+
+    def mark_url_complete(self, url):
+        self._frontier.mark_url_complete(url)
+
+    def empty(self):
+        return self._frontier.empty()
+
+    def time_until_ready(self):
+        return self._frontier.time_until_ready()
+
+    def save_downloads(self):
+        self._frontier.save_downloads()
+
+    def sync(self):
+        # the receiver only ends once the whole crawl is over, when it releases the frontier, leaving it empty;
+        # a process stopped before then saves what it has without waiting for it
+        if self._frontier.empty():
+            self._receiver.join()
+        self._frontier.sync()
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(128 + signum)
+
+
+def crawl_partition(config, restart, partition, inboxes, pending, frontier_factory, worker_factory, global_deliverables):
+    """
+    Run one process of a multiprocess crawl, crawling the domains of its partition with THREADCOUNT workers.
+    Its frontier is saved next to SAVE, with the partition in the file name, and its deliverables are kept apart
+    until the main process merges them.
+    """
+    from crawler import Crawler
+
+    # terminate() stops a process with SIGTERM; exiting through Crawler.join() saves its progress first
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+
+    num_partitions = len(inboxes)
+    config = copy.copy(config)
+    config.processes = 1
+    # the processes share the CPUs, so they share the parse processes too
+    config.parse_processes = -(-config.parse_processes // num_partitions)
+    config.save_file = f"{config.save_file}-{partition}-of-{num_partitions}"
+    config.seed_urls = [
+        url for url in config.seed_urls
+        if domain_partition(URL(url).domain, num_partitions) == partition]
+
+    crawler = Crawler(config, restart, frontier_factory, worker_factory,
+                      global_deliverables=global_deliverables.partition(partition, num_partitions))
+    crawler.frontier = FrontierPartition(crawler.frontier, partition, inboxes, pending)
+    crawler.frontier.start()
+    crawler.start_async()
+    crawler.join()
@@ -0,0 +1,217 @@
+import heapq
+import itertools
+import time
+import zlib
+from collections import ChainMap, deque
+
+from utils import get_domain_name
+from crawler.locks import TimedLock
+
+
+class DomainScheduler(object):
+    """
+    Politeness aware queue of URLs that are yet to be downloaded.
+    URLs are kept in one FIFO queue per domain, and every domain with URLs waiting is kept in a min-heap keyed on the
+    next time that domain may be accessed. Getting the next URL is O(log d), where d is the number of domains waiting.
+    """
+
+    def __init__(self, time_delay, order=None):
+        self._time_delay = time_delay
+        # domain -> deque of URLs waiting to be downloaded
+        self._queues = {}
+        # (next allowed access time, insertion order, domain); exactly one entry per domain that has URLs waiting
+        self._heap = []
+        self._order = itertools.count() if order is None else order
+        self._size = 0
+
+        # domain -> time the domain was last handed out
+        self.last_accessed = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, url):
+        queue = self._queues.get(get_domain_name(url))
+        return queue is not None and url in queue
+
+    def _next_allowed(self, domain):
+        if domain not in self.last_accessed:
+            return 0
+        return self.last_accessed[domain] + self._time_delay
+
+    def is_ready(self, domain, now=None):
+        """Whether the politeness delay of the domain has passed."""
+        if now is None:
+            now = time.time()
+        return now > self._next_allowed(domain)
+
+    def _append(self, domain, url):
+        """Append a URL to the domain's queue. Returns True if the queue was empty before."""
+        queue = self._queues.get(domain)
+        if queue is None:
+            queue = self._queues[domain] = deque()
+        queue.append(url)
+        return len(queue) == 1
+
+    def _popleft(self, domain):
+        """Remove the oldest URL from the domain's queue. Returns the URL, and whether the queue still has URLs."""
+        queue = self._queues[domain]
+        url = queue.popleft()
+        if not queue:
+            del self._queues[domain]
+        return url, bool(queue)
+
+    def _schedule(self, domain):
+        heapq.heappush(
+            self._heap, (self._next_allowed(domain), next(self._order), domain))
+
+    def push(self, url, domain=None):
+        """Add a URL to the back of its domain's queue."""
+        if domain is None:
+            domain = get_domain_name(url)
+
+        if self._append(domain, url):
+            self._schedule(domain)
+        self._size += 1
+
+    def push_many(self, urls):
+        """Push every (url, domain) pair."""
+        for url, domain in urls:
+            self.push(url, domain)
+
+    def clear(self):
+        self._queues.clear()
+        self._heap.clear()
+        self._size = 0
+        self.last_accessed.clear()
+
+    def pop(self, now=None):
+        """
+        Remove and return the oldest URL of the domain that became ready first, marking that domain as accessed.
+        Returns None if there are no URLs, or if no domain is ready yet.
+        """
+        if now is None:
+            now = time.time()
+
+        if not self._heap or self._heap[0][0] >= now:
+            return None
+
+        _, _, domain = heapq.heappop(self._heap)
+        url, remaining = self._popleft(domain)
+        self._size -= 1
+        self.last_accessed[domain] = now
+
+        if remaining:
+            self._schedule(domain)
+
+        return url
+
+    def peek(self):
+        """
+        (next allowed access time, insertion order) of the domain that becomes ready first, or None if there are no URLs.
+        Safe to call without holding the scheduler's lock; the answer may just be stale by the time it is used.
+        """
+        try:
+            return self._heap[0][:2]
+        except IndexError:
+            return None
+
+    def time_until_ready(self, now=None):
+        """Seconds until the next domain becomes ready (0 if one already is), or None if there are no URLs."""
+        top = self.peek()
+        if top is None:
+            return None
+        if now is None:
+            now = time.time()
+        return max(0, top[0] - now)
+
+
+class ShardedScheduler(object):
+    """
+    DomainSchedulers striped over a fixed number of shards, each guarded by its own lock.
+    Every domain belongs to exactly one shard, so threads adding or handing out URLs of different domains rarely wait
+    on each other. The shards share one insertion counter, so domains that are ready at the same time are handed
+    out across shards in the order they were pushed, as a single DomainScheduler would. A push_many() batch is
+    queued one shard at a time, so only the order of each domain's own URLs is kept within a batch.
+    """
+
+    def __init__(self, schedulers):
+        self.shards = schedulers
+        # reentrant, so a shard's lock can also guard storage that is used both inside and outside of the shard
+        self.locks = [TimedLock(reentrant=True) for _ in schedulers]
+
+    @staticmethod
+    def create(time_delay, num_shards):
+        order = itertools.count()
+        return ShardedScheduler([DomainScheduler(time_delay, order) for _ in range(num_shards)])
+
+    def shard_of(self, domain):
+        """Index of the shard a domain belongs to. Stable across processes, unlike hash()."""
+        return zlib.crc32(domain.encode("utf-8")) % len(self.shards)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def __contains__(self, url):
+        index = self.shard_of(get_domain_name(url))
+        with self.locks[index]:
+            return url in self.shards[index]
+
+    @property
+    def last_accessed(self):
+        return ChainMap(*(shard.last_accessed for shard in self.shards))
+
+    def is_ready(self, domain, now=None):
+        return self.shards[self.shard_of(domain)].is_ready(domain, now)
+
+    def push(self, url, domain=None):
+        if domain is None:
+            domain = get_domain_name(url)
+        index = self.shard_of(domain)
+        with self.locks[index]:
+            self.shards[index].push(url, domain)
+
+    def push_many(self, urls):
+        by_shard = {}
+        for url, domain in urls:
+            by_shard.setdefault(self.shard_of(domain), []).append((url, domain))
+        for index, shard_urls in by_shard.items():
+            with self.locks[index]:
+                self.shards[index].push_many(shard_urls)
+
+    def clear(self):
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                shard.clear()
+
+    def ready_shards(self, now=None):
+        """
+        Indexes of the shards with a ready domain, in the order a single DomainScheduler would pick them.
+        Shards are peeked at without taking their locks, so a shard may no longer be ready once it is locked.
+        """
+        if now is None:
+            now = time.time()
+        tops = []
+        for index, shard in enumerate(self.shards):
+            top = shard.peek()
+            if top is not None and top[0] < now:
+                tops.append((top, index))
+        return [index for _, index in sorted(tops)]
+
+    def pop(self, now=None):
+        """Remove and return the next URL of the first ready shard, or None if no domain is ready."""
+        for index in self.ready_shards(now):
+            with self.locks[index]:
+                # the time is taken once the lock is held, so waiting on it never makes a domain look accessed earlier
+                url = self.shards[index].pop(now)
+            if url is not None:
+                return url
+        return None
+
+    def time_until_ready(self, now=None):
+        tops = [top for top in (shard.peek() for shard in self.shards) if top is not None]
+        if not tops:
+            return None
+        if now is None:
+            now = time.time()
+        return max(0, min(tops)[0] - now)
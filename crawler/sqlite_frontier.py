@@ -0,0 +1,325 @@
+import pickle
+import sqlite3
+import time
+
+from utils import canonical, get_domain_name, get_urlhash
+from crawler.frontier import Frontier
+from crawler.scheduler import DomainScheduler, ShardedScheduler
+from crawler.bloom import ScalableBloomFilter
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    urlhash TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    downloaded INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_downloaded ON urls (downloaded);
+
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_domain ON queue (domain, id);
+CREATE INDEX IF NOT EXISTS queue_url ON queue (url);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB
+);
+"""
+
+
+class SqliteDomainScheduler(DomainScheduler):
+    """
+    DomainScheduler that keeps its per-domain queues in the queue table of the frontier's database.
+    Only the heap of domains and the number of URLs queued per domain are kept in memory.
+    """
+
+    def __init__(self, db, time_delay):
+        super().__init__(time_delay)
+        self._db = db
+        # domain -> number of URLs queued
+        self._counts = {}
+
+    def __contains__(self, url):
+        return self._db.execute("SELECT 1 FROM queue WHERE url = ?", (url,)).fetchone() is not None
+
+    def _append(self, domain, url):
+        self._db.execute(
+            "INSERT INTO queue (domain, url) VALUES (?, ?)", (domain, url))
+        return self._count(domain, 1)
+
+    def _count(self, domain, added):
+        count = self._counts.get(domain, 0)
+        self._counts[domain] = count + added
+        return count == 0
+
+    def _popleft(self, domain):
+        queue_id, url = self._db.execute(
+            "SELECT id, url FROM queue WHERE domain = ? ORDER BY id LIMIT 1", (domain,)).fetchone()
+        self._db.execute("DELETE FROM queue WHERE id = ?", (queue_id,))
+
+        self._counts[domain] -= 1
+        if self._counts[domain] == 0:
+            del self._counts[domain]
+            return url, False
+        return url, True
+
+    def push_many(self, urls):
+        """Push every (url, domain) pair with a single insert."""
+        if not urls:
+            return
+        self._db.executemany(
+            "INSERT INTO queue (url, domain) VALUES (?, ?)", urls)
+        for _, domain in urls:
+            if self._count(domain, 1):
+                self._schedule(domain)
+        self._size += len(urls)
+
+    def clear(self):
+        super().clear()
+        self._db.execute("DELETE FROM queue")
+        self._counts.clear()
+
+    def load(self):
+        """Rebuild the in-memory heap from the queue table, scheduling domains in the order they were first queued."""
+        for domain, count in self._db.execute(
+                "SELECT domain, COUNT(*) FROM queue GROUP BY domain ORDER BY MIN(id)"):
+            self._counts[domain] = count
+            self._size += count
+            self._schedule(domain)
+
+
+class SqliteFrontier(Frontier):
+    """
+    Frontier that keeps its seen URLs and per-domain queues in an sqlite database, stored at SAVE with a .sqlite suffix.
+    The database runs in WAL mode, so it can be read (e.g. by the sqlite3 shell, to monitor the crawl) while crawling.
+    Changes are committed as one transaction per batch, using the same SAVEINTERVAL and SAVEBATCH as the log.
+
+    A Bloom filter of every seen URL hash sits in front of the urls table. Most URLs it has not seen are new, and
+    are queued without touching the database at all; only possible hits are confirmed with the urls table.
+
+    sqlite serializes writers anyway, so the frontier is not striped: its single shard's lock also guards the
+    connection and the seen filter.
+    """
+    NUM_SHARDS = 1
+
+    def __init__(self, config, restart):
+        self._db_path = f"{config.save_file}.sqlite"
+        self._db = None
+        self._uncommitted = 0
+
+        self._seen_filter = ScalableBloomFilter()
+        # newly seen URLs (url hash -> url), inserted into the urls table as one sorted batch when saving
+        self._unsaved_urls = {}
+        # completed URLs (url hash -> url), only marked downloaded in the urls table by save_downloads()
+        self._unsaved_downloads = {}
+        # how seen checks were answered: by the filter alone, or by the urls table (some of which were false positives)
+        self._filter_negatives = 0
+        self._filter_lookups = 0
+        self._filter_false_positives = 0
+
+        super().__init__(config, restart)
+
+    def _connect(self):
+        # every use of the connection is serialized by _db_lock
+        self._db = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(SCHEMA)
+        self._frontier = ShardedScheduler([SqliteDomainScheduler(
+            self._db, self._config.time_delay)])
+        self._db_lock = self._frontier.locks[0]
+
+    def _open_save(self):
+        self._connect()
+        self._save_fingerprint()
+        self._db.commit()
+
+    def _load_save(self):
+        start = time.time()
+        self._connect()
+        self._rehash()
+        self._load_seen_filter()
+        self._frontier.shards[0].load()
+
+        # URLs that were handed out but never downloaded, most likely because the crawler stopped while downloading them
+        lost_urls = [
+            (url, get_domain_name(url)) for url, in self._db.execute(
+                "SELECT url FROM urls WHERE downloaded = 0 AND url NOT IN (SELECT url FROM queue)")]
+        self._frontier.push_many(lost_urls)
+        self._db.commit()
+
+        self.logger.info(
+            f"Starting from save in {self._db_path} in {time.time() - start:.2f}s. "
+            f"Added {len(self._frontier)} to frontier, {len(lost_urls)} of which were being downloaded.")
+
+    def _save_fingerprint(self):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('canonical', ?)", (canonical.fingerprint(),))
+
+    def _rehash(self):
+        """
+        Key the urls table by the hashes of the URLs' current canonical forms, if the save was made with another
+        canonical fingerprint (see Frontier._rehash). URLs that turn out to be duplicates of each other are merged
+        into one row, and only the first of them queued stays queued, if none of them were downloaded yet.
+        """
+        saved = self._db.execute("SELECT value FROM meta WHERE key = 'canonical'").fetchone()
+        if saved is not None and saved[0] == canonical.fingerprint():
+            return
+
+        rows = self._db.execute("SELECT urlhash, url, downloaded FROM urls").fetchall()
+        rehashed = {}
+        for _, url, downloaded in rows:
+            urlhash = get_urlhash(url)
+            previous = rehashed.get(urlhash)
+            if previous is None or (downloaded and not previous[1]):
+                rehashed[urlhash] = (url, downloaded)
+
+        if rehashed.keys() != {urlhash for urlhash, _, _ in rows}:
+            queued = set()
+            dropped = []
+            for queue_id, url in self._db.execute("SELECT id, url FROM queue ORDER BY id").fetchall():
+                urlhash = get_urlhash(url)
+                if urlhash in queued or rehashed.get(urlhash, (url, 0))[1]:
+                    dropped.append((queue_id,))
+                else:
+                    queued.add(urlhash)
+                    # the queued URL stands for its duplicates, so none of them is taken for one lost in flight
+                    rehashed[urlhash] = (url, 0)
+            self._db.executemany("DELETE FROM queue WHERE id = ?", dropped)
+            self._db.execute("DELETE FROM urls")
+            self._db.executemany(
+                "INSERT INTO urls (urlhash, url, downloaded) VALUES (?, ?, ?)",
+                sorted((urlhash, url, downloaded) for urlhash, (url, downloaded) in rehashed.items()))
+            # the saved seen filter holds the old hashes
+            self._db.execute("DELETE FROM meta WHERE key IN ('seen_filter', 'seen_filter_urls')")
+            self.logger.info(
+                f"Rehashed {len(rows)} saved URLs into {len(rehashed)} canonical URLs, "
+                f"dropping {len(dropped)} duplicates from the frontier.")
+        self._save_fingerprint()
+        self._db.commit()
+
+    def _load_seen_filter(self):
+        """Load the seen filter saved with the urls table, or rebuild it from the table if it is missing or out of date."""
+        saved = dict(self._db.execute(
+            "SELECT key, value FROM meta WHERE key IN ('seen_filter', 'seen_filter_urls')"))
+        num_urls = self._db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+        if saved.get("seen_filter_urls") == num_urls:
+            self._seen_filter = pickle.loads(saved["seen_filter"])
+        else:
+            self.logger.info(
+                f"Rebuilding seen filter from {num_urls} URLs in {self._db_path}.")
+            for urlhash, in self._db.execute("SELECT urlhash FROM urls"):
+                self._seen_filter.add(urlhash)
+
+    def _save_seen_filter(self):
+        self._db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("seen_filter", pickle.dumps(self._seen_filter)),
+            ("seen_filter_urls", len(self._seen_filter))])
+
+    def seen_filter_stats(self):
+        return {
+            "urls": len(self._seen_filter),
+            "memory_bytes": self._seen_filter.memory(),
+            "expected_false_positive_rate": self._seen_filter.false_positive_rate(),
+            "answered_by_filter": self._filter_negatives,
+            "answered_by_database": self._filter_lookups,
+            "false_positives": self._filter_false_positives,
+        }
+
+    def sync(self):
+        """Write any unsaved progress to the database. Called when the crawler shuts down."""
+        super().sync()
+        with self._db_lock:
+            stats = self.seen_filter_stats()
+        self.logger.info(
+            f"Seen filter holds {stats['urls']} URLs in {stats['memory_bytes'] / 1e6:.1f}MB with an expected "
+            f"false positive rate of {stats['expected_false_positive_rate']:.4%}. "
+            f"{stats['answered_by_filter']} seen checks were answered by the filter, "
+            f"{stats['answered_by_database']} by the database ({stats['false_positives']} false positives).")
+
+    def _test_clear_seen_urls(self):
+        self._db.execute("DELETE FROM urls")
+        self._db.commit()
+        self._unsaved_urls.clear()
+        self._unsaved_downloads.clear()
+        self._seen_filter = ScalableBloomFilter()
+
+    def save_downloads(self):
+        self._save(downloads=True)
+
+    def _save(self, downloads=False):
+        with self._db_lock:
+            # sorted, so the inserts walk the urls table's index in order
+            self._db.executemany(
+                "INSERT OR IGNORE INTO urls (urlhash, url) VALUES (?, ?)", sorted(self._unsaved_urls.items()))
+            self._unsaved_urls.clear()
+            if downloads:
+                self._db.executemany(
+                    "INSERT INTO urls (urlhash, url, downloaded) VALUES (?, ?, 1) "
+                    "ON CONFLICT (urlhash) DO UPDATE SET downloaded = 1", sorted(self._unsaved_downloads.items()))
+                self._unsaved_downloads.clear()
+            # committed with the URLs it holds, so a crash never leaves the saved filter behind the urls table
+            self._save_seen_filter()
+            self._db.commit()
+            self._uncommitted = 0
+            self._last_saved = time.time()
+
+    def _unsaved_changes(self):
+        return self._uncommitted
+
+    def _record_seen(self, shard, urlhash, domain, url):
+        if urlhash in self._seen_filter:
+            self._filter_lookups += 1
+            if self.url_seen(urlhash):
+                return False
+            self._filter_false_positives += 1
+        else:
+            self._filter_negatives += 1
+
+        self._seen_filter.add(urlhash)
+        self._unsaved_urls[urlhash] = str(url)
+        self._uncommitted += 1
+        return True
+
+    def _record_dequeued(self, url):
+        # deleting the URL from the queue table is the record
+        self._uncommitted += 1
+
+    def _record_downloaded(self, shard, urlhash, domain, url):
+        if urlhash not in self._seen_filter:
+            self._seen_filter.add(urlhash)
+        self._unsaved_downloads[urlhash] = str(url)
+
+    def _unsafe_downloaded(self, shard, urlhash):
+        if urlhash not in self._seen_filter:
+            return None
+        if urlhash in self._unsaved_downloads:
+            return True
+        if urlhash in self._unsaved_urls:
+            return False
+        row = self._db.execute("SELECT downloaded FROM urls WHERE urlhash = ?", (urlhash,)).fetchone()
+        return None if row is None else row[0] == 1
+
+    def url_seen(self, urlhash: str) -> bool:
+        """Takes a URL hash and determines if it has been seen"""
+        with self._db_lock:
+            if urlhash not in self._seen_filter:
+                return False
+            return urlhash in self._unsaved_urls or urlhash in self._unsaved_downloads \
+                or self._db.execute("SELECT 1 FROM urls WHERE urlhash = ?", (urlhash,)).fetchone() is not None
+
+    def url_downloaded(self, urlhash: str) -> bool:
+        """Takes a URL hash and determines if it has been downloaded"""
+        with self._db_lock:
+            if urlhash not in self._seen_filter:
+                return False
+            if urlhash in self._unsaved_downloads:
+                return True
+            row = self._db.execute(
+                "SELECT downloaded FROM urls WHERE urlhash = ?", (urlhash,)).fetchone()
+            return row is not None and row[0] == 1
@@ -4,11 +4,8 @@ from inspect import getsource
 from utils.download import download
 from utils import get_logger
 import scraper
-import time
 from deliverables import RawDeliverableData, GlobalDeliverableData
 from crawler import Frontier
-import gc
-import time
 
 
 class Worker(Thread):
@@ -31,41 +28,29 @@ class Worker(Thread):
 
     def run(self):
         try:
-            num_url_processed = 0
             while True:
-                tbd_url = self.frontier.get_tbd_url()
+                # blocks until a domain is ready, only returning None once the frontier is empty
+                tbd_url = self.frontier.get_tbd_url(timeout=None)
                 if tbd_url is None:
-                    if self.frontier.empty():
-                        self.logger.info(
-                            "Frontier is empty. Stopping Crawler.")
-                        break
-                    else:
-                        self.logger.info(
-                            "Respecting politeness delay since there are no free links to download. Idling Crawler.")
-                        time.sleep(self.config.time_delay)
+                    self.logger.info(
+                        "Frontier is empty. Stopping Crawler.")
+                    break
                 else:
-                    self.logger.info(f"Fetching {tbd_url}")
-                    resp = download(tbd_url, self.config, self.logger)
-                    # self.logger.info(
-                    #     f"Downloaded {tbd_url}, status <{resp.status}>, "
-                    #     f"using cache {self.config.cache_server}.")
-                    num_url_processed += 1
-
-                    scraped_urls = scraper.scraper(
-                        tbd_url, resp, self.global_deliverable)
-
-                    for scraped_url in scraped_urls:
-                        self.frontier.add_url(scraped_url)
-
-                    self.frontier.mark_url_complete(tbd_url)
-
-                    # hail mary garbage collection so hopefully Linux stops killing my processes
-                    del resp
-                    del scraped_urls
-                    if num_url_processed % 20 == 0:
-                        gc.collect()
-
-                    time.sleep(self.config.time_delay)
+                    try:
+                        self.logger.info(f"Fetching {tbd_url}")
+                        resp = download(tbd_url, self.config, self.logger)
+                        # self.logger.info(
+                        #     f"Downloaded {tbd_url}, status <{resp.status}>, "
+                        #     f"using cache {self.config.cache_server}.")
+
+                        scraped_urls = scraper.scraper(
+                            tbd_url, resp, self.global_deliverable)
+
+                        self.frontier.add_urls(scraped_urls)
+                    finally:
+                        # the frontier counts this URL as in flight until it is completed,
+                        # so it must be completed even on failure, or the other workers would never shut down
+                        self.frontier.mark_url_complete(tbd_url)
 
             self.logger.info(f"Worker {self.worker_id} shutting down.")
         except Exception as e:
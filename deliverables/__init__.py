@@ -1,2 +1,3 @@
-from deliverables.tokenization import get_words
+from deliverables.tokenization import get_words, get_word_counts, word_counter
+from deliverables.word_counts import WordCounts, WordTotals
 from deliverables.deliverables import GlobalDeliverableData, RawDeliverableData, process_page
\ No newline at end of file
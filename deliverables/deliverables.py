@@ -22,17 +22,21 @@ As a concrete deliverable of this project, besides the code itself, you must sub
 
 from datetime import datetime
 from collections import Counter
+import copy
 import os
 import json
 import shelve
 import glob
+import time
 from dataclasses import dataclass, field
 from collections import Counter
-from urllib.parse import urldefrag, urlparse
-from bs4 import BeautifulSoup
+from urllib.parse import urldefrag
 
-from deliverables.tokenization import get_words
+from deliverables.tokenization import get_word_counts
+from deliverables.word_counts import WordCounts, WordTotals
 from utils import get_logger, normalize
+from utils.parsing import ParsedPage
+from utils.url_cache import parse_url
 from threading import RLock
 
 
@@ -41,10 +45,13 @@ DELIVERABLES_LOCK = RLock()
 
 @dataclass
 class RawDeliverableData:
-    """All data stored here is independent of one another; and it is all accumulated into GlobalDeliverableData"""
+    """
+    All data stored here is independent of one another; and it is all accumulated into GlobalDeliverableData.
+    Words are counted by their IDs in the vocabulary: a page's in WordCounts, GlobalDeliverableData's in WordTotals.
+    """
     url_word_map: dict = field(default_factory=dict)
     total_urls_seen: int = 0
-    words: Counter = field(default_factory=Counter)
+    words: WordCounts | WordTotals = field(default_factory=WordCounts)
     subdomains: Counter = field(default_factory=Counter)
     finished: bool = False
 
@@ -55,7 +62,8 @@ log = get_logger("DELIVERABLE", f"CRAWLER")
 class GlobalDeliverableData:
     """
     Responsible for managing the data used in the project deliverable. Stores all it's data in a shelf.
-    All threads essentially pipe their RawDeliverableData to this, which then saves it into a shelf.
+    All threads essentially pipe their RawDeliverableData to this, which merges it in memory and checkpoints it into
+    the shelf every so often, and when the crawler stops.
     The program can stop; and as long as the global deliverable data isn't marked as finished, subsequent
     crawler start ups will continue to update this shelf.
     """
@@ -77,7 +85,12 @@ class GlobalDeliverableData:
         else:
             return None
 
-    def __init__(self, shelve_name=None):
+    # by default, the deliverable is checkpointed to its shelf every CHECKPOINT_INTERVAL seconds or CHECKPOINT_BATCH
+    # pages, whichever comes first
+    CHECKPOINT_INTERVAL = 30
+    CHECKPOINT_BATCH = 1000
+
+    def __init__(self, shelve_name=None, checkpoint_interval=CHECKPOINT_INTERVAL, checkpoint_batch=CHECKPOINT_BATCH):
         if shelve_name is None:
             # get previous shelf
             previous_shelve = GlobalDeliverableData.get_previous_deliverable_fname()
@@ -88,20 +101,39 @@ class GlobalDeliverableData:
                 self._shelve_path = previous_shelve
         else:
             self._shelve_path = shelve_name
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_batch = checkpoint_batch
 
         with shelve.open(self._shelve_path) as raw_dev_data:
             raw_dev_data.setdefault("url_word_map", {})
             raw_dev_data.setdefault("total_urls_seen", 0)
-            raw_dev_data.setdefault("words", Counter())
+            if not isinstance(raw_dev_data.get("words"), WordTotals):
+                # a shelf from before words were counted by ID holds a Counter of words, if anything
+                words = WordTotals()
+                words.add(WordCounts.from_words(raw_dev_data.get("words", Counter())))
+                raw_dev_data["words"] = words
             raw_dev_data.setdefault("subdomains", Counter())
             raw_dev_data.setdefault("finished", False)
 
         self._basename = self._shelve_path.split(".shelve")[0]
-
-    def get_raw(self) -> RawDeliverableData:
-        """Return a read-only version of the deliverable data"""
+        # the deliverable is kept in memory, and only read from its shelf when first needed
+        self._data = None
+        self._unsaved_changes = 0
+        self._last_checkpoint = time.time()
+        # called after every checkpoint, see after_checkpoint()
+        self._after_checkpoint = []
+
+    def __getstate__(self):
+        # sent to the processes of a multiprocess crawl, which only need its shelf's path
+        state = self.__dict__.copy()
+        state["_data"] = None
+        state["_unsaved_changes"] = 0
+        state["_after_checkpoint"] = []
+        return state
+
+    def _read_shelf(self) -> RawDeliverableData:
         with shelve.open(self._shelve_path) as raw_dev_data:
-            out = RawDeliverableData(
+            return RawDeliverableData(
                 url_word_map=raw_dev_data["url_word_map"],
                 total_urls_seen=raw_dev_data["total_urls_seen"],
                 words=raw_dev_data["words"],
@@ -109,19 +141,81 @@ class GlobalDeliverableData:
                 finished=raw_dev_data["finished"]
             )
 
-        return out
+    def _loaded(self) -> RawDeliverableData:
+        if self._data is None:
+            self._data = self._read_shelf()
+        return self._data
+
+    def get_raw(self) -> RawDeliverableData:
+        """Return a read-only version of the deliverable data"""
+        with DELIVERABLES_LOCK:
+            return copy.deepcopy(self._loaded())
 
     def mark_finished(self):
-        with shelve.open(self._shelve_path) as raw_dev_data:
-            raw_dev_data["finished"] = True
+        with DELIVERABLES_LOCK:
+            self._loaded().finished = True
+            self._unsaved_changes += 1
+            self.checkpoint()
 
     def update(self, batch: RawDeliverableData):
+        """Add the data of a page, or of a whole deliverable, in memory, checkpointing it if one is due."""
+        with DELIVERABLES_LOCK:
+            data = self._loaded()
+            data.url_word_map.update(batch.url_word_map)
+            data.total_urls_seen += batch.total_urls_seen
+            data.words.add(batch.words)
+            # update() rather than +=, which would copy every subdomain seen so far
+            data.subdomains.update(batch.subdomains)
+
+            self._unsaved_changes += 1
+            if self._unsaved_changes >= self.checkpoint_batch \
+                    or time.time() - self._last_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
+
+    def after_checkpoint(self, callback):
+        """
+        Have callback(), such as the frontier's save_downloads(), called after every checkpoint, still holding
+        DELIVERABLES_LOCK. Every page added by update() before it returned is in the checkpoint by then.
+        """
+        with DELIVERABLES_LOCK:
+            self._after_checkpoint.append(callback)
+
+    def checkpoint(self):
+        """
+        Write the deliverable to its shelf, which a restarted crawl resumes from.
+        Called periodically by update(), and when the crawler stops.
+        """
         with DELIVERABLES_LOCK:
-            with shelve.open(self._shelve_path, writeback=True) as raw_dev_data:
-                raw_dev_data["url_word_map"].update(batch.url_word_map)
-                raw_dev_data["total_urls_seen"] += batch.total_urls_seen
-                raw_dev_data["words"] += batch.words
-                raw_dev_data["subdomains"] += batch.subdomains
+            if self._unsaved_changes:
+                with shelve.open(self._shelve_path) as raw_dev_data:
+                    raw_dev_data["url_word_map"] = self._data.url_word_map
+                    raw_dev_data["total_urls_seen"] = self._data.total_urls_seen
+                    raw_dev_data["words"] = self._data.words
+                    raw_dev_data["subdomains"] = self._data.subdomains
+                    raw_dev_data["finished"] = self._data.finished
+            self._unsaved_changes = 0
+            self._last_checkpoint = time.time()
+            for callback in self._after_checkpoint:
+                callback()
+
+    def partition(self, index, count) -> "GlobalDeliverableData":
+        """
+        Separate deliverable data for one process of a multiprocess crawl, as processes cannot share a shelf.
+        Kept in a subdirectory, so it is never mistaken for the previous deliverable of a crawl.
+        """
+        partitions_dir = f"{GlobalDeliverableData.DELIVERABLES_DIRNAME}/partitions"
+        os.makedirs(partitions_dir, exist_ok=True)
+        return GlobalDeliverableData(
+            f"{partitions_dir}/{os.path.basename(self._basename)}-{index}-of-{count}.shelve",
+            self.checkpoint_interval, self.checkpoint_batch)
+
+    def merge(self, other: "GlobalDeliverableData"):
+        """Add the data of another deliverable, such as a partition, into this one, and delete the other's shelf."""
+        self.update(other.get_raw())
+        # the other's shelf is only deleted once its data is safely in this one's
+        self.checkpoint()
+        for file in glob.glob(f"{other._shelve_path}*"):
+            os.remove(file)
 
     def _json_dump(self):
         """A completed JSON dump of a finished deliverable. Only to be called after output()"""
@@ -135,7 +229,7 @@ class GlobalDeliverableData:
                 {
                     "url_word_map": out.url_word_map,
                     "total_urls_seen": out.total_urls_seen,
-                    "words": dict(out.words),
+                    "words": dict(out.words.to_counter()),
                     "subdomains": dict(out.subdomains)
                 }, fp=f, sort_keys=True, indent=4
             )
@@ -182,31 +276,31 @@ class GlobalDeliverableData:
         self._json_dump()
 
 
-def process_page(response_url: str, response_soup: BeautifulSoup) -> RawDeliverableData:
+def process_page(response_url: str, page: ParsedPage, words: WordCounts = None) -> RawDeliverableData:
     """
-    Process a response's url and content (in the form of bs4 BeautifulSoup) to help answer deliverable questions.
-    Returns a deliverable representing the data gleaned from the url/page/soup.
+    Process a response's url and content (as parsed by utils.parsing) to help answer deliverable questions.
+    The page's words are counted from its text, unless they were already counted while it was parsed (by writing its
+    text to a word_counter()).
+    Returns a deliverable representing the data gleaned from the url and page.
     """
     raw_deliverable = RawDeliverableData()
     try:
         # log.info(f"Processing page {response_url}")
-        page_text = response_soup.get_text(separator=' ', strip=True)
-        words = get_words(page_text)
-        num_words = sum(words.values())
+        if words is None:
+            words = get_word_counts(page.text)
+        num_words = words.total()
 
         # DELIVERABLE: UNIQUE PAGES [DOWNLOADED] and LONGEST PAGE
         unique_url = normalize(urldefrag(response_url)[0])
         raw_deliverable.url_word_map[unique_url] = num_words
 
-        links = response_soup.find_all('a', href=True)
-        unique_urls_in_page = set(urldefrag(link['href'])[0] for link in links)
-        raw_deliverable.total_urls_seen += len(unique_urls_in_page)
+        raw_deliverable.total_urls_seen += len(page.links)
 
         # DELIVERABLE: MOST COMMON WORDS
-        raw_deliverable.words += words
+        raw_deliverable.words = words
 
         # DELIVERABLE: SUBDOMAIN COUNT
-        parsed = urlparse(response_url)
+        parsed = parse_url(response_url)
         # all valid links end with .uci.edu anyway, but
         assert "uci.edu" in parsed.netloc, f"Somehow processing {response_url}, despite it not being a valid URL."
         raw_deliverable.subdomains[parsed.netloc] = 1
@@ -1,15 +1,8 @@
 from bs4 import BeautifulSoup
 from collections import Counter
-from nltk.corpus import words
 
-
-with open("./deliverables/stopwords.txt", "r") as f:
-    _STOPWORDS = set(f.read().split())
-assert len(
-    _STOPWORDS) > 0, "Stopwords not found or appear to not be processed correctly."
-
-
-_WORDS = set(words.words())
+from deliverables.vocabulary import VOCABULARY
+from deliverables.word_counts import WordCounts
 
 
 def extract_text(soup: BeautifulSoup) -> str:
@@ -19,32 +12,87 @@ def extract_text(soup: BeautifulSoup) -> str:
     text = soup.get_text(separator=" ", strip=True)
 
 
-def _tokenize(text: str) -> Counter:
+class _SeparatorTable(dict):
     """
-    ADAPTED FROM ASSIGNMENT 1
-    Returns a Counter object representing the count of all tokens.
-    Typically this text is extracted from a BeautifulSoup via get_text().
+    str.translate() table turning every character that is not alphanumeric into a space, so the tokens of a text are
+    what split() leaves of it. Each character is looked up with isalnum() once, then cached.
     """
-    tokens = Counter()
 
-    buffer = ""
-    cursor = 0
+    def __missing__(self, code):
+        self[code] = code if chr(code).isalnum() else ord(" ")
+        return self[code]
+
+
+_SEPARATORS = _SeparatorTable()
+# lowered character by character, Σ is always σ, while str.lower() of a whole word ends it with a final sigma (ς)
+_SEPARATORS[ord("Σ")] = ord("σ")
 
-    while cursor < len(text):
-        char = text[cursor]
-        if char.isalnum():
-            buffer += char.lower()
+# characters of text tokenized at once, so a long text never has all of its tokens in a list at the same time
+CHUNK_SIZE = 1 << 16
+
+
+class TokenCounter(object):
+    """
+    Counts the tokens of a text written to it piece by piece, as _tokenize() counts them in the whole text, so the text
+    never has to be held at once: a page's text can be written to it while the page is parsed (see parse_html()).
+    Besides the counts, it only keeps the token the last piece ended in, which the next piece may continue.
+    Given ids, a mapping of tokens to IDs, it only counts the tokens ids maps, by their IDs.
+    """
+
+    def __init__(self, ids: dict = None, chunk_size: int = CHUNK_SIZE):
+        self.ids = ids
+        self.chunk_size = chunk_size
+        self.counts = Counter()
+        self._partial = []
+
+    def _count(self, text):
+        # lowered after the separators are replaced, as lowering can add characters that are not alphanumeric
+        # (İ becomes i and a combining dot), which still belong to the token
+        tokens = text.translate(_SEPARATORS).lower().split()
+        if self.ids is None:
+            self.counts.update(tokens)
         else:
-            if buffer:
-                tokens[buffer] += 1
-                buffer = ""
-        cursor += 1
+            ids = self.ids
+            self.counts.update(ids[token] for token in tokens if token in ids)
+
+    def write(self, text: str):
+        for start in range(0, len(text), self.chunk_size):
+            chunk = text[start:start + self.chunk_size]
+            # a token running up to the end of the chunk may continue in the next one
+            end = len(chunk)
+            while end and chunk[end - 1].isalnum():
+                end -= 1
+            if end == 0:
+                self._partial.append(chunk)
+                continue
+            if self._partial:
+                self._count("".join(self._partial) + chunk[:end])
+            else:
+                self._count(chunk[:end])
+            self._partial = [chunk[end:]] if end < len(chunk) else []
 
-    # append anything leftover in the buffer
-    if buffer:
-        tokens[buffer] += 1
+    def close(self) -> Counter:
+        """Count the token the text ends in, and return the counts."""
+        if self._partial:
+            self._count("".join(self._partial))
+            self._partial = []
+        return self.counts
 
-    return tokens
+    def clear(self):
+        self.counts.clear()
+        self._partial = []
+
+
+def _tokenize(text: str, chunk_size: int = CHUNK_SIZE) -> Counter:
+    """
+    ADAPTED FROM ASSIGNMENT 1
+    Returns a Counter object representing the count of all tokens.
+    A token is a run of alphanumeric characters, lowercased.
+    Typically this text is extracted from a BeautifulSoup via get_text().
+    """
+    counter = TokenCounter(chunk_size=chunk_size)
+    counter.write(text)
+    return counter.close()
 
 
 def get_words(text: str) -> Counter:
@@ -53,8 +101,20 @@ def get_words(text: str) -> Counter:
     Typically this text is extracted from a BeautifulSoup via get_text().
     """
     tokens = _tokenize(text)
-    words = Counter({
-        token: count for token, count in tokens.items()
-        if token in _WORDS and token not in _STOPWORDS and len(token) > 1
-    })
+    words = Counter({token: count for token, count in tokens.items() if token in VOCABULARY})
     return words
+
+
+def word_counter() -> TokenCounter:
+    """A TokenCounter counting the words get_words() counts, by their IDs in the vocabulary."""
+    return TokenCounter(VOCABULARY.ids)
+
+
+def get_word_counts(text: str) -> WordCounts:
+    """
+    get_words(), counting the words by their IDs in the vocabulary.
+    Typically this text is extracted from a BeautifulSoup via get_text().
+    """
+    counter = word_counter()
+    counter.write(text)
+    return WordCounts(counter.close())
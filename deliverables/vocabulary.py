@@ -0,0 +1,101 @@
+"""
+The words get_words() counts: English dictionary words (NLTK's words corpus) that are not stopwords and are longer
+than one letter. They are prebuilt into vocabulary.txt, one word per line, so a process reads a single small file
+the first time it needs them instead of loading NLTK's corpus when it starts.
+Rebuild the file after changing stopwords.txt, from the root of the project: python -m deliverables.vocabulary
+"""
+
+import hashlib
+import os
+from threading import Lock
+
+
+_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+STOPWORDS_FILE = os.path.join(_DIRECTORY, "stopwords.txt")
+VOCABULARY_FILE = os.path.join(_DIRECTORY, "vocabulary.txt")
+
+
+def build_vocabulary(path=VOCABULARY_FILE):
+    """Write the accepted words, sorted, to path, and return them."""
+    # only needed to build the file, so NLTK is not imported by crawler processes
+    from nltk.corpus import words
+    from deliverables.tokenization import _tokenize
+
+    with open(STOPWORDS_FILE, "r") as f:
+        stopwords = set(f.read().split())
+    assert len(stopwords) > 0, "Stopwords not found or appear to not be processed correctly."
+
+    # a word that does not tokenize to itself (capitalized, hyphenated...) can never be matched by a token
+    vocabulary = sorted({
+        word for word in words.words()
+        if word not in stopwords and len(word) > 1 and _tokenize(word) == {word: 1}
+    })
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(vocabulary) + "\n")
+    return vocabulary
+
+
+class Vocabulary(object):
+    """
+    The words of a vocabulary file, read the first time they are needed. Each word has an ID, its line in the file,
+    so counts of words can be kept by dense integer IDs instead of strings.
+    """
+
+    def __init__(self, path=VOCABULARY_FILE):
+        self.path = path
+        self._words = None
+        self._ids = None
+        self._digest = None
+        self._lock = Lock()
+
+    @property
+    def loaded(self):
+        return self._ids is not None
+
+    def _load(self):
+        with self._lock:
+            if self._ids is None:
+                if not os.path.isfile(self.path):
+                    build_vocabulary(self.path)
+                with open(self.path, "rb") as f:
+                    data = f.read()
+                self._digest = hashlib.sha1(data).hexdigest()
+                self._words = tuple(data.decode("utf-8").split())
+                # set last, as it is what tells other threads the vocabulary is loaded
+                self._ids = {word: word_id for word_id, word in enumerate(self._words)}
+        return self._ids
+
+    @property
+    def ids(self) -> dict:
+        """The ID of every word."""
+        return self._ids if self._ids is not None else self._load()
+
+    @property
+    def words(self) -> tuple:
+        """Every word, at its ID."""
+        if self._ids is None:
+            self._load()
+        return self._words
+
+    @property
+    def digest(self) -> str:
+        """Digest of the vocabulary file, which changes whenever the IDs of its words might."""
+        if self._ids is None:
+            self._load()
+        return self._digest
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+VOCABULARY = Vocabulary()
+
+
+if __name__ == "__main__":
+    print(f"{len(build_vocabulary())} words written to {VOCABULARY_FILE}")
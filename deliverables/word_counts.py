@@ -0,0 +1,131 @@
+"""
+Counts of the words of the deliverables, kept by the words' IDs in the vocabulary (see deliverables.vocabulary).
+Pages hand integers to the global deliverable, which adds them into an array, and words are only looked up by name
+again when the report is written.
+"""
+
+import heapq
+import operator
+from array import array
+from collections import Counter
+
+from deliverables.vocabulary import VOCABULARY
+
+
+class WordCounts(object):
+    """
+    The counts of the words of a few pages: ids counts vocabulary words by ID, and other counts any other word by name.
+    """
+
+    def __init__(self, ids=None, other=None):
+        self.ids = Counter(ids or {})
+        self.other = Counter(other or {})
+
+    @classmethod
+    def from_words(cls, words) -> "WordCounts":
+        """Count a mapping of words to counts, or an iterable of words, by ID."""
+        ids = VOCABULARY.ids
+        counts = cls()
+        for word, count in Counter(words).items():
+            if word in ids:
+                counts.ids[ids[word]] += count
+            else:
+                counts.other[word] += count
+        return counts
+
+    def __getitem__(self, word):
+        word_id = VOCABULARY.ids.get(word)
+        return self.other[word] if word_id is None else self.ids[word_id]
+
+    def __iadd__(self, counts: "WordCounts"):
+        self.ids.update(counts.ids)
+        self.other.update(counts.other)
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, WordCounts) and +self.ids == +other.ids and +self.other == +other.other
+
+    def total(self) -> int:
+        return self.ids.total() + self.other.total()
+
+    def to_counter(self) -> Counter:
+        """The counts by word."""
+        words = VOCABULARY.words
+        counter = Counter({words[word_id]: count for word_id, count in self.ids.items()})
+        counter.update(self.other)
+        return counter
+
+    def most_common(self, n=None) -> list:
+        return self.to_counter().most_common(n)
+
+
+class WordTotals(object):
+    """
+    The counts of the words of a whole crawl: counts holds the count of every vocabulary word at its ID, and other
+    counts any other word by name. Pickled by the names of the words counted, rather than their IDs, so the totals
+    can be loaded after the vocabulary is rebuilt and its words get other IDs.
+    """
+
+    def __init__(self):
+        self.counts = array("Q", [0]) * len(VOCABULARY)
+        self.other = Counter()
+
+    def __getstate__(self):
+        words = VOCABULARY.words
+        counted = [word_id for word_id, count in enumerate(self.counts) if count]
+        return {
+            "words": [words[word_id] for word_id in counted],
+            "counts": array("Q", [self.counts[word_id] for word_id in counted]),
+            "other": self.other,
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        if "vocabulary_digest" in state:
+            # pickled by ID, before totals were pickled by name
+            if state["vocabulary_digest"] != VOCABULARY.digest:
+                raise ValueError("Word counts were saved by the IDs of another vocabulary, so their words are unknown.")
+            self.counts, self.other = state["counts"], state["other"]
+            return
+        # words may have joined or left the vocabulary since, so either part may hold any word
+        ids = VOCABULARY.ids
+        for word, count in [*zip(state["words"], state["counts"]), *state["other"].items()]:
+            word_id = ids.get(word)
+            if word_id is None:
+                self.other[word] += count
+            else:
+                self.counts[word_id] += count
+
+    def add(self, counts: "WordCounts | WordTotals"):
+        """Add the counts of a few pages, or the totals of another crawl, to these."""
+        if isinstance(counts, WordTotals):
+            self.counts = array("Q", map(operator.add, self.counts, counts.counts))
+        else:
+            totals = self.counts
+            for word_id, count in counts.ids.items():
+                totals[word_id] += count
+        self.other.update(counts.other)
+
+    def __getitem__(self, word):
+        word_id = VOCABULARY.ids.get(word)
+        return self.other[word] if word_id is None else self.counts[word_id]
+
+    def total(self) -> int:
+        return sum(self.counts) + self.other.total()
+
+    def to_counter(self) -> Counter:
+        """The counts by word, of every word counted at least once."""
+        words = VOCABULARY.words
+        counter = Counter({words[word_id]: count for word_id, count in enumerate(self.counts) if count})
+        counter.update(self.other)
+        return counter
+
+    def most_common(self, n=None) -> list:
+        """The n most common words and their counts, the most common first, as Counter.most_common() lists them."""
+        if n is None:
+            return self.to_counter().most_common()
+        words = VOCABULARY.words
+        top_ids = heapq.nlargest(n, (word_id for word_id, count in enumerate(self.counts) if count),
+                                 key=self.counts.__getitem__)
+        candidates = [(words[word_id], self.counts[word_id]) for word_id in top_ids] + self.other.most_common(n)
+        return sorted(candidates, key=lambda item: -item[1])[:n]
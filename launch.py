@@ -1,19 +1,66 @@
+import dbm
+import glob
+import os
+import re
+import shelve
+import sqlite3
 from configparser import ConfigParser
 from argparse import ArgumentParser
+from contextlib import closing
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
-from crawler import Crawler
+from crawler import Crawler, Frontier
+from crawler.sqlite_frontier import SqliteFrontier
+from crawler.frontier_log import FrontierLog
+from utils.canonical import duplicate_report
 
 
-def main(config_file, restart):
+def report_duplicates(config):
+    """Print how many downloads canonicalizing URLs would have saved in the crawl saved in SAVE."""
+    # a multiprocess crawl saves one frontier per process, each of which may be stored under a suffix
+    partitions = set()
+    for path in glob.glob(f"{glob.escape(config.save_file)}-*-of-*"):
+        match = re.fullmatch(rf"({re.escape(config.save_file)}-\d+-of-\d+)(\.sqlite|\.db|\.dat|\.dir|\.bak)?", path)
+        if match:
+            partitions.add(match.group(1))
+    paths = [config.save_file] + sorted(partitions)
+    urls = []
+    for path in paths:
+        if config.frontier == "sqlite":
+            if os.path.isfile(f"{path}.sqlite"):
+                with closing(sqlite3.connect(f"{path}.sqlite")) as db:
+                    urls += db.execute("SELECT url, downloaded FROM urls").fetchall()
+        elif dbm.whichdb(path):
+            # a shelf of url hash -> (url, downloaded), saved before the frontier log
+            with shelve.open(path, "r") as shelf:
+                urls += shelf.values()
+        elif os.path.isfile(path):
+            # only read; a torn record at the end is skipped rather than cut off
+            seen_urls, _ = FrontierLog(path).replay(repair=False)
+            urls += ((url, downloaded) for url, downloaded, _ in seen_urls.values())
+
+    report = duplicate_report(urls)
+    print(f"{report['urls']} URLs seen, {report['canonical_urls']} after canonicalizing "
+          f"({report['duplicate_urls']} duplicates).")
+    print(f"{report['avoidable_fetches']} of {report['downloaded']} downloads would have been avoided.")
+    for canonical, count in report["largest_groups"]:
+        print(f"{count:6} {canonical}")
+
+
+def main(config_file, restart, duplicates=False):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
+    if duplicates:
+        config.apply()
+        report_duplicates(config)
+        return
     print("Connecting to cache server...")
     config.cache_server = get_cache_server(config, restart)
     print("Starting crawler and logs...")
-    crawler = Crawler(config, restart)
+    frontier_factory = SqliteFrontier if config.frontier == "sqlite" else Frontier
+    crawler = Crawler(config, restart, frontier_factory=frontier_factory)
     crawler.start()
 
 
@@ -21,5 +68,7 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--duplicate_report", action="store_true", default=False,
+                        help="report the duplicate downloads in the saved crawl that canonical URLs would avoid")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.duplicate_report)
@@ -1,14 +1,21 @@
 import re
-from urllib.parse import urlparse, urldefrag, urljoin
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urldefrag
 from utils.response import Response
 from utils import get_logger, normalize
-from bs4 import BeautifulSoup
-from deliverables import process_page, GlobalDeliverableData
-from validate import VALID_SCHEMES, VALID_DOMAINS, INVALID_DOMAINS, INVALID_PATHS, INVALID_FRAGMENTS, INVALID_QUERIES, INVALID_PATH_SEGMENTS, FILE_EXT_PATTERN, ANY_NUMBER_PATTERN, CALENDAR_TRAP_PATTERN
+from utils.parsing import ParsedPage, parse_html, http_charset
+from utils.url_cache import VERDICTS
+from utils.url import URL
+from deliverables import process_page, word_counter, GlobalDeliverableData, RawDeliverableData, WordCounts
+from validate import URL_VALIDATOR
 
 f_log = get_logger("SCRAPER", f"FRONTIER")
 w_log = get_logger("PROCESSED", f"Worker")
 
+# processes pages are parsed in, if started; parsing is pure Python, so threads parsing in-process all share one core
+_PARSE_POOL = None
+
 # https://canvas.eee.uci.edu/courses/72511/assignments/1584020
 
 
@@ -28,7 +35,39 @@ def scraper(url, resp: Response, global_deliverable: GlobalDeliverableData) -> l
 
     This was changed from the original intention for scraper.
     The previous version simply combined extract_next_links with is_valid to produce a list of valid URLs to crawl.
-    Now, we use it to validate a response (returning no new links if it is invalid), convert it into bs4 soup, then process soup, then extract next links from soup
+    Now, we use it to validate a response (returning no new links if it is invalid), parse it, then process the page, then extract next links from the page
+    """
+    links, deliverable_data = scrape(url, resp)
+    if deliverable_data is not None:
+        global_deliverable.update(deliverable_data)
+    return links
+
+
+def start_parse_pool(processes, initializer=None):
+    """
+    Parse pages in a pool of processes from now on, instead of in the thread calling scraper().
+    Each process runs initializer() first, if given.
+    """
+    global _PARSE_POOL
+    if _PARSE_POOL is None and processes > 0:
+        # spawned rather than forked, since forking while other threads hold locks (such as logging's) can deadlock
+        _PARSE_POOL = ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"), initializer=initializer)
+
+
+def stop_parse_pool():
+    global _PARSE_POOL
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown()
+        _PARSE_POOL = None
+
+
+def scrape(url, resp: Response, pool: ProcessPoolExecutor = None) -> tuple[list[str], RawDeliverableData | None]:
+    """
+    scraper(), without touching the global deliverable: returns the hyperlinks and the page's deliverable data
+    (None for an invalid response).
+    The response is checked in the calling thread, and the page is parsed by parse_page() in the given pool, or the
+    pool started by start_parse_pool(), if any.
     """
     links = []
 
@@ -37,19 +76,19 @@ def scraper(url, resp: Response, global_deliverable: GlobalDeliverableData) -> l
     if not resp.status == 200:
         f_log.error(
             f"Response error status <{resp.status}> - from fetched for {url}, acquired from {resp.url}")
-        return links
+        return links, None
 
     # - has a non-empty response body
     # functions both as error handling for 200 status with no raw response, and a type check guarantee
     if resp.raw_response is None or resp.raw_response.content is None:
         f_log.error(
             f"Response returned a 200 code, yet had no raw response.")
-        return links
+        return links, None
 
     # - has a valid URL
     # if we're somehow redirected that is invalid (typically out of domain), return an empty list
     if not is_valid(resp.url):
-        return links
+        return links, None
 
     # log.info(
     #     f"Processing page fetched for {url}, acquired from {resp.url}")
@@ -68,33 +107,48 @@ def scraper(url, resp: Response, global_deliverable: GlobalDeliverableData) -> l
             f"{resp.url} contents contain little information, despite returning 200.")
         # log.warning(f"{resp.url} contents: {resp.raw_response}")
 
-    # now that we know the raw response is something vaild, process it into a soup and use it
-    soup = BeautifulSoup(resp.raw_response.content, "html.parser")
-
-    deliverable_data = process_page(resp.url, soup)
-    global_deliverable.update(deliverable_data)
-
-    links = extract_next_links(url, soup)
+    # now that we know the raw response is something vaild, parse it and use it
+    if pool is None:
+        pool = _PARSE_POOL
+    http_encoding = http_charset(resp.raw_response.headers.get("Content-Type"))
+    if pool is None:
+        links, deliverable_data = parse_page(url, resp.url, resp.raw_response.content, http_encoding)
+    else:
+        # only the page's bytes are sent, and only its links and word counts come back
+        links, deliverable_data = pool.submit(
+            parse_page, url, resp.url, resp.raw_response.content, http_encoding).result()
 
     # note that the response URL may not be the same as the unique URL; the unique URL is defragmented and then normalized
     w_log.info(
         f"Processed unique page with unique URL {normalize(urldefrag(resp.url)[0])} containing {deliverable_data.words.total()} words.")
 
-    return links
+    return links, deliverable_data
+
+
+def parse_page(url, page_url, content: bytes, http_encoding=None) -> tuple[list[str], RawDeliverableData]:
+    """
+    Parse a valid page into its hyperlinks and deliverable data. Everything it takes and returns is small and
+    picklable, never a parse tree, so it can run in a parse process. http_encoding is the charset the page was
+    served with, if any.
+    """
+    # the page's words are counted as it is parsed, so its text is never held whole
+    words = word_counter()
+    page = parse_html(content, url, text_sink=words, http_encoding=http_encoding)
+    deliverable_data = process_page(page_url, page, WordCounts(words.close()))
+    links = extract_next_links(page)
+    return links, deliverable_data
 
 
-def extract_next_links(url, soup: BeautifulSoup) -> list[str]:
+def extract_next_links(page: ParsedPage) -> list[URL]:
     """
-    Extracts the next links for the crawler to crawl through.
-    Eliminates duplicate links found in the soup.
-    URLs with the same URL expect different hashes are considered duplicates.
+    Extracts the next links for the crawler to crawl through, as URL records, so they are parsed and hashed once,
+    where the page is parsed, rather than again by the frontier.
+    The page's links are already absolute, defragmented and without duplicates,
+    as URLs with the same URL expect different hashes are considered duplicates.
     """
-    all_links = soup.find_all("a", href=True)
-    scraped_links = [urljoin(url, a_tag['href']) for a_tag in all_links]
     # log.info(
-    #     f"Found {len(links)} valid links (out of {len(all_links)} total links) in the response content")
-    unique_links = set([urldefrag(url)[0] for url in scraped_links])
-    valid_links = [link for link in unique_links if is_valid(link)]
+    #     f"Found {len(links)} valid links (out of {len(page.hrefs)} total links) in the response content")
+    valid_links = [URL(link) for link in page.links if is_valid(link)]
     return valid_links
 
 
@@ -106,85 +160,12 @@ def is_valid(url):
 
     Rules are based on a long series of trial and error to see what links are good and what aren't,
     As well as how to identify potential traps just based on URL (such as calendar traps)
+    The rules are kept in validate.py, and checked by URL_VALIDATOR, which compiles them once.
+    Verdicts are cached, as the same links show up on many pages.
     """
     try:
-        parsed = urlparse(url)
-
-        domain = parsed.netloc.lower()
-        path = parsed.path.lower()
-
-        if not parsed.scheme in VALID_SCHEMES:
-            return False
-
-        if FILE_EXT_PATTERN.match(path):
-            return False
-
-        # caused frequently by sli.ics.uci.edu; typically has too many redirections
-        # bad queries typically lead to a 4XX error, which glean no information anyway
-        if any((invalid_query in parsed.query) for invalid_query in INVALID_QUERIES):
-            return False
-
-        # filter only domain specific; avoid stepping out of boundaries
-        if not (
-            any(
-                (domain.endswith(f".{valid_domain}")
-                 or domain == valid_domain)
-                for valid_domain in VALID_DOMAINS
-            ) or (
-                domain == "today.uci.edu"
-                and path.startswith("/department/information_computer_sciences/"))
-        ):
-            return False
-
-        # some websites have a robots.txt that explicitly state Disallow: /
-        # these sites return a 608 from cache server if attempted to be downloaded
-        if domain in INVALID_DOMAINS:
-            return False
-
-        for _domain, invalid_paths in INVALID_PATHS.items():
-            if (domain == _domain or domain == f"www.{_domain}") \
-                    and any(path.startswith(invalid_path) for invalid_path in invalid_paths):
-                return False
-
-        # avoid paths that include things like "files/pdf" (one specific example)
-        # https://www.informatics.uci.edu/files/pdf/InformaticsBrochure-March2018
-        if any([path_segment in parsed.path for path_segment in INVALID_PATH_SEGMENTS]):
-            return False
-
-        # avoid crawler traps (all)
-        path_parts = [part for part in parsed.path.split("/") if part != '']
-        query_parts = parsed.query.split("&")
-
-        # avoid calendar traps by avoiding paths that look like they contain a calendar
-        # anything that looks like a calendar is probably evil
-        # make an exception in which domain/YYYY/MM/DD/article_name
-        if (
-            any(
-                CALENDAR_TRAP_PATTERN.search(path_part)
-                for path_part in [*path_parts, *query_parts, parsed.path]
-            ) and
-            not (len(path_parts) > 3 and
-                 ANY_NUMBER_PATTERN.match(path_parts[-4]) and len(path_parts[-4]) == 4 and
-                 ANY_NUMBER_PATTERN.match(path_parts[-3]) and len(path_parts[-3]) == 2 and
-                 ANY_NUMBER_PATTERN.match(path_parts[-2]) and len(path_parts[-2]) == 2 and
-                 len(path_parts[-1]) > 0)
-        ):
-            return False
-
-        # avoid invalid fragments; obsolete since we defragment all links
-        if any((invalid_fragment in parsed.fragment) for invalid_fragment in INVALID_FRAGMENTS):
-            return False
-
-        # # avoid /page/X issues; if X is greater than 500, something is up...
-        # ensure the path /page/X can exist and is being followed
-        if len(path_parts) >= 2 \
-                and path_parts[-2] == "page" \
-                and ANY_NUMBER_PATTERN.search(path_parts[-1]) \
-                and int(path_parts[-1]) > 500:
-            return False
-
-        return True
+        return VERDICTS.get(url, URL_VALIDATOR)
 
     except TypeError:
-        f_log.error("TypeError for ", parsed)
+        f_log.error(f"TypeError for {url!r}")
         raise
@@ -0,0 +1,41 @@
+"""
+Throughput of the tokenizer in MB/s, against the per-character tokenizer it replaced.
+Run from the root of the project: python -m unittests.bench_tokenization
+"""
+
+import time
+
+from bs4 import BeautifulSoup
+
+from deliverables.tokenization import _tokenize
+from unittests.test_tokenization import reference_tokenize
+
+
+def throughput(tokenize, text, repeat=5):
+    """Best MB/s of tokenizing the UTF-8 encoded text over a few runs."""
+    size = len(text.encode("utf-8")) / 1e6
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokenize(text)
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+def main():
+    pages = []
+    for path in ["./unittests/test_foo.html", "./unittests/test_bar.html", "./unittests/test.html"]:
+        with open(path, 'r') as f:
+            pages.append(BeautifulSoup(f.read(), 'html.parser').get_text(separator=' ', strip=True))
+    texts = {
+        "ascii page": " ".join(pages) * 200,
+        "non-ascii page": (" ".join(pages) + " café naïve Straße ΟΔΟΣ 日本語") * 200,
+    }
+    for name, text in texts.items():
+        old = throughput(reference_tokenize, text)
+        new = throughput(_tokenize, text)
+        print(f"{name} ({len(text) / 1e6:.1f}M chars): {old:.1f} MB/s before, {new:.1f} MB/s now ({new / old:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import glob
+import threading
+import time
+from configparser import ConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+
+from crawler import Frontier
+from crawler.async_engine import AsyncEngine
+from utils.config import Config
+from utils import get_domain_name
+
+
+NUM_DOMAINS = 10
+PAGES_PER_DOMAIN = 4
+
+
+class FakeCacheServer(ThreadingHTTPServer):
+    """Answers every request like the cache server would for a page with no content, slowly."""
+    request_queue_size = 64
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), FakeCacheHandler)
+
+
+class FakeCacheHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = parse_qs(urlparse(self.path).query)["q"][0]
+        with self.server.lock:
+            self.server.requests.append((url, time.time()))
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(0.05)
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+        body = cbor.dumps({"url": url, "status": 200})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeScrapeEngine(AsyncEngine):
+    """Links every page to the next page of its domain, instead of parsing the (empty) response."""
+
+    def _scrape(self, tbd_url, resp):
+        domain, page = tbd_url[len("https://"):].split("/")
+        if int(page) + 1 < PAGES_PER_DOMAIN:
+            self.frontier.add_urls([f"https://{domain}/{int(page) + 1}"])
+
+
+class TestAsyncEngine(unittest.TestCase):
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self.config.time_delay = 0.2
+        self.config.seed_urls = [f"https://domain{i}.com/0" for i in range(NUM_DOMAINS)]
+
+        self.server = FakeCacheServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config.cache_server = self.server.server_address
+
+    def test_crawl(self):
+        frontier = Frontier(self.config, True)
+        handed_out = []
+        get_tbd_url = frontier.get_tbd_url
+
+        def record_tbd_url(*args):
+            url = get_tbd_url(*args)
+            if url is not None:
+                handed_out.append((url, frontier._frontier.last_accessed[get_domain_name(url)]))
+            return url
+        frontier.get_tbd_url = record_tbd_url
+
+        engine = FakeScrapeEngine(0, self.config, frontier, None)
+        engine.start()
+        engine.join(timeout=30)
+        self.assertFalse(engine.is_alive())
+        self.assertTrue(frontier.empty())
+
+        urls = [url for url, _ in self.server.requests]
+        self.assertEqual(len(urls), NUM_DOMAINS * PAGES_PER_DOMAIN)
+        self.assertEqual(len(set(urls)), len(urls))
+        # many domains are downloaded at once ...
+        self.assertGreater(self.server.max_in_flight, 1)
+        # ... but every domain still waits out its politeness delay between downloads
+        last_handed_out = {}
+        for url, when in handed_out:
+            domain = get_domain_name(url)
+            if domain in last_handed_out:
+                self.assertGreaterEqual(when - last_handed_out[domain], self.config.time_delay)
+            last_handed_out[domain] = when
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for file_path in glob.glob(f"{self.config.save_file}*"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
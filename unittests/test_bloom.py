@@ -0,0 +1,31 @@
+import unittest
+from crawler.bloom import ScalableBloomFilter
+from utils import get_urlhash
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+        keys = [get_urlhash(f"https://one.com/{i}") for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertEqual(len(bloom), 1000)
+        self.assertTrue(all(key in bloom for key in keys))
+        # grew past its initial capacity
+        self.assertGreater(len(bloom.slices), 1)
+
+    def test_false_positive_rate(self):
+        bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(get_urlhash(f"https://one.com/{i}"))
+
+        self.assertLess(bloom.false_positive_rate(), 0.01)
+        false_positives = sum(
+            get_urlhash(f"https://two.com/{i}") in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.02)
+        self.assertGreater(bloom.memory(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
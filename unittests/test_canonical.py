@@ -0,0 +1,166 @@
+import unittest
+import io
+import os
+import glob
+import shelve
+from contextlib import redirect_stdout
+from unittest import mock
+from configparser import ConfigParser
+
+import launch
+from crawler import Frontier
+from crawler.sqlite_frontier import SqliteFrontier
+from crawler.frontier_log import FrontierLog
+from utils import canonical, get_urlhash, get_domain_name
+from utils.canonical import canonicalize, duplicate_report, remove_dot_segments
+from utils.config import Config
+
+
+class TestCanonical(unittest.TestCase):
+    def tearDown(self):
+        canonical.configure()
+
+    def test_canonicalize(self):
+        self.assertEqual(canonicalize("HTTP://WWW.ics.uci.edu:443/a/../b?b=2&a=1"), "http://www.ics.uci.edu/b?a=1&b=2")
+        self.assertEqual(canonicalize("https://ics.uci.edu:8080/"), "https://ics.uci.edu:8080")
+        self.assertEqual(canonicalize("https://ics.uci.edu/%7euser/a%2fb%2F/./c/"), "https://ics.uci.edu/~user/a%2Fb%2F/c")
+        self.assertEqual(canonicalize("https://ics.uci.edu/a?utm_source=x&id=3&fbclid=y#top"), "https://ics.uci.edu/a?id=3")
+        self.assertEqual(canonicalize("https://ics.uci.edu/a?replytocom=5"), "https://ics.uci.edu/a")
+        self.assertEqual(canonicalize("https://User@ICS.uci.edu:80"), "https://User@ics.uci.edu")
+
+    def test_remove_dot_segments(self):
+        self.assertEqual(remove_dot_segments("/a/b/c/./../../g"), "/a/g")
+        self.assertEqual(remove_dot_segments("/../a"), "/a")
+        self.assertEqual(remove_dot_segments("/a/b/.."), "/a/")
+        self.assertEqual(remove_dot_segments("/a.b/c"), "/a.b/c")
+
+    def test_fold_www(self):
+        self.assertNotEqual(get_urlhash("HTTP://WWW.ics.uci.edu:443/a/../b?b=2&a=1"),
+                            get_urlhash("https://ics.uci.edu/b?a=1&b=2"))
+        canonical.configure(fold_www=True)
+        self.assertEqual(get_urlhash("HTTP://WWW.ics.uci.edu:443/a/../b?b=2&a=1"),
+                         get_urlhash("https://ics.uci.edu/b?a=1&b=2"))
+        canonical.configure(ignored_params=["id"])
+        self.assertEqual(canonicalize("https://ics.uci.edu/a?id=3&utm_source=x"), "https://ics.uci.edu/a?utm_source=x")
+
+    def test_duplicate_report(self):
+        report = duplicate_report([
+            ("https://ics.uci.edu/a", True), ("https://ics.uci.edu/a/", True), ("https://ics.uci.edu/./a", False),
+            ("https://ics.uci.edu/b", True)])
+        self.assertEqual(report["urls"], 4)
+        self.assertEqual(report["canonical_urls"], 2)
+        self.assertEqual(report["duplicate_urls"], 2)
+        self.assertEqual(report["downloaded"], 3)
+        self.assertEqual(report["avoidable_fetches"], 1)
+        self.assertEqual(report["largest_groups"], [("https://ics.uci.edu/a", 3)])
+
+
+class TestRehash(unittest.TestCase):
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self._delete_temp()
+
+    def _delete_temp(self):
+        for file_path in glob.glob(f"{self.config.save_file}*"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def test_load_save_from_before_canonical_urls(self):
+        # a save keyed by hashes of URLs as they were written, holding duplicates of each other
+        urls = {
+            "https://ics.uci.edu/a?x=1&y=2": True, "https://ics.uci.edu/a?y=2&x=1": False,
+            "https://ics.uci.edu/b": False, "https://ics.uci.edu/./b": False,
+        }
+        log = FrontierLog(self.config.save_file)
+        log.compact({f"old-{i}": (url, downloaded, get_domain_name(url)) for i, (url, downloaded) in enumerate(urls.items())},
+                    canonicalized=False)
+
+        os.environ["TESTING"] = "false"
+        try:
+            frontier = Frontier(self.config, False)
+        finally:
+            os.environ["TESTING"] = "true"
+
+        self.assertTrue(frontier.url_downloaded(get_urlhash("https://ics.uci.edu/a?y=2&x=1")))
+        self.assertTrue(frontier.url_seen(get_urlhash("https://ics.uci.edu/b")))
+        self.assertEqual(len(frontier._frontier), 1)
+        self.assertEqual(frontier.get_tbd_url(), "https://ics.uci.edu/b")
+        # the log was rewritten with the new hashes
+        seen_urls, _ = FrontierLog(self.config.save_file).replay()
+        self.assertEqual(set(seen_urls), {get_urlhash("https://ics.uci.edu/a?x=1&y=2"), get_urlhash("https://ics.uci.edu/b")})
+
+    def _load(self, factory=Frontier):
+        os.environ["TESTING"] = "false"
+        try:
+            return factory(self.config, False)
+        finally:
+            os.environ["TESTING"] = "true"
+
+    def _save(self, urls, factory=Frontier):
+        os.environ["TESTING"] = "false"
+        try:
+            self.config.seed_urls = urls
+            frontier = factory(self.config, True)
+            frontier.sync()
+        finally:
+            os.environ["TESTING"] = "true"
+
+    def test_rehash_only_when_fingerprint_changes(self):
+        self._save(["https://www.ics.uci.edu/a", "https://ics.uci.edu/a"])
+        with mock.patch.object(Frontier, "_rehash") as rehash:
+            frontier = self._load()
+        rehash.assert_not_called()
+        self.assertEqual(len(frontier._frontier), 2)
+
+        canonical.configure(fold_www=True)
+        frontier = self._load()
+        self.assertEqual(len(frontier._frontier), 1)
+        # the rewritten log records the new fingerprint, so it is not rehashed again
+        self.assertEqual(FrontierLog(self.config.save_file).replay()[1], [("https://www.ics.uci.edu/a", "ics.uci.edu")])
+        log = FrontierLog(self.config.save_file)
+        log.replay()
+        self.assertEqual(log.fingerprint, canonical.fingerprint())
+
+    def test_sqlite_rehash(self):
+        self._save(["https://www.ics.uci.edu/a", "https://ics.uci.edu/a", "https://ics.uci.edu/b"], SqliteFrontier)
+        frontier = self._load(SqliteFrontier)
+        self.assertEqual(len(frontier._frontier), 3)
+        frontier._db.close()
+
+        canonical.configure(fold_www=True)
+        frontier = self._load(SqliteFrontier)
+        self.assertEqual(len(frontier._frontier), 2)
+        self.assertEqual(frontier._db.execute("SELECT COUNT(*) FROM urls").fetchone()[0], 2)
+        self.assertTrue(frontier.url_seen(get_urlhash("https://ics.uci.edu/a")))
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/a")
+        frontier._db.close()
+
+    def test_report_duplicates_reads_without_writing(self):
+        FrontierLog(self.config.save_file).compact({
+            "old-1": ("https://ics.uci.edu/a", True, "ics.uci.edu"),
+            "old-2": ("https://ics.uci.edu/./a", False, "ics.uci.edu")}, canonicalized=False)
+        with open(self.config.save_file, "a") as f:
+            f.write("S\tdeadbeef\tics.")
+        size = os.path.getsize(self.config.save_file)
+        with redirect_stdout(io.StringIO()) as out:
+            launch.report_duplicates(self.config)
+        self.assertTrue(out.getvalue().startswith("2 URLs seen, 1 after canonicalizing"))
+        self.assertEqual(os.path.getsize(self.config.save_file), size)
+
+    def test_report_duplicates_reads_shelve(self):
+        with shelve.open(self.config.save_file) as seen_urls:
+            seen_urls["old-1"] = ("https://ics.uci.edu/a", True)
+            seen_urls["old-2"] = ("https://ics.uci.edu/./a", False)
+        with redirect_stdout(io.StringIO()) as out:
+            launch.report_duplicates(self.config)
+        self.assertTrue(out.getvalue().startswith("2 URLs seen, 1 after canonicalizing"))
+
+    def tearDown(self):
+        canonical.configure()
+        self._delete_temp()
+
+
+if __name__ == '__main__':
+    unittest.main()
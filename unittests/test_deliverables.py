@@ -1,9 +1,9 @@
 import unittest
-from deliverables import GlobalDeliverableData, RawDeliverableData, process_page
+from deliverables import GlobalDeliverableData, RawDeliverableData, WordCounts, process_page
 from collections import Counter
 import os
 import threading
-from bs4 import BeautifulSoup
+from utils.parsing import parse_html
 
 
 class TestDeliverables(unittest.TestCase):
@@ -30,14 +30,14 @@ class TestDeliverables(unittest.TestCase):
         self.assertEqual(g.get_raw().finished, False)
         self.assertDictEqual(g.get_raw().url_word_map, {})
         self.assertEqual(g.get_raw().total_urls_seen, 0)
-        self.assertEqual(g.get_raw().words, Counter())
+        self.assertEqual(g.get_raw().words.to_counter(), Counter())
         self.assertEqual(g.get_raw().subdomains, Counter())
 
         for i in range(5):
             fake_data = RawDeliverableData(
                 url_word_map={f"fake_url_hash_{i}": 6},
                 total_urls_seen=5,
-                words=Counter(foo=1, bar=2, baz=3),
+                words=WordCounts.from_words(Counter(foo=1, bar=2, baz=3)),
                 subdomains=Counter({f"fake_url_domain_{i}": 1})
             )
             g.update(fake_data)
@@ -75,7 +75,7 @@ class TestDeliverables(unittest.TestCase):
         self.assertEqual(g.get_raw().finished, False)
         self.assertDictEqual(g.get_raw().url_word_map, {})
         self.assertEqual(g.get_raw().total_urls_seen, 0)
-        self.assertEqual(g.get_raw().words, Counter())
+        self.assertEqual(g.get_raw().words.to_counter(), Counter())
         self.assertEqual(g.get_raw().subdomains, Counter())
 
         batches = 5
@@ -85,7 +85,7 @@ class TestDeliverables(unittest.TestCase):
                 fake_data = RawDeliverableData(
                     url_word_map={f"fake_url_hash_{thread_id}_{i}": 6},
                     total_urls_seen=5,
-                    words=Counter(foo=1, bar=2, baz=3),
+                    words=WordCounts.from_words(Counter(foo=1, bar=2, baz=3)),
                     subdomains=Counter({f"fake_url_domain_{thread_id}_{i}": 1})
                 )
                 g.update(fake_data)
@@ -125,7 +125,7 @@ class TestDeliverables(unittest.TestCase):
         fake_data = RawDeliverableData(
             url_word_map={"fake": 1},
             total_urls_seen=5,
-            words=Counter(foo=1, bar=2, baz=3),
+            words=WordCounts.from_words(Counter(foo=1, bar=2, baz=3)),
             subdomains=Counter({"fake": 1})
         )
         g.update(fake_data)
@@ -145,13 +145,79 @@ class TestDeliverables(unittest.TestCase):
         self.assertEqual(
             GlobalDeliverableData.get_previous_deliverable_fname(), None)
 
+    def _page(self, i):
+        return RawDeliverableData(
+            url_word_map={f"fake_url_hash_{i}": 6},
+            total_urls_seen=5,
+            words=WordCounts.from_words(Counter(foo=1, bar=2, baz=3)),
+            subdomains=Counter({"fake_url_domain": 1})
+        )
+
+    def test_checkpoint_batch(self):
+        g = GlobalDeliverableData(checkpoint_interval=3600, checkpoint_batch=3)
+        g.update(self._page(0))
+        g.update(self._page(1))
+        # merged in memory, but not yet checkpointed
+        self.assertEqual(len(g.get_raw().url_word_map), 2)
+        self.assertEqual(GlobalDeliverableData(g._shelve_path).get_raw().url_word_map, {})
+
+        g.update(self._page(2))
+        saved = GlobalDeliverableData(g._shelve_path).get_raw()
+        self.assertEqual(len(saved.url_word_map), 3)
+        self.assertEqual(saved.subdomains["fake_url_domain"], 3)
+        self.assertEqual(saved.words["bar"], 3 * 2)
+
+    def test_checkpoint_interval(self):
+        g = GlobalDeliverableData(checkpoint_interval=0, checkpoint_batch=1000)
+        g.update(self._page(0))
+        self.assertEqual(len(GlobalDeliverableData(g._shelve_path).get_raw().url_word_map), 1)
+
+    def test_after_checkpoint(self):
+        g = GlobalDeliverableData(checkpoint_interval=3600, checkpoint_batch=2)
+        saved = []
+        g.after_checkpoint(lambda: saved.append(set(GlobalDeliverableData(g._shelve_path).get_raw().url_word_map)))
+        for i in range(3):
+            g.update(self._page(i))
+        # called once the batch is on the shelf, not on every update
+        self.assertEqual(saved, [{"fake_url_hash_0", "fake_url_hash_1"}])
+        g.checkpoint()
+        self.assertEqual(saved[1], {f"fake_url_hash_{i}" for i in range(3)})
+
+    def test_resume_from_checkpoint(self):
+        g = GlobalDeliverableData(checkpoint_interval=3600, checkpoint_batch=1000)
+        for i in range(3):
+            g.update(self._page(i))
+        # when the crawler stops
+        g.checkpoint()
+
+        resumed = GlobalDeliverableData(g._shelve_path, checkpoint_interval=3600, checkpoint_batch=1000)
+        for i in range(3, 5):
+            resumed.update(self._page(i))
+        resumed.mark_finished()
+
+        saved = GlobalDeliverableData(g._shelve_path).get_raw()
+        self.assertTrue(saved.finished)
+        self.assertEqual(set(saved.url_word_map), {f"fake_url_hash_{i}" for i in range(5)})
+        self.assertEqual(saved.total_urls_seen, 5 * 5)
+        self.assertEqual(saved.words["foo"], 5)
+        self.assertEqual(saved.subdomains["fake_url_domain"], 5)
+
+    def test_get_raw_is_a_copy(self):
+        g = GlobalDeliverableData()
+        g.update(self._page(0))
+        raw = g.get_raw()
+        raw.url_word_map.clear()
+        raw.subdomains.clear()
+        self.assertEqual(len(g.get_raw().url_word_map), 1)
+        self.assertEqual(len(g.get_raw().subdomains), 1)
+
     def test_process_page(self):
         with open("./unittests/test.html", 'r') as f:
             text = f.read()
 
-        soup = BeautifulSoup(text, 'html.parser')
+        page = parse_html(text)
 
-        deliverable = process_page("https://ics.uci.edu/notreal#fake", soup)
+        deliverable = process_page("https://ics.uci.edu/notreal#fake", page)
 
         self.assertTrue(
             "https://ics.uci.edu/notreal" in deliverable.url_word_map.keys())
@@ -164,19 +230,19 @@ class TestDeliverables(unittest.TestCase):
             Counter(deliverable.url_word_map).most_common(1)[0][1], 45)
 
         self.assertEqual(deliverable.words['foo'], 4)
-        self.assertEqual(len(deliverable.words), 8)
+        self.assertEqual(len(deliverable.words.to_counter()), 8)
 
     def test_accumuluate_deliverable(self):
         A = RawDeliverableData()
         A.url_word_map = dict(zip(
             ["xxx", "yyy", "xxx/abc", "yyy/abc/?def"], [-1]*4))
-        A.words = Counter(hello=20, world=20)
+        A.words = WordCounts.from_words(Counter(hello=20, world=20))
         A.subdomains = Counter(xxx=2, yyy=2)
 
         B = RawDeliverableData()
         B.url_word_map = dict(zip(
             ["foo", "bar", "foo/baz", "bar/baz/?idk", "xxx"], [-1]*5))
-        B.words = Counter(world=5, hold=5, on=5)
+        B.words = WordCounts.from_words(Counter(world=5, hold=5, on=5))
         B.subdomains = Counter(foo=2, bar=2, xxx=1)
 
         final = GlobalDeliverableData()
@@ -187,8 +253,8 @@ class TestDeliverables(unittest.TestCase):
 
         self.assertEqual(final.url_word_map,
                          A.url_word_map | B.url_word_map)
-        self.assertEqual(final.words,
-                         A.words + B.words)
+        self.assertEqual(final.words.to_counter(),
+                         A.words.to_counter() + B.words.to_counter())
         self.assertEqual(final.subdomains,
                          A.subdomains + B.subdomains)
 
@@ -198,13 +264,13 @@ class TestDeliverables(unittest.TestCase):
         with open("./unittests/test_bar.html", 'r') as f:
             bar = f.read()
 
-        foo_soup = BeautifulSoup(foo, 'html.parser')
-        bar_soup = BeautifulSoup(bar, 'html.parser')
+        foo_page = parse_html(foo)
+        bar_page = parse_html(bar)
 
         deliverable = GlobalDeliverableData()
-        deliverable.update(process_page("https://TEST_FOO.uci.edu", foo_soup))
+        deliverable.update(process_page("https://TEST_FOO.uci.edu", foo_page))
         deliverable.update(process_page(
-            "https://TEST_BAR.uci.edu/longer_page#IGNORE_FRAG", bar_soup))
+            "https://TEST_BAR.uci.edu/longer_page#IGNORE_FRAG", bar_page))
 
         deliverable = deliverable.get_raw()
 
@@ -0,0 +1,83 @@
+import unittest
+import threading
+import time
+from configparser import ConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+
+from utils import download as download_module
+from utils.download import download
+from utils.config import Config
+from utils import get_logger
+
+
+class FakeCacheHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so connections are kept alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = parse_qs(urlparse(self.path).query)["q"][0]
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+        if url.endswith("/slow"):
+            time.sleep(1)
+
+        body = cbor.dumps({"url": url, "status": 200})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self.config.pool_size = 2
+        self.config.download_timeout = 0.5
+        self.logger = get_logger("TEST DOWNLOAD")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCacheHandler)
+        self.server.connections = set()
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config.cache_server = self.server.server_address
+        download_module._SESSION = None
+
+    def test_connections_are_reused(self):
+        statuses = []
+
+        def worker(worker_id):
+            for i in range(10):
+                statuses.append(download(f"https://one.com/{worker_id}/{i}", self.config, self.logger).status)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * 40)
+        # 40 downloads from 4 threads, over no more connections than the pool holds
+        self.assertLessEqual(len(self.server.connections), self.config.pool_size)
+
+    def test_timeout(self):
+        resp = download("https://one.com/slow", self.config, self.logger)
+        self.assertIsNone(resp.status)
+        self.assertIn("Timeout", resp.error)
+        self.assertEqual(download("https://one.com/fast", self.config, self.logger).status, 200)
+
+    def tearDown(self):
+        download_module._SESSION = None
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from bs4 import BeautifulSoup
 from scraper import extract_next_links
+from utils.parsing import parse_html
 
 
 class TestExtractNextLinks(unittest.TestCase):
@@ -19,8 +20,8 @@ class TestExtractNextLinks(unittest.TestCase):
         with open("./unittests/test.html", 'r') as f:
             text = f.read()
 
-        soup = BeautifulSoup(text, "html.parser")
-        out = extract_next_links("test.html", soup)
+        page = parse_html(text, "test.html")
+        out = extract_next_links(page)
 
         self.assertEqual(len(out), 4)
         self.assertNotIn("https://cnn.com", out)
@@ -29,8 +30,8 @@ class TestExtractNextLinks(unittest.TestCase):
         with open("./unittests/test2.html", 'r') as f:
             text = f.read()
 
-        soup = BeautifulSoup(text, "html.parser")
-        out = extract_next_links("https://ics.uci.edu", soup)
+        page = parse_html(text, "https://ics.uci.edu")
+        out = extract_next_links(page)
         self.assertIn("https://ics.uci.edu", out)
         self.assertIn("https://ics.uci.edu/foo", out)
         self.assertNotIn("/foo", out)
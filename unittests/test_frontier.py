@@ -4,9 +4,12 @@ Test my changes to the frontier.
 
 
 import unittest
+from unittest import mock
 from bs4 import BeautifulSoup
 from utils.response import Response
 from crawler import Frontier
+from crawler.sqlite_frontier import SqliteFrontier
+from crawler.bloom import ScalableBloomFilter
 from urllib.parse import urlparse
 import time
 import os
@@ -22,6 +25,8 @@ import random
 
 
 class TestFrontier(unittest.TestCase):
+    frontier_factory = Frontier
+
     def _delete_temp(self):
         for file_path in glob.glob(f"{self.config.save_file}*"):
             if os.path.isfile(file_path):
@@ -35,60 +40,67 @@ class TestFrontier(unittest.TestCase):
         self._delete_temp()  # ensure they are deleted
         self.assertEqual(len(self.config.seed_urls), 4)
 
+    def _fill(self, f, urls):
+        """Replace the URLs waiting in the frontier with urls, which are downloaded in order per domain."""
+        f._frontier.clear()
+        for url in urls:
+            f._frontier.push(url)
+
     def test_seed_correct(self):
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         ics = self.config.seed_urls[0]
         self.assertIn(ics, f._frontier)
-        self.assertIn("ics.uci.edu", f._domains_last_accessed)
+        self.assertTrue(f._can_access_domain("ics.uci.edu"))
         self.assertTrue(f.url_seen(get_urlhash(ics)))
         self.assertFalse(f.url_downloaded(get_urlhash(ics)))
-        self.assertLess(
-            f._domains_last_accessed['ics.uci.edu'], time.time())
 
     def test_extract(self):
-        f = Frontier(self.config, True)
-        # f._frontier.insert(2, "https://stat.uci.edu/bungus")
-        # f._frontier.insert(2, "https://abc.uci.edu/bungus")
-        f._frontier.append("https://www.stat.uci.edu/bad")
+        f = self.frontier_factory(self.config, True)
+        f.add_url("https://www.stat.uci.edu/bad")
+        self.assertEqual(len(f._frontier), 5)
 
+        # seed domains have never been accessed, so they are handed out in the order they were added
         one = f.get_tbd_url()
-        self.assertEqual(one, "https://www.stat.uci.edu/bad")
+        self.assertEqual(one, "https://www.ics.uci.edu")
         one_domain = get_domain_name(urlparse(one).netloc)
-        self.assertEqual(one_domain, "stat.uci.edu")
+        self.assertEqual(one_domain, "ics.uci.edu")
         self.assertTrue(
-            time.time() - f._domains_last_accessed[one_domain] < 0.1)
+            time.time() - f._frontier.last_accessed[one_domain] < 0.1)
         self.assertEqual(len(f._frontier), 4)
 
         two = f.get_tbd_url()
         two_domain = get_domain_name(urlparse(two).netloc)
         self.assertNotEqual(one_domain, two_domain)
-        self.assertEqual(two_domain, "informatics.uci.edu")
+        self.assertEqual(two_domain, "cs.uci.edu")
         self.assertTrue(len(f._frontier) == 3)
 
-        time.sleep(0.5)
-
         three = f.get_tbd_url()
         three_domain = get_domain_name(urlparse(three).netloc)
-        self.assertEqual(three, "https://www.stat.uci.edu")
-        self.assertEqual(three_domain, "stat.uci.edu")
+        self.assertEqual(three_domain, "informatics.uci.edu")
         self.assertTrue(len(f._frontier) == 2)
 
         four = f.get_tbd_url()
         four_domain = get_domain_name(urlparse(four).netloc)
-        self.assertEqual(four_domain, "cs.uci.edu")
+        self.assertEqual(four, "https://www.stat.uci.edu")
+        self.assertEqual(four_domain, "stat.uci.edu")
         self.assertTrue(len(f._frontier) == 1)
 
-        four = f.get_tbd_url()
-        four_domain = get_domain_name(urlparse(four).netloc)
-        self.assertEqual(four, "https://www.ics.uci.edu")
+        # stat.uci.edu was just accessed
+        self.assertIsNone(f.get_tbd_url())
+        self.assertGreater(f.time_until_ready(), 0)
+
+        time.sleep(0.5)
+
+        five = f.get_tbd_url()
+        self.assertEqual(five, "https://www.stat.uci.edu/bad")
         self.assertTrue(len(f._frontier) == 0)
 
         self.assertIsNone(f.get_tbd_url())
+        self.assertIsNone(f.time_until_ready())
 
     def test_single_domain(self):
-        f = Frontier(self.config, True)
-        lq = [f"https://one.com/{i+1}" for i in range(3)][::-1]
-        f._frontier = lq
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, [f"https://one.com/{i+1}" for i in range(3)])
 
         one = f.get_tbd_url()
         self.assertEqual(one, "https://one.com/1")
@@ -103,21 +115,20 @@ class TestFrontier(unittest.TestCase):
         self.assertEqual(f.get_tbd_url(), None)
 
     def test_frontier_downloaded(self):
-        f = Frontier(self.config, True)
-        lq = ["https://www.stat.uci.edu"][::-1]
-        f._frontier = lq
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://www.stat.uci.edu"])
 
         url = f.get_tbd_url()
         domain = get_domain_name(url)
         self.assertEqual(domain, "stat.uci.edu")
         self.assertFalse(f._can_access_domain(domain))
         self.assertEqual(f.get_tbd_url(), None)
-        self.assertIn("stat.uci.edu", f._domains_last_accessed.keys())
+        self.assertIn("stat.uci.edu", f._frontier.last_accessed.keys())
 
     def test_simulation(self):
         # write a 4 worker test
         # create my own queue
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         lq = [
             "https://one.com/a",  # 1
             "https://one.com/b",  # 5
@@ -129,8 +140,7 @@ class TestFrontier(unittest.TestCase):
             "https://three.com/b",  # 7
             "https://four.com/b",  # 4
         ]
-        # reverse it so sequential ordering makes sense
-        f._frontier = lq[::-1]
+        self._fill(f, lq)
 
         download_order = [
             [lq[0], lq[1], lq[2]],
@@ -152,7 +162,7 @@ class TestFrontier(unittest.TestCase):
             time.sleep(0.5)
 
     def test_four_threads(self):
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         lq = [
             "https://one.com/a",  # 1
             "https://one.com/b",  # 5
@@ -164,8 +174,7 @@ class TestFrontier(unittest.TestCase):
             "https://three.com/b",  # 7
             "https://four.com/b",  # 4
         ]
-        # reverse it so sequential ordering makes sense
-        f._frontier = lq[::-1]
+        self._fill(f, lq)
         processed_urls = []
         num_threads = 4
         threads = [None] * num_threads
@@ -181,6 +190,7 @@ class TestFrontier(unittest.TestCase):
                         time.sleep(0.5)
                         continue
                 processed_urls.append(tbd_url)
+                f.mark_url_complete(tbd_url)
                 time.sleep(0.5)
 
         for i in range(num_threads):
@@ -206,20 +216,19 @@ class TestFrontier(unittest.TestCase):
         self.assertEqual(processed_urls, ordered)
 
     def test_two_threads(self):
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         lq = [
             "https://one.com/a",  # 1
-            "https://one.com/b",  # 3
-            "https://one.com/c",  # 5
+            "https://one.com/b",  # 5
+            "https://one.com/c",  # 8
             "https://two.com/a",  # 2
-            "https://two.com/b",  # 4
-            "https://two.com/c",  # 6
-            "https://three.com/a",  # 7
-            "https://three.com/b",  # 9
-            "https://four.com/b",  # 8
+            "https://two.com/b",  # 6
+            "https://two.com/c",  # 9
+            "https://three.com/a",  # 3
+            "https://three.com/b",  # 7
+            "https://four.com/b",  # 4
         ]
-        # reverse it so sequential ordering makes sense
-        f._frontier = lq[::-1]
+        self._fill(f, lq)
         processed_urls = []
         num_threads = 2
         threads = [None] * num_threads
@@ -235,6 +244,7 @@ class TestFrontier(unittest.TestCase):
                         time.sleep(0.5)
                         continue
                 processed_urls.append(tbd_url)
+                f.mark_url_complete(tbd_url)
                 time.sleep(0.5)
 
         for i in range(num_threads):
@@ -245,27 +255,28 @@ class TestFrontier(unittest.TestCase):
             thread.join()
 
         self.assertEqual(len(processed_urls), len(lq))
+        # domains are handed out in the order they become ready, so three and four are not starved
         ordered = [
             "https://one.com/a",  # 1
             "https://two.com/a",  # 2
-            "https://one.com/b",  # 3
-            "https://two.com/b",  # 4
-            "https://one.com/c",  # 5
-            "https://two.com/c",  # 6
-            "https://three.com/a",  # 7
-            "https://four.com/b",  # 8
-            "https://three.com/b",  # 9
+            "https://three.com/a",  # 3
+            "https://four.com/b",  # 4
+            "https://one.com/b",  # 5
+            "https://two.com/b",  # 6
+            "https://three.com/b",  # 7
+            "https://one.com/c",  # 8
+            "https://two.com/c",  # 9
         ]
 
         self.assertEqual(processed_urls, ordered)
 
     def test_frontier_no_race_conditions(self):
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         lq = [
             "https://one.com",
             "https://two.com",
         ] * 2  # * 200
-        f._frontier = lq
+        self._fill(f, lq)
         num_threads = 4
         threads = [None] * num_threads
         processed_urls = []
@@ -282,6 +293,7 @@ class TestFrontier(unittest.TestCase):
                         time.sleep(delay)
                         continue
                 processed_urls.append(tbd_url)
+                f.mark_url_complete(tbd_url)
                 time.sleep(delay)
 
         for i in range(num_threads):
@@ -299,8 +311,8 @@ class TestFrontier(unittest.TestCase):
         )
 
     def test_simulation(self):
-        f = Frontier(self.config, True)
-        f._frontier = []
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, [])
         f.add_url("https://one.com")
         self.assertIn("https://one.com", f._frontier)
         self.assertTrue(f.url_seen(get_urlhash("https://one.com")))
@@ -324,33 +336,94 @@ class TestFrontier(unittest.TestCase):
         time.sleep(0.5)
 
         self.assertFalse(f.empty())
-        b = f.get_tbd_url()
-        self.assertEqual(b, "https://one.com/b")
-        f.mark_url_complete(b)
-        self.assertTrue(f.url_seen(get_urlhash("https://one.com/b")))
-        self.assertTrue(f.url_downloaded(get_urlhash("https://one.com/b")))
-        self.assertIsNone(f.get_tbd_url())
-        time.sleep(0.5)
-
         a = f.get_tbd_url()
         self.assertEqual(a, "https://one.com/a")
         f.mark_url_complete(a)
+        self.assertTrue(f.url_seen(get_urlhash("https://one.com/a")))
         self.assertTrue(f.url_downloaded(get_urlhash("https://one.com/a")))
         self.assertIsNone(f.get_tbd_url())
         time.sleep(0.5)
 
+        b = f.get_tbd_url()
+        self.assertEqual(b, "https://one.com/b")
+        f.mark_url_complete(b)
+        self.assertTrue(f.url_downloaded(get_urlhash("https://one.com/b")))
+        self.assertIsNone(f.get_tbd_url())
+        time.sleep(0.5)
+
         self.assertIsNone(f.get_tbd_url())
 
     def test_emnpty_frontier(self):
         os.environ["TESTING"] = "false"
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         f._test_clear_seen_urls()
-        f._frontier = ["a"]
-        f.get_tbd_url()
+        self._fill(f, ["a"])
+        a = f.get_tbd_url()
+        # nothing is queued, but "a" may still scrape in more URLs
         self.assertFalse(f.empty())
-        time.sleep(10)
+        f.mark_url_complete(a)
         self.assertTrue(f.empty())
 
+    def test_complete_without_get(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com"])
+        # never handed out, so completing it is a bookkeeping bug rather than something to hide
+        with self.assertRaises(AssertionError):
+            f.mark_url_complete("https://one.com")
+
+    def test_complete_looks_only_in_own_shard(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com"])
+        url = f.get_tbd_url()
+        urlhash = get_urlhash(normalize(url))
+        # both scan every shard, while completing a URL holds only the lock of its own
+        with mock.patch.object(f, "url_seen", side_effect=AssertionError), \
+                mock.patch.object(f, "url_downloaded", side_effect=AssertionError):
+            f.mark_url_complete(url)
+        self.assertTrue(f.url_downloaded(urlhash))
+
+    def test_idle_while_urls_are_added(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com"])
+        url = f.get_tbd_url()
+        scheduler_len = type(f._frontier).__len__
+        worker = threading.Thread(target=lambda: (f.add_urls(["https://two.com"]), f.mark_url_complete(url)))
+
+        def len_then_scrape(scheduler):
+            # the worker adds what it scraped and completes its URL after the queue was read, but before _in_flight is
+            length = scheduler_len(scheduler)
+            if worker.ident is None:
+                worker.start()
+                worker.join(0.5)
+            return length
+
+        with mock.patch.object(type(f._frontier), "__len__", len_then_scrape):
+            idle = f.idle()
+        worker.join(1)
+        self.assertFalse(idle)
+        self.assertFalse(f.idle())
+        self.assertEqual(f.get_tbd_url(), "https://two.com")
+
+    def test_empty_frontier_wakes_workers(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com"])
+        url = f.get_tbd_url()
+        results = []
+
+        def worker():
+            results.append(f.get_tbd_url(timeout=None))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.assertEqual(results, [])
+
+        f.mark_url_complete(url)
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(results, [None] * 3)
+
     def test_load_save(self):
         os.environ["TESTING"] = "false"
         import shelve
@@ -358,17 +431,21 @@ class TestFrontier(unittest.TestCase):
 
         # create shelf
         urls = ["https://one.com", "https://two.com/page"]
-        f = Frontier(self.config, True)
+        f = self.frontier_factory(self.config, True)
         f._test_clear_seen_urls()
+        self._fill(f, [])
         for url in urls:
             f.add_url(url)
+        # the first URL is handed out but never completed, so it is downloaded again after loading
+        self.assertEqual(f.get_tbd_url(), urls[0])
         f.mark_url_complete(f.get_tbd_url())
+        f.save_downloads()
+        f.sync()
 
         self.assertEqual(f._config.save_file, self.config.save_file)
-        self.assertTrue(os.path.exists(self.config.save_file)
-                        or os.path.exists(self.config.save_file + ".dat"))
+        self.assertTrue(glob.glob(f"{self.config.save_file}*"))
 
-        f = Frontier(self.config, False)  # loads from tempfile
+        f = self.frontier_factory(self.config, False)  # loads from tempfile
 
         self.assertEqual(f._config.save_file, self.config.save_file)
         # f._load_save()
@@ -385,10 +462,204 @@ class TestFrontier(unittest.TestCase):
         self.assertTrue(f.url_seen(get_urlhash("https://two.com/page")))
         self.assertTrue(f.url_downloaded(get_urlhash("https://two.com/page")))
 
+    def test_blocking_get_waits_for_delay(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com/a", "https://one.com/b"])
+
+        self.assertEqual(f.get_tbd_url(), "https://one.com/a")
+        start = time.time()
+        self.assertEqual(f.get_tbd_url(timeout=2), "https://one.com/b")
+        # woken up when one.com's delay expired, not after the full timeout
+        self.assertGreater(time.time() - start, 0.4)
+        self.assertLess(time.time() - start, 1)
+
+        # times out while one.com is still not ready
+        f._frontier.push("https://one.com/c")
+        self.assertIsNone(f.get_tbd_url(timeout=0.1))
+
+    def test_blocking_get_wakes_on_add(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, ["https://one.com/a"])
+        self.assertEqual(f.get_tbd_url(), "https://one.com/a")
+        # one.com is not ready for another 0.5 seconds
+        f._frontier.push("https://one.com/b")
+
+        timer = threading.Timer(0.2, f.add_url, args=("https://two.com",))
+        timer.start()
+        start = time.time()
+        self.assertEqual(f.get_tbd_url(timeout=5), "https://two.com")
+        self.assertLess(time.time() - start, 1)
+        timer.join()
+
+    def test_add_urls(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, [])
+        f.add_urls(["https://one.com/a", "https://one.com/b/",
+                   "https://one.com/b", "https://two.com", "https://www.ics.uci.edu"])
+
+        # duplicates within the batch and seed URLs that were already seen are skipped
+        self.assertEqual(len(f._frontier), 3)
+        self.assertIn("https://one.com/b", f._frontier)
+        self.assertTrue(f.url_seen(get_urlhash("https://two.com")))
+
+        f.add_urls([])
+        f.add_urls(url for url in ["https://two.com", "https://three.com"])
+        self.assertEqual(len(f._frontier), 4)
+
+    def test_add_urls_from_threads(self):
+        f = self.frontier_factory(self.config, True)
+        self._fill(f, [])
+        # every thread adds the same URLs, spread over many domains
+        urls = [f"https://domain{i % 50}.com/{i}" for i in range(500)]
+
+        threads = [threading.Thread(target=f.add_urls, args=(urls,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # each URL is queued once, however many threads raced to add it
+        self.assertEqual(len(f._frontier), 500)
+        self.assertTrue(all(f.url_seen(get_urlhash(url)) for url in urls))
+        stats = f.lock_stats()
+        self.assertGreater(stats["shards"]["acquisitions"], 0)
+        self.assertGreaterEqual(stats["shards"]["wait_time"], 0)
+
+    def _read_log(self):
+        if not os.path.exists(self.config.save_file):
+            return []
+        with open(self.config.save_file) as f:
+            return [line.split("\t")[0] for line in f]
+
+    def test_write_behind(self):
+        os.environ["TESTING"] = "false"
+        self.config.save_interval = 60
+        self.config.save_batch_size = 3
+
+        f = self.frontier_factory(self.config, True)
+        f._test_clear_seen_urls()
+        self._fill(f, [])
+        f.add_url("https://one.com")
+        f.add_url("https://two.com")
+        self.assertTrue(f.url_seen(get_urlhash("https://one.com")))
+        self.assertEqual(self._read_log(), [])
+
+        # the third record fills the batch
+        f.add_url("https://three.com")
+        self.assertEqual(self._read_log(), ["C", "S", "S", "S"])
+
+        f.mark_url_complete(f.get_tbd_url())
+        f.sync()
+        # the download is left for save_downloads(), called once the deliverables are checkpointed
+        self.assertEqual(self._read_log(), ["C", "S", "S", "S", "Q"])
+        f.save_downloads()
+        self.assertEqual(self._read_log(), ["C", "S", "S", "S", "Q", "D"])
+
+    def test_save_downloads(self):
+        os.environ["TESTING"] = "false"
+        f = self.frontier_factory(self.config, True)
+        saved, unsaved = f.get_tbd_url(), f.get_tbd_url()
+        f.mark_url_complete(saved)
+        f.save_downloads()
+        f.mark_url_complete(unsaved)
+        self.assertTrue(f.url_downloaded(get_urlhash(normalize(unsaved))))
+        f.sync()
+
+        # not saved as downloaded by sync(), so a restarted crawl downloads it again
+        restarted = self.frontier_factory(self.config, False)
+        self.assertTrue(restarted.url_downloaded(get_urlhash(normalize(saved))))
+        self.assertNotIn(saved, restarted._frontier)
+        self.assertFalse(restarted.url_downloaded(get_urlhash(normalize(unsaved))))
+        self.assertIn(unsaved, restarted._frontier)
+
     def tearDown(self):
         os.environ["TESTING"] = "true"
         self._delete_temp()
 
 
+class TestSqliteFrontier(TestFrontier):
+    """Runs every frontier test against the sqlite backed frontier."""
+    frontier_factory = SqliteFrontier
+
+    def test_write_behind(self):
+        import sqlite3
+        os.environ["TESTING"] = "false"
+        self.config.save_interval = 60
+        self.config.save_batch_size = 3
+
+        f = self.frontier_factory(self.config, True)
+        f._test_clear_seen_urls()
+        self._fill(f, [])
+        f.sync()
+
+        # a second connection, like one monitoring the crawl, only sees committed batches
+        monitor = sqlite3.connect(f"{self.config.save_file}.sqlite")
+
+        def count(query):
+            return monitor.execute(query).fetchone()[0]
+
+        f.add_urls(["https://one.com", "https://two.com"])
+        self.assertTrue(f.url_seen(get_urlhash("https://one.com")))
+        self.assertEqual(count("SELECT COUNT(*) FROM urls"), 0)
+
+        # the third change fills the batch
+        f.add_url("https://three.com")
+        self.assertEqual(count("SELECT COUNT(*) FROM urls"), 3)
+        self.assertEqual(count("SELECT COUNT(*) FROM queue"), 3)
+
+        f.mark_url_complete(f.get_tbd_url())
+        f.sync()
+        self.assertEqual(count("SELECT COUNT(*) FROM urls WHERE downloaded = 1"), 0)
+        self.assertEqual(count("SELECT COUNT(*) FROM queue"), 2)
+        f.save_downloads()
+        self.assertEqual(count("SELECT COUNT(*) FROM urls WHERE downloaded = 1"), 1)
+        monitor.close()
+
+    def test_seen_filter(self):
+        os.environ["TESTING"] = "false"
+        f = self.frontier_factory(self.config, True)
+        f.add_urls(["https://one.com", "https://two.com", "https://one.com"])
+        stats = f.seen_filter_stats()
+        self.assertEqual(stats["urls"], 6)
+        # the duplicate one.com was the only URL that had to be checked against the database
+        self.assertEqual(stats["answered_by_filter"], 6)
+        self.assertEqual(stats["answered_by_database"], 1)
+        f.sync()
+
+        # loaded from the save
+        f = self.frontier_factory(self.config, False)
+        self.assertEqual(len(f._seen_filter), 6)
+        self.assertTrue(f.url_seen(get_urlhash("https://two.com")))
+
+        # saved with every commit, not only by sync(), so it survives a crash
+        f.add_url("https://three.com")
+        f._save()
+        with mock.patch.object(ScalableBloomFilter, "add") as add:
+            f = self.frontier_factory(self.config, False)
+        add.assert_not_called()
+        self.assertEqual(len(f._seen_filter), 7)
+        self.assertTrue(f.url_seen(get_urlhash("https://three.com")))
+
+        # a save without a filter that matches the urls table has it rebuilt from the table
+        f._db.execute("DELETE FROM meta WHERE key = 'seen_filter_urls'")
+        f._db.commit()
+        f = self.frontier_factory(self.config, False)
+        self.assertEqual(len(f._seen_filter), 7)
+        self.assertTrue(f.url_seen(get_urlhash("https://three.com")))
+
+    def test_load_lost_urls(self):
+        os.environ["TESTING"] = "false"
+        f = self.frontier_factory(self.config, True)
+        f.add_urls(["https://one.com", "https://two.com"])
+        self.assertEqual(f.get_tbd_url(), "https://www.ics.uci.edu")
+        f.sync()
+
+        # ics.uci.edu was being downloaded when the crawler stopped, so it is queued again
+        f = self.frontier_factory(self.config, False)
+        self.assertEqual(len(f._frontier), 6)
+        self.assertEqual(f.get_tbd_url(), "https://www.cs.uci.edu")
+        self.assertIn("https://www.ics.uci.edu", f._frontier)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,158 @@
+import contextlib
+import unittest
+import os
+import glob
+import shelve
+from configparser import ConfigParser
+from crawler import Frontier
+from crawler.frontier_log import FrontierLog
+from utils.config import Config
+from utils import get_urlhash
+
+
+class TestFrontierLog(unittest.TestCase):
+    def _delete_temp(self):
+        for file_path in glob.glob(f"{self.config.save_file}*"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self._delete_temp()
+
+    def tearDown(self):
+        os.environ["TESTING"] = "true"
+        self._delete_temp()
+
+    def _write(self, log, urls):
+        for url in urls:
+            log.seen(get_urlhash(url), url.split("/")[2], url)
+        log.flush()
+
+    def test_replay(self):
+        log = FrontierLog(self.config.save_file)
+        self._write(log, ["https://one.com/a", "https://one.com/b", "https://two.com"])
+        log.dequeued(get_urlhash("https://one.com/a"))
+        log.downloaded(get_urlhash("https://one.com/a"), "https://one.com/a")
+        log.dequeued(get_urlhash("https://two.com"))
+        log.flush(downloads=True)
+
+        seen_urls, waiting = FrontierLog(self.config.save_file).replay()
+        self.assertEqual(len(seen_urls), 3)
+        self.assertEqual(seen_urls[get_urlhash("https://one.com/a")], ("https://one.com/a", True, "one.com"))
+        # two.com was handed out but never downloaded, so it is retried first
+        self.assertEqual(
+            waiting, [("https://two.com", "two.com"), ("https://one.com/b", "one.com")])
+
+    def test_replay_torn_record(self):
+        log = FrontierLog(self.config.save_file)
+        self._write(log, ["https://one.com/a"])
+        with open(self.config.save_file, "a") as f:
+            f.write("S\tdeadbeef\tone.")
+
+        log = FrontierLog(self.config.save_file)
+        seen_urls, waiting = log.replay()
+        self.assertEqual(list(seen_urls), [get_urlhash("https://one.com/a")])
+        self.assertEqual(log.records, 2)
+
+        # the torn record is cut off, so new records are not appended onto it
+        self._write(log, ["https://one.com/b"])
+        seen_urls, waiting = FrontierLog(self.config.save_file).replay()
+        self.assertEqual(len(seen_urls), 2)
+
+    def test_compact(self):
+        log = FrontierLog(self.config.save_file)
+        urls = [f"https://one.com/{i}" for i in range(10)]
+        self._write(log, urls)
+        for url in urls[:5]:
+            log.dequeued(get_urlhash(url))
+            log.downloaded(get_urlhash(url), url)
+        log.flush(downloads=True)
+        # the first record is the canonical fingerprint the url hashes were made with
+        self.assertEqual(log.records, 21)
+
+        seen_urls, waiting = FrontierLog(self.config.save_file).replay()
+        log.compact(seen_urls)
+        self.assertEqual(log.records, 11)
+
+        compacted_seen_urls, compacted_waiting = FrontierLog(
+            self.config.save_file).replay()
+        self.assertEqual(compacted_seen_urls, seen_urls)
+        self.assertEqual([url for url, _ in compacted_waiting], urls[5:])
+
+    def test_compact_keeps_records_made_while_writing(self):
+        log = FrontierLog(self.config.save_file)
+        self._write(log, ["https://one.com/a"])
+        seen_urls, _ = FrontierLog(self.config.save_file).replay()
+
+        @contextlib.contextmanager
+        def freeze():
+            yield
+            # made once the snapshot is taken, so it must land in the new log rather than the replaced one
+            log.seen(get_urlhash("https://one.com/b"), "one.com", "https://one.com/b")
+
+        log.compact(seen_urls, freeze)
+        log.flush()
+        _, waiting = FrontierLog(self.config.save_file).replay()
+        self.assertEqual(waiting, [("https://one.com/a", "one.com"), ("https://one.com/b", "one.com")])
+
+    def test_downloads_held_back(self):
+        log = FrontierLog(self.config.save_file)
+        log.seen(get_urlhash("https://one.com/a"), "one.com", "https://one.com/a")
+        log.dequeued(get_urlhash("https://one.com/a"))
+        log.downloaded(get_urlhash("https://one.com/a"), "https://one.com/a", "one.com")
+        # scraped from one.com/a, so it is saved before one.com/a is saved as downloaded
+        log.seen(get_urlhash("https://one.com/b"), "one.com", "https://one.com/b")
+        log.flush()
+        self.assertEqual(self._read_kinds(), ["C", "S", "Q", "S"])
+        log.flush(downloads=True)
+        self.assertEqual(self._read_kinds(), ["C", "S", "Q", "S", "D"])
+
+    def test_compact_keeps_downloads_held_back(self):
+        log = FrontierLog(self.config.save_file)
+        self._write(log, ["https://one.com/a"])
+        log.downloaded(get_urlhash("https://one.com/a"), "https://one.com/a", "one.com")
+        seen_urls = {get_urlhash("https://one.com/a"): ("https://one.com/a", True, "one.com")}
+
+        log.compact(seen_urls)
+        self.assertEqual(self._read_kinds(), ["C", "S"])
+        log.flush(downloads=True)
+        seen_urls, waiting = FrontierLog(self.config.save_file).replay()
+        self.assertEqual(seen_urls[get_urlhash("https://one.com/a")], ("https://one.com/a", True, "one.com"))
+        self.assertEqual(waiting, [])
+
+    def _read_kinds(self):
+        with open(self.config.save_file) as f:
+            return [line.split("\t")[0] for line in f]
+
+    def test_frontier_resume(self):
+        os.environ["TESTING"] = "false"
+        f = Frontier(self.config, True)
+        f.add_urls(["https://one.com/a", "https://one.com/b"])
+        for _ in range(4):
+            f.mark_url_complete(f.get_tbd_url())
+        f.save_downloads()
+        f.sync()
+
+        f = Frontier(self.config, False)
+        self.assertEqual(len(f._frontier), 2)
+        self.assertIn("https://one.com/a", f._frontier)
+        self.assertTrue(f.url_downloaded(get_urlhash("https://www.ics.uci.edu")))
+
+    def test_migrate_shelve(self):
+        os.environ["TESTING"] = "false"
+        with shelve.open(self.config.save_file) as seen_urls:
+            seen_urls[get_urlhash("https://one.com")] = ("https://one.com", True)
+            seen_urls[get_urlhash("https://two.com")] = ("https://two.com", False)
+
+        f = Frontier(self.config, False)
+        self.assertEqual(len(f._frontier), 1)
+        self.assertIn("https://two.com", f._frontier)
+        self.assertTrue(f.url_downloaded(get_urlhash("https://one.com")))
+        self.assertEqual(glob.glob(f"{self.config.save_file}*"), [self.config.save_file])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import pickle
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+import scraper
+from utils.config import Config
+from utils.response import Response
+
+
+def make_response(url, path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return Response({"url": url, "status": 200, "response": pickle.dumps(SimpleNamespace(
+        content=content, headers={"Content-Type": "text/html; charset=utf-8"}))})
+
+
+class TestParsePool(unittest.TestCase):
+    def setUp(self):
+        self.resp = make_response("https://www.ics.uci.edu/test", "./unittests/test2.html")
+
+    def test_pool_matches_inline(self):
+        inline_links, inline_data = scraper.scrape(self.resp.url, self.resp)
+
+        scraper.start_parse_pool(2)
+        try:
+            pool_links, pool_data = scraper.scrape(self.resp.url, self.resp)
+        finally:
+            scraper.stop_parse_pool()
+
+        self.assertEqual(pool_links, inline_links)
+        self.assertEqual(pool_data, inline_data)
+        self.assertIsNone(scraper._PARSE_POOL)
+
+    def test_invalid_response_is_not_parsed(self):
+        resp = Response({"url": self.resp.url, "status": 404})
+        self.assertEqual(scraper.scrape(resp.url, resp), ([], None))
+
+    def test_default_parse_processes(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        # a pool would only make the threads engine pickle every page across processes unless asked for
+        self.assertEqual(Config(cparser).parse_processes, 0)
+        cparser["LOCAL PROPERTIES"]["ENGINE"] = "pipeline"
+        self.assertEqual(Config(cparser).parse_processes, os.cpu_count() or 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import codecs
+import tracemalloc
+import unittest
+from unittest import mock
+
+from utils.parsing import BACKENDS, parse_html, http_charset
+
+
+PAGES = ["./unittests/test.html", "./unittests/test2.html", "./unittests/test_foo.html", "./unittests/test_bar.html"]
+
+
+class TestParsing(unittest.TestCase):
+    def test_backends_match_bs4(self):
+        for path in PAGES:
+            with open(path, 'rb') as f:
+                content = f.read()
+            expected = parse_html(content, "https://www.ics.uci.edu", "bs4")
+            for backend in BACKENDS:
+                with self.subTest(page=path, backend=backend):
+                    self.assertEqual(parse_html(content, "https://www.ics.uci.edu", backend), expected)
+
+    def test_hidden_text(self):
+        content = (b"<html><head><title>Title</title><style>a { color: red }</style><script>var x = 1</script></head>"
+                   b"<body>Hello<!-- comment --> <p>there&amp;<br>again</p><template>hidden</template>"
+                   b"<a href='/a'>link</a><a name='x'>no href</a><a href>empty</a></body></html>")
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                page = parse_html(content, backend=backend)
+                self.assertEqual(page.text, "Title Hello there& again link no href empty")
+                self.assertEqual(page.hrefs, ["/a", ""])
+
+    def test_links(self):
+        content = (b"<a href='/a#top'>a</a><a href='b'>b</a><a href='https://www.ics.uci.edu/a#bottom'>a again</a>"
+                   b"<a href='#top'>this page</a>")
+        page = parse_html(content, "https://www.ics.uci.edu/dir/page")
+        self.assertEqual(page.hrefs, ["/a#top", "b", "https://www.ics.uci.edu/a#bottom", "#top"])
+        self.assertEqual(page.links, [
+            "https://www.ics.uci.edu/a", "https://www.ics.uci.edu/dir/b", "https://www.ics.uci.edu/dir/page"])
+
+    def test_encodings(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(parse_html("<p>café</p>".encode("utf-8"), backend=backend).text, "café")
+                self.assertEqual(parse_html(b"", backend=backend).text, "")
+        # pages that are not UTF-8 are read as Windows-1252
+        self.assertEqual(parse_html("<p>café</p>".encode("cp1252"), backend="html.parser").text, "café")
+
+    def test_declared_encodings(self):
+        pages = {
+            "byte order mark": (codecs.BOM_UTF16_LE + "<p>Привет, café</p>".encode("utf-16-le"), None),
+            "meta charset": ('<meta charset="koi8-r"><p>Привет</p>'.encode("koi8-r"), None),
+            "http charset": ("<p>Привет</p>".encode("cp1251"), "windows-1251"),
+            "byte order mark over http charset": (codecs.BOM_UTF8 + "<p>Привет</p>".encode("utf-8"), "iso-8859-1"),
+        }
+        for backend in ["html.parser", *(["lxml"] if "lxml" in BACKENDS else [])]:
+            for name, (content, http_encoding) in pages.items():
+                with self.subTest(backend=backend, page=name):
+                    page = parse_html(content, backend=backend, http_encoding=http_encoding)
+                    self.assertEqual(page.text, "Привет, café" if name == "byte order mark" else "Привет")
+        # a charset Python does not know is ignored
+        self.assertEqual(parse_html("<p>café</p>".encode("utf-8"), http_encoding="unknown").text, "café")
+        self.assertEqual(http_charset("text/html; charset=UTF-8"), "utf-8")
+        self.assertIsNone(http_charset("text/html"))
+        self.assertIsNone(http_charset(None))
+
+
+class TextSink(list):
+    write = list.append
+
+
+class TestTextSink(unittest.TestCase):
+    def test_pieces_join_to_text(self):
+        for path in PAGES:
+            with open(path, 'rb') as f:
+                content = f.read()
+            for backend in BACKENDS:
+                expected = parse_html(content, "https://www.ics.uci.edu", backend)
+                # fed a few bytes at a time, so strings and characters are split between feeds
+                for feed_size in [1, 7, 1 << 16]:
+                    with self.subTest(page=path, backend=backend, feed_size=feed_size), \
+                            mock.patch("utils.parsing.FEED_SIZE", feed_size):
+                        sink = TextSink()
+                        page = parse_html(content, "https://www.ics.uci.edu", backend, text_sink=sink)
+                        self.assertEqual("".join(sink), expected.text)
+                        self.assertEqual(page.text, "")
+                        self.assertEqual(page.links, expected.links)
+
+    def test_whitespace(self):
+        content = b"<p>  one   two  </p> <p>\n</p>three<b> four</b>five  <i>  </i> six"
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), mock.patch("utils.parsing.FEED_SIZE", 2):
+                sink = TextSink()
+                parse_html(content, backend=backend, text_sink=sink)
+                self.assertEqual("".join(sink), "one   two three four five six")
+
+    def test_sink_cleared_on_reparse(self):
+        # found not to be UTF-8 only once most of it is written
+        content = ("<p>" + "word " * 1000 + "café</p>").encode("cp1252")
+        # bs4 guesses the encoding of a page itself
+        for backend in set(BACKENDS) - {"bs4"}:
+            with self.subTest(backend=backend), mock.patch("utils.parsing.FEED_SIZE", 64):
+                sink = TextSink()
+                parse_html(content, backend=backend, text_sink=sink)
+                self.assertEqual("".join(sink), "word " * 1000 + "café")
+
+    def test_bounded_memory(self):
+        class LengthSink(object):
+            length = 0
+
+            def write(self, text):
+                self.length += len(text)
+
+            def clear(self):
+                self.length = 0
+
+        paragraph = "<p>" + " ".join(["hello world alpha beta gamma"] * 20) + "</p>\n"
+        content = ("<html><body>" + paragraph * 4000 + "</body></html>").encode("utf-8")
+        for backend in set(BACKENDS) - {"bs4"}:
+            with self.subTest(backend=backend):
+                sink = LengthSink()
+                tracemalloc.start()
+                try:
+                    parse_html(content, backend=backend, text_sink=sink)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertGreater(sink.length, len(content) // 2)
+                # a few chunks of the page, never the whole of its text
+                self.assertLess(peak, len(content) // 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import glob
+import time
+from collections import Counter
+from configparser import ConfigParser
+
+from crawler import Frontier
+from crawler.pipeline import Pipeline
+from deliverables import RawDeliverableData
+from utils.config import Config
+from utils.response import Response
+
+
+NUM_DOMAINS = 6
+PAGES_PER_DOMAIN = 3
+
+
+def fake_parse_page(url, resp):
+    """Links every page to the next page of its domain. Slow, so the parse stage holds up the fetchers."""
+    time.sleep(0.05)
+    domain, page = url[len("https://"):].split("/")
+    links = [f"https://{domain}/{int(page) + 1}"] if int(page) + 1 < PAGES_PER_DOMAIN else []
+    return links, RawDeliverableData(url_word_map={url: 1}, subdomains=Counter({domain: 1}))
+
+
+def fake_scrape_page(url, resp, pool):
+    return pool.submit(fake_parse_page, url, resp).result()
+
+
+class FakeDeliverable(object):
+    def __init__(self):
+        self.updates = []
+
+    def update(self, batch):
+        self.updates.append(batch)
+
+
+class FakePipeline(Pipeline):
+    scrape_page = staticmethod(fake_scrape_page)
+
+    def _download(self, url):
+        return Response({"url": url, "status": 200})
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self.config.time_delay = 0.05
+        self.config.threads_count = 4
+        self.config.parse_processes = 2
+        self.config.pipeline_queue_size = 1
+        self.config.seed_urls = [f"https://domain{i}.com/0" for i in range(NUM_DOMAINS)]
+
+    def test_needs_parse_processes(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        cparser["LOCAL PROPERTIES"]["ENGINE"] = "pipeline"
+        cparser["LOCAL PROPERTIES"]["PARSEPROCESSES"] = "0"
+        with self.assertRaises(AssertionError):
+            Config(cparser)
+
+    def test_crawl(self):
+        frontier = Frontier(self.config, True)
+        deliverable = FakeDeliverable()
+        pipeline = FakePipeline(0, self.config, frontier, deliverable)
+        pipeline.start()
+        pipeline.join(timeout=60)
+        self.assertFalse(pipeline.is_alive())
+        self.assertTrue(frontier.empty())
+
+        crawled = [url for batch in deliverable.updates for url in batch.url_word_map]
+        self.assertEqual(len(crawled), NUM_DOMAINS * PAGES_PER_DOMAIN)
+        self.assertEqual(len(set(crawled)), len(crawled))
+
+        stats = pipeline.stats()
+        for stage in ["fetch", "parse", "index"]:
+            self.assertEqual(stats[stage]["processed"], NUM_DOMAINS * PAGES_PER_DOMAIN)
+        self.assertEqual(stats["fetch"]["queue_depth"], 0)
+        # fetching is faster than parsing, so the fetchers had to wait for room in the parse stage's queue
+        self.assertGreater(stats["fetch"]["blocked_time"], 0)
+
+    def tearDown(self):
+        for file_path in glob.glob(f"{self.config.save_file}*"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
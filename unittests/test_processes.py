@@ -0,0 +1,111 @@
+import unittest
+import glob
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+from collections import Counter
+from configparser import ConfigParser
+from threading import Thread
+
+from crawler import Crawler, Frontier
+from crawler.frontier_log import FrontierLog
+from crawler.processes import crawl_partition, domain_partition
+from deliverables import GlobalDeliverableData, RawDeliverableData
+from utils.config import Config
+
+
+NUM_DOMAINS = 12
+PAGES_PER_DOMAIN = 5
+
+
+class FakeWorker(Thread):
+    """Crawls a made up web instead of downloading: every page links to the next page of every domain."""
+
+    def __init__(self, worker_id, config, frontier, global_deliverable):
+        self.frontier = frontier
+        self.global_deliverable = global_deliverable
+        super().__init__(daemon=True)
+
+    def run(self):
+        while True:
+            url = self.frontier.get_tbd_url(timeout=None)
+            if url is None:
+                break
+            domain, page = url[len("https://"):].split("/")
+            self.global_deliverable.update(RawDeliverableData(
+                url_word_map={url: 1}, subdomains=Counter({domain: 1})))
+            if int(page) + 1 < PAGES_PER_DOMAIN:
+                self.frontier.add_urls(
+                    f"https://domain{i}.com/{int(page) + 1}" for i in range(NUM_DOMAINS))
+            self.frontier.mark_url_complete(url)
+
+
+class SlowWorker(FakeWorker):
+    def run(self):
+        while True:
+            url = self.frontier.get_tbd_url(timeout=None)
+            domain, page = url[len("https://"):].split("/")
+            self.global_deliverable.update(RawDeliverableData(
+                url_word_map={url: 1}, subdomains=Counter({domain: 1})))
+            self.frontier.add_urls([f"https://{domain}/{int(page) + 1}"])
+            self.frontier.mark_url_complete(url)
+            time.sleep(0.01)
+
+
+class TestProcesses(unittest.TestCase):
+    def setUp(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        self.config = Config(cparser)
+        self.config.processes = 3
+        self.config.time_delay = 0.01
+        self.config.seed_urls = ["https://domain0.com/0"]
+        GlobalDeliverableData.DELIVERABLES_DIRNAME = "TEMP_DELIVERABLES"
+
+    def test_domain_partition(self):
+        partitions = [domain_partition(f"domain{i}.com", 3) for i in range(NUM_DOMAINS)]
+        self.assertEqual(partitions, [domain_partition(f"domain{i}.com", 3) for i in range(NUM_DOMAINS)])
+        self.assertEqual(set(partitions), {0, 1, 2})
+
+    def test_crawl(self):
+        crawler = Crawler(self.config, True, worker_factory=FakeWorker)
+        crawler.start_processes()
+
+        # every page is crawled exactly once, by the process owning its domain, and merged into one deliverable
+        raw = crawler.global_deliverables.get_raw()
+        self.assertEqual(len(raw.url_word_map), NUM_DOMAINS * (PAGES_PER_DOMAIN - 1) + 1)
+        self.assertEqual(raw.subdomains["domain0.com"], PAGES_PER_DOMAIN)
+        self.assertEqual(sum(raw.subdomains.values()), len(raw.url_word_map))
+        self.assertEqual(
+            glob.glob(f"{GlobalDeliverableData.DELIVERABLES_DIRNAME}/partitions/*.shelve*"), [])
+
+    def test_terminated_partition_saves(self):
+        self.config.threads_count = 1
+        self.config.save_interval = 60
+        global_deliverables = GlobalDeliverableData(checkpoint_interval=3600)
+        process = multiprocessing.Process(target=crawl_partition, args=(
+            self.config, True, 0, [multiprocessing.Queue()], multiprocessing.Value("q", 1),
+            Frontier, SlowWorker, global_deliverables))
+        process.start()
+        time.sleep(1)
+        process.terminate()
+        process.join(10)
+        self.assertEqual(process.exitcode, 128 + signal.SIGTERM)
+
+        # the deliverables hold exactly the pages the frontier saved as downloaded
+        seen_urls, _ = FrontierLog(f"{self.config.save_file}-0-of-1").replay()
+        downloaded = {url for url, is_downloaded, _ in seen_urls.values() if is_downloaded}
+        self.assertGreater(len(downloaded), 0)
+        saved = global_deliverables.partition(0, 1).get_raw()
+        self.assertEqual(set(saved.url_word_map), downloaded)
+
+    def tearDown(self):
+        shutil.rmtree(GlobalDeliverableData.DELIVERABLES_DIRNAME, ignore_errors=True)
+        for file_path in glob.glob(f"{self.config.save_file}*"):
+            os.remove(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
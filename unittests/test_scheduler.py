@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+from crawler.locks import TimedLock
+from crawler.scheduler import DomainScheduler, ShardedScheduler
+
+
+class TestDomainScheduler(unittest.TestCase):
+    def test_fifo_per_domain(self):
+        s = DomainScheduler(10)
+        for url in ["https://one.com/a", "https://one.com/b", "https://two.com/a"]:
+            s.push(url)
+        self.assertEqual(len(s), 3)
+        self.assertIn("https://one.com/b", s)
+
+        self.assertEqual(s.pop(now=100), "https://one.com/a")
+        self.assertEqual(s.pop(now=100), "https://two.com/a")
+        # one.com is not ready until 10 seconds after it was accessed
+        self.assertIsNone(s.pop(now=105))
+        self.assertEqual(s.time_until_ready(now=105), 5)
+        self.assertEqual(s.pop(now=110.5), "https://one.com/b")
+        self.assertEqual(len(s), 0)
+        self.assertIsNone(s.time_until_ready())
+
+    def test_busy_domain_does_not_block(self):
+        s = DomainScheduler(10)
+        for i in range(1000):
+            s.push(f"https://big.com/{i}")
+        s.push("https://small.com")
+
+        self.assertEqual(s.pop(now=100), "https://big.com/0")
+        self.assertEqual(s.pop(now=100), "https://small.com")
+        self.assertIsNone(s.pop(now=100))
+
+    def test_returning_domain_respects_delay(self):
+        s = DomainScheduler(10)
+        s.push("https://one.com/a")
+        self.assertEqual(s.pop(now=100), "https://one.com/a")
+
+        # the domain's queue ran empty, but it was still accessed recently
+        s.push("https://one.com/b")
+        self.assertFalse(s.is_ready("one.com", now=105))
+        self.assertIsNone(s.pop(now=105))
+        self.assertEqual(s.pop(now=111), "https://one.com/b")
+
+
+class TestShardedScheduler(unittest.TestCase):
+    def test_order_across_shards(self):
+        s = ShardedScheduler.create(10, 4)
+        urls = [f"https://domain{i}.com" for i in range(20)]
+        for url in urls:
+            s.push(url)
+        self.assertEqual(len(s), 20)
+        self.assertGreater(len({s.shard_of(url[8:]) for url in urls}), 1)
+        self.assertIn("https://domain7.com", s)
+
+        # never accessed domains come out in the order they were queued, whichever shard they are in
+        self.assertEqual([s.pop(now=100) for _ in urls], urls)
+        self.assertIsNone(s.pop(now=100))
+        self.assertIn("domain7.com", s.last_accessed)
+
+        # a batch is queued one shard at a time, but each domain's URLs stay in order
+        s.push_many([(f"https://domain{i % 5}.com/{i}", f"domain{i % 5}.com") for i in range(20)])
+        self.assertEqual(len(s), 20)
+        popped = [s.pop(now=200 + i) for i in range(5)]
+        self.assertEqual(sorted(popped), [f"https://domain{i}.com/{i}" for i in range(5)])
+
+    def test_delay_per_domain(self):
+        s = ShardedScheduler.create(10, 4)
+        s.push("https://one.com/a")
+        s.push("https://one.com/b")
+        s.push("https://two.com/a")
+
+        self.assertEqual(s.pop(now=100), "https://one.com/a")
+        self.assertEqual(s.pop(now=101), "https://two.com/a")
+        self.assertFalse(s.is_ready("one.com", now=105))
+        self.assertIsNone(s.pop(now=105))
+        self.assertEqual(s.time_until_ready(now=105), 5)
+        self.assertEqual(s.pop(now=111), "https://one.com/b")
+        self.assertIsNone(s.time_until_ready())
+
+        s.push("https://three.com")
+        s.clear()
+        self.assertEqual(len(s), 0)
+        self.assertEqual(s.ready_shards(), [])
+
+
+class TestTimedLock(unittest.TestCase):
+    def test_counts_contention(self):
+        lock = TimedLock()
+        with lock:
+            pass
+        self.assertEqual((lock.acquisitions, lock.contentions), (1, 0))
+
+        lock.acquire()
+        thread = threading.Thread(target=lambda: lock.acquire() and lock.release())
+        thread.start()
+        time.sleep(0.1)
+        lock.release()
+        thread.join()
+        self.assertEqual((lock.acquisitions, lock.contentions), (3, 1))
+        self.assertGreater(lock.wait_time, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import os
+import tempfile
 import unittest
+import random
+from collections import Counter
 from bs4 import BeautifulSoup
-from deliverables.tokenization import _tokenize, get_words
+from deliverables.tokenization import TokenCounter, _tokenize, get_words, get_word_counts, word_counter
+from deliverables.vocabulary import Vocabulary, VOCABULARY, build_vocabulary
 from utils.response import Response
 
 
@@ -47,5 +52,114 @@ class TestTokenization(unittest.TestCase):
         self.assertEqual(words['1'], 0)
 
 
+class TestVocabulary(unittest.TestCase):
+    def test_vocabulary_is_current(self):
+        # vocabulary.txt has to be rebuilt whenever stopwords.txt or the tokenizer changes
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vocabulary.txt")
+            self.assertEqual(set(build_vocabulary(path)), set(VOCABULARY))
+
+    def test_loaded_on_first_lookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vocabulary.txt")
+            with open(path, "w") as f:
+                f.write("hello\nworld\n")
+            vocabulary = Vocabulary(path)
+            self.assertFalse(vocabulary.loaded)
+            self.assertIn("hello", vocabulary)
+            self.assertTrue(vocabulary.loaded)
+            self.assertNotIn("one", vocabulary)
+            self.assertEqual(len(vocabulary), 2)
+
+    def test_built_when_missing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            vocabulary = Vocabulary(os.path.join(directory, "vocabulary.txt"))
+            self.assertIn("hello", vocabulary)
+            self.assertTrue(os.path.isfile(vocabulary.path))
+
+    def test_words_filtered(self):
+        self.assertIn("hello", VOCABULARY)
+        # stopwords, single letters and words no token can match
+        for word in ["the", "a", "x", "Aaron", "hello-world"]:
+            self.assertNotIn(word, VOCABULARY)
+
+
+def reference_tokenize(text: str) -> Counter:
+    """_tokenize as it was before it used a regex, to check the new one against."""
+    tokens = Counter()
+
+    buffer = ""
+    cursor = 0
+
+    while cursor < len(text):
+        char = text[cursor]
+        if char.isalnum():
+            buffer += char.lower()
+        else:
+            if buffer:
+                tokens[buffer] += 1
+                buffer = ""
+        cursor += 1
+
+    # append anything leftover in the buffer
+    if buffer:
+        tokens[buffer] += 1
+
+    return tokens
+
+
+class TestTokenizeParity(unittest.TestCase):
+    def assertParity(self, text, chunk_sizes=(1, 2, 3, 7, 64, 1 << 16)):
+        expected = reference_tokenize(text)
+        for chunk_size in chunk_sizes:
+            self.assertEqual(_tokenize(text, chunk_size), expected, (text[:50], chunk_size))
+
+    def test_edge_cases(self):
+        for text in [
+            "", " ", "a", "A", "_", "a_b", "foo-bar baz's", "  Hello,   World!  ", "x1 2y 3.14 ½ ² ٣",
+            "ΟΔΟΣ οδός", "İstanbul ǅemal", "Straße STRASSE", "naïve café", "日本語のテキスト", "emoji 😀 ok",
+            "tab\tnew\nline", "ＦＵＬＬ width",
+        ]:
+            self.assertParity(text)
+
+    def test_pages(self):
+        for path in ["./unittests/test.html", "./unittests/test2.html", "./unittests/test_foo.html",
+                     "./unittests/test_bar.html"]:
+            with open(path, 'r') as f:
+                text = BeautifulSoup(f.read(), 'html.parser').get_text(separator=' ', strip=True)
+            self.assertParity(text)
+
+    def test_every_character(self):
+        # every character of the basic multilingual plane, both alone and inside a word
+        chars = [chr(code) for code in range(0x10000) if not 0xD800 <= code < 0xE000]
+        self.assertParity(" ".join(chars), chunk_sizes=(5, 1 << 16))
+        self.assertParity(" ".join(f"a{char}Z" for char in chars), chunk_sizes=(5, 1 << 16))
+
+    def test_random_text(self):
+        rng = random.Random(0)
+        alphabet = "aZ9_ -.,'\n" + "".join(chr(rng.randrange(0x80, 0x3000)) for _ in range(200))
+        for _ in range(200):
+            self.assertParity("".join(rng.choice(alphabet) for _ in range(rng.randrange(200))))
+
+    def test_written_in_pieces(self):
+        rng = random.Random(1)
+        alphabet = "aZ9_ -.,'\nΣİ" + "".join(chr(rng.randrange(0x80, 0x3000)) for _ in range(50))
+        for _ in range(200):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randrange(300)))
+            cuts = sorted(rng.randrange(len(text) + 1) for _ in range(rng.randrange(10)))
+            counter = TokenCounter(chunk_size=rng.choice([1, 3, 64]))
+            for start, end in zip([0] + cuts, cuts + [len(text)]):
+                counter.write(text[start:end])
+            self.assertEqual(counter.close(), reference_tokenize(text), text)
+
+    def test_word_counter(self):
+        counter = word_counter()
+        for piece in ["one tw", "o two hel", "lo wor", "ld qwerty uiop a 1"]:
+            counter.write(piece)
+        self.assertEqual(counter.close(), get_word_counts("one two two hello world qwerty uiop a 1").ids)
+        counter.clear()
+        self.assertEqual(counter.close(), {})
+
+
 if __name__ == '__main__':
     unittest.main()
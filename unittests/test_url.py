@@ -0,0 +1,78 @@
+import glob
+import os
+import unittest
+import pickle
+from configparser import ConfigParser
+
+from crawler import Frontier
+from utils import get_urlhash, get_domain_name, normalize
+from utils.config import Config
+from utils.url import URL
+
+
+class TestURL(unittest.TestCase):
+    def test_record(self):
+        url = URL("https://www.ics.uci.edu/about/visit/")
+        self.assertEqual(url, "https://www.ics.uci.edu/about/visit")
+        self.assertEqual(url, normalize("https://www.ics.uci.edu/about/visit/"))
+        self.assertEqual(url.domain, get_domain_name(url))
+        self.assertEqual(url.urlhash, get_urlhash(url))
+        self.assertEqual(len(url.digest), 32)
+        self.assertIs(URL(url), url)
+        # usable anywhere a string is
+        self.assertEqual({url: 1}["https://www.ics.uci.edu/about/visit"], 1)
+        self.assertEqual(f"{url}?a=b", "https://www.ics.uci.edu/about/visit?a=b")
+
+    def test_immutable(self):
+        url = URL("https://www.ics.uci.edu/a")
+        with self.assertRaises(AttributeError):
+            url.domain = "cs.uci.edu"
+        with self.assertRaises(AttributeError):
+            del url.digest
+        with self.assertRaises(AttributeError):
+            url.other = 1
+
+    def test_pickle(self):
+        url = URL("https://www.ics.uci.edu/a/b")
+        copy = pickle.loads(pickle.dumps(url))
+        self.assertIsInstance(copy, URL)
+        self.assertEqual(copy, url)
+        self.assertEqual((copy.domain, copy.digest), (url.domain, url.digest))
+
+    def test_frontier_hands_out_records(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        config = Config(cparser)
+        config.seed_urls = ["https://www.ics.uci.edu/"]
+        frontier = Frontier(config, True)
+        url = frontier.get_tbd_url()
+        self.assertIsInstance(url, URL)
+        self.assertEqual(url, "https://www.ics.uci.edu")
+        frontier.add_urls([URL("https://www.cs.uci.edu/a"), "https://www.cs.uci.edu/a/"])
+        self.assertEqual(len(frontier._frontier), 1)
+        frontier.mark_url_complete(url)
+        self.assertTrue(frontier.url_downloaded(url.urlhash))
+
+    def test_resumed_frontier_hands_out_records(self):
+        cparser = ConfigParser()
+        cparser.read("./unittests/test.ini")
+        config = Config(cparser)
+        config.seed_urls = ["https://www.ics.uci.edu/"]
+        os.environ["TESTING"] = "false"
+        try:
+            Frontier(config, True).sync()
+            frontier = Frontier(config, False)
+        finally:
+            os.environ["TESTING"] = "true"
+            for file_path in glob.glob(f"{config.save_file}*"):
+                os.remove(file_path)
+
+        # queued as plain strings on load, and only made into records as they are handed out
+        queued = [url for shard in frontier._frontier.shards for queue in shard._queues.values() for url in queue]
+        self.assertEqual([type(url) for url in queued], [str])
+        url = frontier.get_tbd_url()
+        self.assertIsInstance(url, URL)
+        self.assertEqual(url, "https://www.ics.uci.edu")
+
+if __name__ == '__main__':
+    unittest.main()
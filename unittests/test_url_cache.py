@@ -0,0 +1,75 @@
+import unittest
+from threading import Thread
+from urllib.parse import urlparse
+
+from scraper import is_valid
+from utils import url_cache, get_domain_name
+from utils.url_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = LRUCache(2)
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return key.upper()
+
+        self.assertEqual(cache.get("a", compute), "A")
+        self.assertEqual(cache.get("a", compute), "A")
+        self.assertEqual(cache.get("b", compute), "B")
+        self.assertEqual(computed, ["a", "b"])
+        self.assertEqual(cache.stats(), {"size": 2, "maxsize": 2, "hits": 1, "misses": 2})
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.get("a", str.upper)
+        cache.get("b", str.upper)
+        # using a makes b the least recently used
+        cache.get("a", str.upper)
+        cache.get("c", str.upper)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.misses, 3)
+        cache.get("a", str.upper)
+        self.assertEqual(cache.hits, 2)
+        cache.get("b", str.upper)
+        self.assertEqual(cache.misses, 4)
+
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        cache.resize(0)
+        cache.get("a", str.upper)
+        self.assertEqual(len(cache), 0)
+
+    def test_threads(self):
+        cache = LRUCache(50)
+        keys = [str(i) for i in range(100)]
+
+        def use():
+            for _ in range(20):
+                for key in keys:
+                    self.assertEqual(cache.get(key, str.upper), key)
+
+        threads = [Thread(target=use) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 50)
+        self.assertEqual(cache.hits + cache.misses, 4 * 20 * len(keys))
+
+    def test_shared_caches(self):
+        url = "https://www.ics.uci.edu/url_cache_test"
+        self.assertIs(url_cache.parse_url(url), url_cache.parse_url(url))
+        self.assertEqual(url_cache.parse_url(url), urlparse(url))
+        self.assertEqual(get_domain_name(url), "ics.uci.edu")
+
+        hits = url_cache.VERDICTS.hits
+        self.assertTrue(is_valid(url))
+        self.assertTrue(is_valid(url))
+        self.assertEqual(url_cache.VERDICTS.hits, hits + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import itertools
+from urllib.parse import urlparse
+
+from scraper import is_valid
+from validate import VALID_SCHEMES, VALID_DOMAINS, INVALID_DOMAINS, INVALID_PATHS, INVALID_FRAGMENTS, INVALID_QUERIES, INVALID_PATH_SEGMENTS, FILE_EXT_PATTERN, ANY_NUMBER_PATTERN, CALENDAR_TRAP_PATTERN
+from utils.parsing import parse_html
+from validate import URL_VALIDATOR
+
+
+def reference_is_valid(url):
+    """is_valid as it was before it was compiled into URLValidator, to check the validator against."""
+    try:
+        parsed = urlparse(url)
+
+        domain = parsed.netloc.lower()
+        path = parsed.path.lower()
+
+        if not parsed.scheme in VALID_SCHEMES:
+            return False
+
+        if FILE_EXT_PATTERN.match(path):
+            return False
+
+        # caused frequently by sli.ics.uci.edu; typically has too many redirections
+        # bad queries typically lead to a 4XX error, which glean no information anyway
+        if any((invalid_query in parsed.query) for invalid_query in INVALID_QUERIES):
+            return False
+
+        # filter only domain specific; avoid stepping out of boundaries
+        if not (
+            any(
+                (domain.endswith(f".{valid_domain}")
+                 or domain == valid_domain)
+                for valid_domain in VALID_DOMAINS
+            ) or (
+                domain == "today.uci.edu"
+                and path.startswith("/department/information_computer_sciences/"))
+        ):
+            return False
+
+        # some websites have a robots.txt that explicitly state Disallow: /
+        # these sites return a 608 from cache server if attempted to be downloaded
+        if domain in INVALID_DOMAINS:
+            return False
+
+        for _domain, invalid_paths in INVALID_PATHS.items():
+            if (domain == _domain or domain == f"www.{_domain}") \
+                    and any(path.startswith(invalid_path) for invalid_path in invalid_paths):
+                return False
+
+        # avoid paths that include things like "files/pdf" (one specific example)
+        # https://www.informatics.uci.edu/files/pdf/InformaticsBrochure-March2018
+        if any([path_segment in parsed.path for path_segment in INVALID_PATH_SEGMENTS]):
+            return False
+
+        # avoid crawler traps (all)
+        path_parts = [part for part in parsed.path.split("/") if part != '']
+        query_parts = parsed.query.split("&")
+
+        # avoid calendar traps by avoiding paths that look like they contain a calendar
+        # anything that looks like a calendar is probably evil
+        # make an exception in which domain/YYYY/MM/DD/article_name
+        if (
+            any(
+                CALENDAR_TRAP_PATTERN.search(path_part)
+                for path_part in [*path_parts, *query_parts, parsed.path]
+            ) and
+            not (len(path_parts) > 3 and
+                 ANY_NUMBER_PATTERN.match(path_parts[-4]) and len(path_parts[-4]) == 4 and
+                 ANY_NUMBER_PATTERN.match(path_parts[-3]) and len(path_parts[-3]) == 2 and
+                 ANY_NUMBER_PATTERN.match(path_parts[-2]) and len(path_parts[-2]) == 2 and
+                 len(path_parts[-1]) > 0)
+        ):
+            return False
+
+        # avoid invalid fragments; obsolete since we defragment all links
+        if any((invalid_fragment in parsed.fragment) for invalid_fragment in INVALID_FRAGMENTS):
+            return False
+
+        # # avoid /page/X issues; if X is greater than 500, something is up...
+        # ensure the path /page/X can exist and is being followed
+        if len(path_parts) >= 2 \
+                and path_parts[-2] == "page" \
+                and ANY_NUMBER_PATTERN.search(path_parts[-1]) \
+                and int(path_parts[-1]) > 500:
+            return False
+
+        return True
+
+    except TypeError:
+        raise
+
+
+HOSTS = [
+    *VALID_DOMAINS, *(f"www.{domain}" for domain in VALID_DOMAINS), *INVALID_DOMAINS, *INVALID_PATHS,
+    *(f"www.{domain}" for domain in INVALID_PATHS), "WWW.ICS.UCI.EDU", "today.uci.edu", "uci.edu", "ics.uci.edu.",
+    "ics.uci.edu:8080", "xics.uci.edu", "a..ics.uci.edu", "ics.uci.edu.evil.com", "edu", "",
+]
+PATHS = [
+    "", "/", "/index.html", "/style.css", "/FILE.PDF", "/a.pdf/b", "/people", "/People/x", "/happening/news",
+    "/wp-admin/admin-ajax.php", "/research", "/EMWS09/a", "/emws09", "/cgi-bin/x", "/users/sign_in", "/-/tree",
+    "/files/pdf/x", "/seminar/Nanda", "/doku.php/accounts:x", "/department/information_computer_sciences/",
+    "/department/information_computer_sciences/a.jpg", "/department/engineering/", "/2024-11-08",
+    "/events/2021-03", "/news/2019/05/20/article", "/news/2019/05/20/", "/4/24/25", "/a1b/2c3",
+    "/page/3", "/page/501", "/blog/page/1000/", "/page//777", "/page", "/x;params.css", "/x;y",
+]
+QUERIES = [
+    "", "action=login", "action=view", "share=twitter", "q=1&outlook-ical=1", "id=12&b=3", "id=12&day=3",
+    "eventDate=2025-04-20", "d=2025-04&x", "rev=2", "a=b&c=d", "REV=1",
+]
+FRAGMENTS = ["", "comment-3103", "respond", "top"]
+
+
+class TestValidator(unittest.TestCase):
+    def assertParity(self, url):
+        self.assertEqual(is_valid(url), reference_is_valid(url), url)
+
+    def test_parity(self):
+        for scheme, host, path in itertools.product(["https", "http", "ftp"], HOSTS, PATHS):
+            for query, fragment in [*((query, "") for query in QUERIES), *(("", fragment) for fragment in FRAGMENTS)]:
+                url = f"{scheme}://{host}{path}"
+                if query:
+                    url += f"?{query}"
+                if fragment:
+                    url += f"#{fragment}"
+                self.assertParity(url)
+
+    def test_split(self):
+        urls = [
+            "https://www.ics.uci.edu/a/b?c=d#e", "https://x", "https://x/", "https://x?y#z?w", "https://x#a?b",
+            "https://x//a", "https:///a", "https://x/?", "https://x/#", "HTTPS://X/y", "https:x", " https://x/a",
+            "https://x/a;b?c", "https://x/a\n/b", "https://é.com/", "https://[::1]/x", "https://x/[a]", "ftp://x/a",
+            "https://user:pw@x:8080/a",
+        ]
+        for url in urls:
+            parsed = urlparse(url)
+            self.assertEqual(
+                URL_VALIDATOR.split(url), (parsed.scheme, parsed.netloc, parsed.path, parsed.query, parsed.fragment), url)
+
+    def test_parity_with_page_links(self):
+        for path in ["./unittests/test.html", "./unittests/test2.html"]:
+            with open(path, 'rb') as f:
+                page = parse_html(f.read(), "https://www.ics.uci.edu/dir/")
+            for url in page.links:
+                self.assertParity(url)
+
+    def test_same_errors(self):
+        # a page number with letters in it is not a number
+        url = "https://www.ics.uci.edu/page/3a"
+        with self.assertRaises(ValueError):
+            reference_is_valid(url)
+        with self.assertRaises(ValueError):
+            is_valid(url)
+
+
+if __name__ == '__main__':
+    unittest.main()
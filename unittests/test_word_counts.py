@@ -0,0 +1,83 @@
+import pickle
+import random
+import shelve
+import tempfile
+import os
+import unittest
+from collections import Counter
+from unittest import mock
+
+from deliverables import GlobalDeliverableData
+from deliverables.tokenization import get_word_counts, get_words
+from deliverables.vocabulary import VOCABULARY, Vocabulary
+from deliverables.word_counts import WordCounts, WordTotals
+
+
+class TestWordCounts(unittest.TestCase):
+    def test_from_words(self):
+        counts = WordCounts.from_words(["hello", "world", "hello", "qwerty"])
+        self.assertEqual(counts.ids, Counter({VOCABULARY.ids["hello"]: 2, VOCABULARY.ids["world"]: 1}))
+        self.assertEqual(counts.other, Counter(qwerty=1))
+        self.assertEqual(counts["hello"], 2)
+        self.assertEqual(counts["qwerty"], 1)
+        self.assertEqual(counts["absent"], 0)
+        self.assertEqual(counts.total(), 4)
+        self.assertEqual(counts.to_counter(), Counter(hello=2, world=1, qwerty=1))
+
+    def test_get_word_counts(self):
+        text = "one two two hello world qwerty uiop a 1 The the"
+        self.assertEqual(get_word_counts(text).to_counter(), get_words(text))
+        self.assertEqual(get_word_counts(text).other, Counter())
+
+    def test_totals(self):
+        rng = random.Random(0)
+        words = list(VOCABULARY.words[:500]) + ["qwerty", "uiop"]
+        expected = Counter()
+        totals = WordTotals()
+        for _ in range(50):
+            page = Counter(rng.choice(words) for _ in range(rng.randrange(100)))
+            expected += page
+            totals.add(WordCounts.from_words(page))
+
+        self.assertEqual(totals.to_counter(), expected)
+        self.assertEqual(totals.total(), expected.total())
+        self.assertEqual(totals["qwerty"], expected["qwerty"])
+        self.assertEqual(totals[words[0]], expected[words[0]])
+        self.assertEqual(
+            [count for _, count in totals.most_common(50)], [count for _, count in expected.most_common(50)])
+        for word, count in totals.most_common(50):
+            self.assertEqual(expected[word], count)
+
+        merged = WordTotals()
+        merged.add(totals)
+        merged.add(totals)
+        self.assertEqual(merged.to_counter(), expected + expected)
+
+    def test_pickle(self):
+        totals = WordTotals()
+        totals.add(WordCounts.from_words(["hello", "hello", "qwerty"]))
+        self.assertEqual(pickle.loads(pickle.dumps(totals)).to_counter(), Counter(hello=2, qwerty=1))
+
+        # loaded after the vocabulary was rebuilt, with hello moved to another ID and qwerty added to it
+        pickled = pickle.dumps(totals)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vocabulary.txt")
+            with open(path, "w") as f:
+                f.write("aardvark\nqwerty\nhello\n")
+            with mock.patch("deliverables.word_counts.VOCABULARY", Vocabulary(path)):
+                loaded = pickle.loads(pickled)
+                self.assertEqual(list(loaded.counts), [0, 1, 2])
+                self.assertEqual(loaded.other, Counter())
+                self.assertEqual(loaded.to_counter(), Counter(hello=2, qwerty=1))
+
+    def test_counter_shelf(self):
+        # a shelf saved before words were counted by ID
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "deliverables.shelve")
+            with shelve.open(path) as raw_dev_data:
+                raw_dev_data["words"] = Counter(hello=3, qwerty=1)
+            self.assertEqual(GlobalDeliverableData(path).get_raw().words.to_counter(), Counter(hello=3, qwerty=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
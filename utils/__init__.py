@@ -1,7 +1,10 @@
 import os
 import logging
 from hashlib import sha256
-from urllib.parse import urlparse, urlunparse
+from urllib.parse import urlunparse
+
+from utils.url_cache import parse_url, DIGESTS
+from utils.canonical import canonical_parts
 
 
 def get_logger(name, filename=None):
@@ -26,12 +29,19 @@ def get_logger(name, filename=None):
     return logger
 
 
-def get_urlhash(url):
-    parsed = urlparse(url)
+def _urldigest(url):
+    _, host, path, query = canonical_parts(url)
     # everything other than scheme.
-    return sha256(
-        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+    return sha256(f"{host}/{path}/{query}".encode("utf-8")).digest()
+
+
+def get_urldigest(url):
+    """Binary sha256 of the URL's canonical form (see utils.canonical), so URLs written differently hash the same."""
+    return DIGESTS.get(url, _urldigest)
+
+
+def get_urlhash(url):
+    return get_urldigest(url).hex()
 
 
 def normalize(url):
@@ -43,7 +53,7 @@ def normalize(url):
 
 
 def get_domain_name(url: str):
-    parsed = urlparse(url)
+    parsed = parse_url(url)
     if not parsed.netloc:
         return url.replace("www.", "", 1)
     else:
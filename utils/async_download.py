@@ -0,0 +1,24 @@
+import aiohttp
+import cbor
+
+from utils.response import Response
+
+
+async def download_async(url, config, session: aiohttp.ClientSession, logger=None):
+    """download(), on an asyncio event loop. Many downloads can share the session's pooled connections at once."""
+    host, port = config.cache_server
+    async with session.get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")]) as resp:
+        content = await resp.read()
+        status = resp.status
+    try:
+        if resp.ok and content:
+            return Response(cbor.loads(content))
+    except (EOFError, ValueError) as e:
+        pass
+    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    return Response({
+        "error": f"Spacetime Response error {resp} with url {url}.",
+        "status": status,
+        "url": url})
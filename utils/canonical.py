@@ -0,0 +1,149 @@
+"""
+Canonical form of a URL, so that URLs written differently but pointing to the same page are crawled once.
+The frontier identifies URLs by the hash of their canonical form (see utils.get_urlhash), while still downloading
+them as they were written.
+"""
+
+import re
+import string
+from urllib.parse import urlsplit
+
+from utils import url_cache
+
+
+# query parameters that never change the page, such as trackers; a trailing * matches any parameter starting with it
+IGNORED_PARAMS = ("utm_*", "fbclid", "gclid", "replytocom")
+
+# bumped whenever the canonical form changes, so saves hashed with the old form are rehashed (see fingerprint())
+VERSION = 1
+
+# the digest of everything but the scheme is kept, so http and https are the same page, and so is either default port
+DEFAULT_PORTS = {"80", "443"}
+
+_UNRESERVED = set(string.ascii_letters + string.digits + "-._~")
+_ESCAPE_PATTERN = re.compile(r"%([0-9A-Fa-f]{2})")
+
+# set by configure()
+_ignored_names = set()
+_ignored_prefixes = ()
+_fold_www = False
+_fingerprint = ""
+
+
+def configure(ignored_params=IGNORED_PARAMS, fold_www=False):
+    """Set the query parameters to drop, and whether a host's leading www. is dropped too, for this process."""
+    global _ignored_names, _ignored_prefixes, _fold_www, _fingerprint
+    params = [param.strip().lower() for param in ignored_params if param.strip()]
+    _ignored_names = {param for param in params if not param.endswith("*")}
+    _ignored_prefixes = tuple(param[:-1] for param in params if param.endswith("*"))
+    _fold_www = fold_www
+    _fingerprint = f"v{VERSION};fold_www={int(bool(fold_www))};ignored={','.join(sorted(set(params)))}"
+    url_cache.DIGESTS.clear()
+
+
+def fingerprint():
+    """
+    The canonical form's version and settings, as a single line. URL hashes made under the same fingerprint are
+    comparable, so saves record it and only rehash their URLs when it changed.
+    """
+    return _fingerprint
+
+
+configure()
+
+
+def _unescape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else f"%{match.group(1).upper()}"
+
+
+def normalize_escapes(text):
+    """Decode escaped characters that never need escaping, and write every other escape in upper case."""
+    if "%" not in text:
+        return text
+    return _ESCAPE_PATTERN.sub(_unescape, text)
+
+
+def remove_dot_segments(path):
+    """Resolve the . and .. segments of a path, as in RFC 3986 5.2.4."""
+    if "." not in path:
+        return path
+    segments = []
+    for segment in path.split("/"):
+        if segment == "..":
+            # never above the root, which is the empty segment before the path's leading /
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if path.endswith(("/.", "/..")):
+        segments.append("")
+    return "/".join(segments)
+
+
+def _canonical_host(netloc):
+    userinfo, at, hostport = netloc.rpartition("@")
+    if hostport.startswith("["):
+        host, _, port = hostport.partition("]")
+        host += "]"
+        port = port[1:]
+    else:
+        host, _, port = hostport.partition(":")
+    host = host.lower()
+    if _fold_www and host.startswith("www."):
+        host = host[4:]
+    if port and port not in DEFAULT_PORTS:
+        host = f"{host}:{port}"
+    return f"{userinfo}{at}{host}"
+
+
+def _is_ignored(param):
+    name = param.split("=", 1)[0].lower()
+    return name in _ignored_names or name.startswith(_ignored_prefixes)
+
+
+def canonical_parts(url):
+    """The canonical (scheme, host, path, query) of a URL. The fragment is dropped."""
+    parsed = urlsplit(url)
+    path = remove_dot_segments(normalize_escapes(parsed.path)).rstrip("/")
+    query = ""
+    if parsed.query:
+        params = [normalize_escapes(param) for param in parsed.query.split("&") if param]
+        query = "&".join(sorted(param for param in params if not _is_ignored(param)))
+    return parsed.scheme, _canonical_host(parsed.netloc), path, query
+
+
+def canonicalize(url):
+    """
+    The canonical form of a URL: scheme and host in lower case, without a default port (or a leading www., if
+    folded), dot segments resolved, escapes normalized, no trailing slash, query parameters sorted without ignored
+    ones, and no fragment.
+    """
+    scheme, host, path, query = canonical_parts(url)
+    canonical = f"{scheme}://{host}{path}" if scheme or host else path
+    return f"{canonical}?{query}" if query else canonical
+
+
+def duplicate_report(urls):
+    """
+    How many fetches canonicalization would have avoided, given the (url, downloaded) pairs of a frontier save.
+    A URL is a duplicate if another URL of the save has the same canonical form, and it would have been avoided if
+    it was downloaded while another URL of its canonical form was too.
+    """
+    groups = {}
+    for url, downloaded in urls:
+        group = groups.setdefault(canonicalize(url), [0, 0])
+        group[0] += 1
+        group[1] += bool(downloaded)
+    seen = sum(group[0] for group in groups.values())
+    downloaded = sum(group[1] for group in groups.values())
+    return {
+        "urls": seen,
+        "canonical_urls": len(groups),
+        "duplicate_urls": seen - len(groups),
+        "downloaded": downloaded,
+        "avoidable_fetches": sum(max(group[1] - 1, 0) for group in groups.values()),
+        "largest_groups": sorted(
+            ((canonical, group[0]) for canonical, group in groups.items() if group[0] > 1),
+            key=lambda item: -item[1])[:10],
+    }
@@ -1,5 +1,8 @@
+import os
 import re
 
+from utils import url_cache, canonical
+
 
 class Config(object):
     def __init__(self, config):
@@ -8,7 +11,44 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        # number of crawler processes, each running threads_count workers over its own partition of the domains
+        self.processes = int(config["LOCAL PROPERTIES"].get("PROCESSES", 1))
+        # what downloads pages: "threads" (THREADCOUNT Worker threads), "async" (one asyncio event loop)
+        # or "pipeline" (fetcher threads, parse processes and an indexer, connected by queues)
+        self.engine = config["LOCAL PROPERTIES"].get("ENGINE", "threads").strip().lower()
+        assert self.engine in {"threads", "async", "pipeline"}, "ENGINE should be either threads, async or pipeline"
+        # processes pages are parsed in, and the most pages waiting between two of the pipeline's stages;
+        # the other engines parse in the downloading thread unless PARSEPROCESSES is set
+        default_parse_processes = (os.cpu_count() or 1) if self.engine == "pipeline" else 0
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSEPROCESSES", default_parse_processes))
+        assert self.parse_processes >= 0, "PARSEPROCESSES should not be negative"
+        assert self.engine != "pipeline" or self.parse_processes > 0, "The pipeline ENGINE needs PARSEPROCESSES of at least 1"
+        self.pipeline_queue_size = int(config["LOCAL PROPERTIES"].get("PIPELINEQUEUE", 64))
+        # most downloads the async engine keeps in flight at once
+        self.async_requests = int(config["LOCAL PROPERTIES"].get("ASYNCREQUESTS", 100))
+        # seconds before connecting to, or downloading from, the cache server is given up on
+        self.connect_timeout = float(config["LOCAL PROPERTIES"].get("CONNECTTIMEOUT", 10))
+        self.download_timeout = float(config["LOCAL PROPERTIES"].get("DOWNLOADTIMEOUT", 60))
+        # most connections to the cache server the workers of a process keep open
+        self.pool_size = int(config["LOCAL PROPERTIES"].get("POOLSIZE", self.threads_count))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        # how often (in seconds or in number of changed URLs) the frontier writes its seen index to the save file
+        self.save_interval = float(config["LOCAL PROPERTIES"].get("SAVEINTERVAL", 5))
+        self.save_batch_size = int(config["LOCAL PROPERTIES"].get("SAVEBATCH", 500))
+        # how often (in seconds or in number of pages) the deliverables are checkpointed to their shelf
+        self.deliverables_interval = float(config["LOCAL PROPERTIES"].get("DELIVERABLESINTERVAL", 30))
+        self.deliverables_batch = int(config["LOCAL PROPERTIES"].get("DELIVERABLESBATCH", 1000))
+        # which frontier stores the crawl's progress: "log" (Frontier) or "sqlite" (SqliteFrontier)
+        self.frontier = config["LOCAL PROPERTIES"].get("FRONTIER", "log").strip().lower()
+        assert self.frontier in {"log", "sqlite"}, "FRONTIER should be either log or sqlite"
+        # number of lock-striped shards the frontier's domains are spread over
+        self.frontier_shards = int(config["LOCAL PROPERTIES"].get("FRONTIERSHARDS", 16))
+        # URLs whose parsed form and is_valid verdict each process keeps cached
+        self.url_cache_size = int(config["LOCAL PROPERTIES"].get("URLCACHESIZE", url_cache.URL_CACHE_SIZE))
+        # query parameters dropped from URLs before they are hashed, and whether a leading www. is dropped too
+        self.ignored_params = config["LOCAL PROPERTIES"].get(
+            "IGNOREDPARAMS", ",".join(canonical.IGNORED_PARAMS)).split(",")
+        self.fold_www = config["LOCAL PROPERTIES"].getboolean("FOLDWWW", False)
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
@@ -16,4 +56,11 @@ class Config(object):
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
 
-        self.cache_server = None
\ No newline at end of file
+        self.cache_server = None
+    def apply(self):
+        """
+        Apply the settings that live in module state rather than being passed around, in the calling process.
+        Called by the crawler, and by every process that parses pages for it.
+        """
+        url_cache.resize(self.url_cache_size)
+        canonical.configure(self.ignored_params, self.fold_www)
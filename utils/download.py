@@ -1,14 +1,46 @@
 import requests
 import cbor
 import time
+import threading
+from requests.adapters import HTTPAdapter
 
 from utils.response import Response
 
+
+# one session for every worker thread of a process, so connections to the cache server are kept alive and reused
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session(config):
+    """
+    The session shared by every worker, created on first use.
+    Its connection pool keeps up to POOLSIZE connections to the cache server open between downloads, so most downloads
+    skip connection setup. A worker wanting a connection while all of them are busy waits for one to be returned.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(
+                pool_connections=1, pool_maxsize=config.pool_size, pool_block=True))
+            _SESSION = session
+        return _SESSION
+
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    try:
+        resp = get_session(config).get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+            timeout=(config.connect_timeout, config.download_timeout))
+    except requests.RequestException as e:
+        logger.error(f"Spacetime request error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime request error {e!r} with url {url}.",
+            "status": None,
+            "url": url})
     try:
         if resp and resp.content:
             return Response(cbor.loads(resp.content))
@@ -18,4 +50,4 @@ def download(url, config, logger=None):
     return Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
-        "url": url})
\ No newline at end of file
+        "url": url})
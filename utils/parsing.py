@@ -0,0 +1,290 @@
+"""
+Turns a page's HTML into everything the crawler uses from it, in a single pass: the href of every anchor, the
+absolute links they point to, and the page's visible text. Three backends produce the same ParsedPage:
+- lxml, the fastest, when it is installed,
+- html.parser, Python's HTMLParser,
+- bs4, BeautifulSoup with html.parser, the slowest, kept as the fallback for pages the others fail on.
+lxml and html.parser stream through the page a chunk at a time without building a tree, so the text of a page can be
+handed on as it is parsed rather than kept whole.
+"""
+
+import codecs
+import functools
+from dataclasses import dataclass, field
+from email.message import Message
+from html.parser import HTMLParser
+from urllib.parse import urldefrag, urljoin
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+
+from utils import get_logger
+
+try:
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+
+log = get_logger("PARSING", "Worker")
+
+# elements whose text is not shown on the page; bs4's get_text() skips them too
+HIDDEN_ELEMENTS = {"script", "style", "template"}
+
+# characters (or bytes) of a page fed to its parser at once
+FEED_SIZE = 1 << 16
+
+
+@dataclass
+class ParsedPage:
+    """
+    The hrefs of a page's anchors, in document order, the unique links they point to, made absolute and without
+    fragment, in the order they first appear, and the page's visible text, joined by single spaces.
+    """
+    hrefs: list = field(default_factory=list)
+    text: str = ""
+    links: list = field(default_factory=list)
+
+
+class _TextBuffer(list):
+    """The text sink of parse_html() when it is not given one, keeping the pieces of text to join into the page."""
+    write = list.append
+
+
+class _TextWriter(object):
+    """
+    Writes a page's visible text to a text sink as the page is parsed: each string stripped, and separated from the
+    previous one by a single space, as get_text(separator=" ", strip=True) joins them. The parser may give it a string
+    in several pieces, and calls end() where a string ends.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._written = False
+        self._in_string = False
+        # whitespace after what was written of the current string, only written if more of the string follows it
+        self._whitespace = ""
+
+    def data(self, text):
+        if not self._in_string:
+            text = text.lstrip()
+            if not text:
+                return
+            self._whitespace = " " if self._written else ""
+            self._written = self._in_string = True
+        stripped = text.rstrip()
+        if stripped:
+            self.sink.write(self._whitespace + stripped)
+            self._whitespace = text[len(stripped):]
+        else:
+            self._whitespace += text
+
+    def end(self):
+        self._in_string = False
+
+
+def http_charset(content_type):
+    """The charset a Content-Type header declares, such as "utf-8" for "text/html; charset=UTF-8", or None."""
+    message = Message()
+    message["Content-Type"] = content_type or ""
+    return message.get_content_charset()
+
+
+def _known_encoding(name):
+    """The codec to decode a declared encoding with, or None if Python does not know it."""
+    try:
+        encoding = codecs.lookup(name).name
+    except (LookupError, TypeError, ValueError):
+        return None
+    # as browsers do: Windows-1252 is a superset of both, and a declared UTF-16 without a byte order mark is not
+    if encoding in {"latin-1", "iso8859-1", "ascii"}:
+        return "cp1252"
+    if encoding.startswith("utf-16"):
+        return "utf-8"
+    return encoding
+
+
+def sniff_encoding(content, http_encoding=None):
+    """
+    The encoding a page in bytes declares, by its byte order mark, the charset it was served with, or a <meta> charset
+    near its start, in that order, as browsers do. Returns the page without its byte order mark, and the encoding,
+    which is None if the page declares none Python knows.
+    """
+    content, bom_encoding = EncodingDetector.strip_byte_order_mark(content)
+    if bom_encoding is not None:
+        return content, bom_encoding
+    for declared in [http_encoding, EncodingDetector.find_declared_encoding(content, is_html=True)]:
+        encoding = declared and _known_encoding(declared)
+        if encoding:
+            return content, encoding
+    return content, None
+
+
+def _chunks(content, encoding, errors="strict"):
+    """The page in chunks of FEED_SIZE, decoded with the given encoding as it goes if it is bytes."""
+    if isinstance(content, str):
+        for start in range(0, len(content), FEED_SIZE):
+            yield content[start:start + FEED_SIZE]
+        return
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    view = memoryview(content)
+    for start in range(0, len(view), FEED_SIZE):
+        yield decoder.decode(view[start:start + FEED_SIZE])
+    yield decoder.decode(b"", final=True)
+
+
+def _decoding(parse):
+    """
+    Decorates a backend parsing the chunks of a page, so it parses the page in the encoding it declares (see
+    sniff_encoding()). A page declaring none is parsed as UTF-8, or, if it turns out not to be, parsed again as
+    Windows-1252, which most pages that are not UTF-8 are.
+    """
+    @functools.wraps(parse)
+    def backend(content, sink, http_encoding=None) -> ParsedPage:
+        encoding = None
+        if not isinstance(content, str):
+            content, encoding = sniff_encoding(content, http_encoding)
+        if encoding is not None:
+            # bytes that are invalid in the declared encoding are replaced, as browsers do
+            return parse(_chunks(content, encoding, "replace"), sink)
+        try:
+            return parse(_chunks(content, "utf-8"), sink)
+        except UnicodeDecodeError:
+            sink.clear()
+            return parse(_chunks(content, "cp1252", "replace"), sink)
+    return backend
+
+
+class _StreamingExtractor(HTMLParser):
+    def __init__(self, writer):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+        self.writer = writer
+        self._hidden = 0
+
+    def handle_starttag(self, tag, attrs):
+        self.writer.end()
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href":
+                    # an href without a value counts as empty, as it does to bs4
+                    self.hrefs.append(value or "")
+                    break
+        elif tag in HIDDEN_ELEMENTS:
+            self._hidden += 1
+
+    def handle_endtag(self, tag):
+        self.writer.end()
+        if tag in HIDDEN_ELEMENTS and self._hidden > 0:
+            self._hidden -= 1
+
+    def handle_data(self, data):
+        if not self._hidden:
+            self.writer.data(data)
+
+    def handle_comment(self, data):
+        self.writer.end()
+
+    handle_decl = handle_pi = handle_unknown_decl = handle_comment
+
+
+@_decoding
+def parse_streaming(chunks, sink) -> ParsedPage:
+    extractor = _StreamingExtractor(_TextWriter(sink))
+    for chunk in chunks:
+        extractor.feed(chunk)
+    extractor.close()
+    return ParsedPage(extractor.hrefs)
+
+
+class _LxmlTarget(object):
+    """Receives the events of lxml's parser as it parses, so no tree of the page is built."""
+
+    def __init__(self, writer):
+        self.hrefs = []
+        self.writer = writer
+        self._hidden = 0
+
+    def start(self, tag, attrib):
+        self.writer.end()
+        if tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag in HIDDEN_ELEMENTS:
+            self._hidden += 1
+
+    def end(self, tag):
+        self.writer.end()
+        if tag in HIDDEN_ELEMENTS and self._hidden > 0:
+            self._hidden -= 1
+
+    def data(self, data):
+        if not self._hidden:
+            self.writer.data(data)
+
+    def comment(self, text):
+        self.writer.end()
+
+    def pi(self, target, data=None):
+        self.writer.end()
+
+    def close(self):
+        return ParsedPage(self.hrefs)
+
+
+@_decoding
+def parse_lxml(chunks, sink) -> ParsedPage:
+    target = _LxmlTarget(_TextWriter(sink))
+    parser = lxml.etree.HTMLParser(target=target)
+    for chunk in chunks:
+        parser.feed(chunk)
+    try:
+        return parser.close()
+    except lxml.etree.XMLSyntaxError:
+        # lxml refuses documents without any elements, such as an empty page
+        return target.close()
+
+
+def parse_bs4(content, sink, http_encoding=None) -> ParsedPage:
+    # bs4 sniffs the page's encoding itself, but cannot know the charset it was served with
+    soup = BeautifulSoup(content, "html.parser",
+                         from_encoding=None if isinstance(content, str) else http_encoding)
+    hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+    writer = _TextWriter(sink)
+    for string in soup.stripped_strings:
+        writer.data(string)
+        writer.end()
+    return ParsedPage(hrefs)
+
+
+BACKENDS = {"html.parser": parse_streaming, "bs4": parse_bs4}
+if lxml is not None:
+    BACKENDS["lxml"] = parse_lxml
+
+DEFAULT_BACKEND = "lxml" if lxml is not None else "html.parser"
+
+
+def parse_html(content, base_url="", backend=DEFAULT_BACKEND, text_sink=None, http_encoding=None) -> ParsedPage:
+    """
+    Parse a page's HTML, as bytes or str, with the given backend, resolving its links against base_url.
+    Bytes are decoded in the encoding the page declares; http_encoding is the charset it was served with, if any.
+    A page the backend fails on is parsed with bs4, which makes sense of almost anything.
+    The page's visible text is kept in ParsedPage.text, or, given a text_sink, written to it piece by piece while the
+    page is parsed, so it is never held whole. A text sink is anything with write(text), and clear(), which is called
+    before the page is parsed again.
+    """
+    sink = _TextBuffer() if text_sink is None else text_sink
+    try:
+        page = BACKENDS[backend](content, sink, http_encoding)
+    except Exception as e:
+        if backend == "bs4":
+            raise
+        log.warning(f"The {backend} backend failed to parse a page, falling back to bs4: {e!r}")
+        sink.clear()
+        page = parse_bs4(content, sink, http_encoding)
+
+    if text_sink is None:
+        page.text = "".join(sink)
+    page.links = list(dict.fromkeys(urldefrag(urljoin(base_url, href))[0] for href in page.hrefs))
+    return page
@@ -0,0 +1,46 @@
+import sys
+
+from utils import normalize, get_domain_name, get_urldigest
+
+
+def _restore(url, domain, digest):
+    record = str.__new__(URL, url)
+    record._set(domain, digest)
+    return record
+
+
+class URL(str):
+    """
+    A normalized URL, split into what the crawler needs from it once, when it is first made, instead of at every
+    stage that handles it. It is the normalized URL string itself, so it can be used anywhere a URL string is.
+    - domain: the domain it is scheduled and politeness checked by (see get_domain_name),
+    - digest: the binary sha256 of everything but its scheme; urlhash is its hex form (see get_urlhash).
+    Immutable; URL() of a URL returns it unchanged, so it can be called on URLs and strings alike.
+    """
+    __slots__ = ("domain", "digest")
+
+    def __new__(cls, url):
+        if type(url) is cls:
+            return url
+        record = super().__new__(cls, normalize(url))
+        # shared by every URL of the domain, rather than a copy per URL
+        record._set(sys.intern(get_domain_name(record)), get_urldigest(record))
+        return record
+
+    def _set(self, domain, digest):
+        object.__setattr__(self, "domain", domain)
+        object.__setattr__(self, "digest", digest)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"URL is immutable, cannot set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"URL is immutable, cannot delete {name}")
+
+    def __reduce__(self):
+        # sent to other processes as is, without parsing it again
+        return _restore, (str(self), self.domain, self.digest)
+
+    @property
+    def urlhash(self):
+        return self.digest.hex()
@@ -0,0 +1,83 @@
+"""
+Bounded caches of what the crawler works out from a URL, shared by every thread of a process.
+The same header, footer and navigation links show up on thousands of pages, so most lookups are hits.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlparse
+
+
+# default number of URLs each cache keeps; set with URLCACHESIZE
+URL_CACHE_SIZE = 16384
+
+
+class LRUCache(object):
+    """
+    A thread-safe cache holding at most maxsize values, dropping the least recently used one when it is full.
+    A maxsize of 0 caches nothing.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, compute):
+        """The value cached for the key, computing and caching it with compute(key) if it is not cached yet."""
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+
+        # computed outside the lock, so threads missing on different keys do not wait on each other
+        value = compute(key)
+        with self._lock:
+            self._values[key] = value
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+        return value
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"size": len(self._values), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# urlparse() results, which are immutable, so every caller can share them
+PARSED_URLS = LRUCache(URL_CACHE_SIZE)
+# is_valid() verdicts
+VERDICTS = LRUCache(URL_CACHE_SIZE)
+# get_urldigest() digests, which depend on how URLs are canonicalized, so are cleared when that changes
+DIGESTS = LRUCache(URL_CACHE_SIZE)
+
+
+def parse_url(url):
+    """urlparse(url), parsing each URL only once while it stays cached."""
+    return PARSED_URLS.get(url, urlparse)
+
+
+def resize(maxsize):
+    for cache in [PARSED_URLS, VERDICTS, DIGESTS]:
+        cache.resize(maxsize)
+
+
+def stats():
+    return {"parsed": PARSED_URLS.stats(), "verdicts": VERDICTS.stats(), "digests": DIGESTS.stats()}
@@ -1,11 +1,13 @@
 """
 This file contains all constants pertaining to the is_valid function in scraper.py
 
-Any schemes, domains, queries, fragments, etc. that would make a URL valid or invalid are stored here.
+Any schemes, domains, queries, fragments, etc. that would make a URL valid or invalid are stored here,
+and compiled into URL_VALIDATOR, which is_valid uses to check them.
 """
 
 
 import re
+from urllib.parse import urlparse
 
 VALID_SCHEMES = set(["http", "https"])
 
@@ -143,3 +145,146 @@ CALENDAR_TRAP_PATTERN = re.compile(
     + r"\d{1,2}\D+(?:\d{2}|\d{4})")
 
 ANY_NUMBER_PATTERN = re.compile(r"\d+")
+
+
+class URLValidator(object):
+    """
+    The rules above, compiled once into matchers that check a URL without looping over every rule:
+    - valid domains form a trie of their labels, from the top level domain down, walked once per host,
+    - invalid paths form a trie of characters for each host (and its www. alias), walked once per path,
+    - each group of invalid substrings is a single regex alternation, searched for once.
+    Gives the same verdict as checking every rule one by one, as scraper.is_valid used to.
+    """
+    _END = None
+    # splits the common URL the same way urlparse does: an http(s) URL of printable ASCII, with a host that is not an
+    # IPv6 address and no ;params; urlparse handles the rest
+    _SIMPLE_URL_PATTERN = re.compile(r"(https?)://([^/?#\[\]]*)((?:/[^?#]*)?)(?:\?([^#]*))?(?:#(.*))?")
+    _SIMPLE_CHARS_PATTERN = re.compile(r"[!-:<-~]*")
+
+    def __init__(self):
+        self.valid_schemes = frozenset(VALID_SCHEMES)
+        self.invalid_domains = frozenset(INVALID_DOMAINS)
+        self.domain_trie = self._label_trie(VALID_DOMAINS)
+        self.path_tries = {}
+        for domain, invalid_paths in INVALID_PATHS.items():
+            if invalid_paths:
+                for host in [domain, f"www.{domain}"]:
+                    self._add_to_char_trie(self.path_tries.setdefault(host, {}), invalid_paths)
+        self.invalid_query_pattern = self._any_substring(INVALID_QUERIES)
+        self.invalid_segment_pattern = self._any_substring(INVALID_PATH_SEGMENTS)
+        self.invalid_fragment_pattern = self._any_substring(INVALID_FRAGMENTS)
+        # the calendar pattern is checked against each &-separated part of the query, so it must not match across &
+        self.query_calendar_pattern = re.compile(CALENDAR_TRAP_PATTERN.pattern.replace(r"\D", r"[^\d&]"))
+
+    @classmethod
+    def _label_trie(cls, domains):
+        trie = {}
+        for domain in domains:
+            node = trie
+            for label in reversed(domain.split(".")):
+                node = node.setdefault(label, {})
+            node[cls._END] = True
+        return trie
+
+    @classmethod
+    def _add_to_char_trie(cls, trie, prefixes):
+        for prefix in prefixes:
+            node = trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[cls._END] = True
+
+    @staticmethod
+    def _any_substring(substrings):
+        if not substrings:
+            # an empty alternation would match everything
+            return re.compile(r"(?!)")
+        return re.compile("|".join(re.escape(substring) for substring in substrings))
+
+    def in_valid_domain(self, domain):
+        """Whether the host is one of VALID_DOMAINS, or a subdomain of one."""
+        node = self.domain_trie
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+    def has_invalid_path(self, domain, path):
+        """Whether the path starts with one of the host's INVALID_PATHS."""
+        node = self.path_tries.get(domain)
+        if node is None:
+            return False
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+    def split(self, url):
+        """The scheme, host, path, query and fragment of a URL, as urlparse would give them."""
+        # URL records (see utils.url) are strings too, and take the same fast path
+        if isinstance(url, str) and self._SIMPLE_CHARS_PATTERN.fullmatch(url):
+            match = self._SIMPLE_URL_PATTERN.fullmatch(url)
+            if match is not None:
+                scheme, netloc, path, query, fragment = match.groups()
+                return scheme, netloc, path, query or "", fragment or ""
+        parsed = urlparse(url)
+        return parsed.scheme, parsed.netloc, parsed.path, parsed.query, parsed.fragment
+
+    def __call__(self, url):
+        scheme, netloc, raw_path, query, fragment = self.split(url)
+
+        domain = netloc.lower()
+        path = raw_path.lower()
+
+        if scheme not in self.valid_schemes:
+            return False
+
+        if FILE_EXT_PATTERN.match(path):
+            return False
+
+        if self.invalid_query_pattern.search(query):
+            return False
+
+        if not (self.in_valid_domain(domain) or (
+                domain == "today.uci.edu" and path.startswith("/department/information_computer_sciences/"))):
+            return False
+
+        if domain in self.invalid_domains or self.has_invalid_path(domain, path):
+            return False
+
+        if self.invalid_segment_pattern.search(raw_path):
+            return False
+
+        # a calendar match in any part of the path is a match in the whole path
+        if CALENDAR_TRAP_PATTERN.search(raw_path) or self.query_calendar_pattern.search(query):
+            # make an exception in which domain/YYYY/MM/DD/article_name
+            path_parts = [part for part in raw_path.split("/") if part != '']
+            if not (len(path_parts) > 3 and
+                    ANY_NUMBER_PATTERN.match(path_parts[-4]) and len(path_parts[-4]) == 4 and
+                    ANY_NUMBER_PATTERN.match(path_parts[-3]) and len(path_parts[-3]) == 2 and
+                    ANY_NUMBER_PATTERN.match(path_parts[-2]) and len(path_parts[-2]) == 2 and
+                    len(path_parts[-1]) > 0):
+                return False
+
+        if self.invalid_fragment_pattern.search(fragment):
+            return False
+
+        # ensure the path /page/X can exist and is being followed, unless X is greater than 500
+        if "/page/" in raw_path:
+            path_parts = [part for part in raw_path.split("/") if part != '']
+            if len(path_parts) >= 2 \
+                    and path_parts[-2] == "page" \
+                    and ANY_NUMBER_PATTERN.search(path_parts[-1]) \
+                    and int(path_parts[-1]) > 500:
+                return False
+
+        return True
+
+
+URL_VALIDATOR = URLValidator()